@@ -1,22 +1,53 @@
-from flask import Flask
-from flasgger import Swagger
+from flask import Flask, send_file
+from sqlalchemy import text
 from flask_cors import CORS
 from config import config
 import os
-from extensions import db ,migrate,jwt
+from extensions import db, jwt, idempotency, limiter, replicas, async_io, google_verifier, compression, lifecycle, seat_hub
+from services.json_provider import FastJSONProvider
 
-def create_app(config_name=None):
+def init_api_docs(app):
+    """Serve the OpenAPI spec, prebuilt by build_openapi.py when FAST_STARTUP is on"""
+    spec_path = app.config['OPENAPI_SPEC_PATH']
+    
+    if app.config['FAST_STARTUP'] and os.path.exists(spec_path):
+        @app.route('/apispec_1.json')
+        def openapi_spec():
+            return send_file(spec_path, mimetype='application/json', max_age=3600)
+        return
+    if app.config['FAST_STARTUP']:
+        app.logger.warning('FAST_STARTUP is on but %s is missing; importing flasgger instead. '
+                           'Run `python build_openapi.py` to build it.', spec_path)
+    
+    # flasgger (and jsonschema behind it) is the slowest import at boot
+    from flasgger import Swagger
+    Swagger(app)
+
+def create_app(config_name=None, config_overrides=None):
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
     # Get config name from environment or use default
     config_name = config_name or os.environ.get('FLASK_ENV', 'default')
     app.config.from_object(config[config_name])
+    if config_overrides:
+        app.config.update(config_overrides)
     
-    # Initialize extensions with app
+    # Initialize extensions with app (replica binds must exist before the engines are created)
+    replicas.init_app(app)
     db.init_app(app)
-    migrate.init_app(app, db)
     jwt.init_app(app)
+    idempotency.init_app(app)
+    limiter.init_app(app)
+    async_io.init_app(app)
+    google_verifier.init_app(app)
+    compression.init_app(app)
+    seat_hub.init_app(app)
     CORS(app)
-    Swagger(app)
+    if not app.config['FAST_STARTUP']:
+        # Only needed for the `flask db` CLI, and alembic is a heavy import
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    init_api_docs(app)
     # Register blueprints
     from routes.auth import auth_bp
     from routes.events import events_bp
@@ -29,15 +60,18 @@ def create_app(config_name=None):
     app.register_blueprint(facilitators_bp, url_prefix='/api/facilitators')
     
     # Import models to ensure they're registered
-    from models import user, event, booking, facilitator
+    from models import user, event, booking, facilitator, archive
+    # Starts the background thread when LIFECYCLE_ENABLED
+    lifecycle.init_app(app)
     
     # Health check endpoint
     @app.route('/health')
     def health_check():
         try:
             # Test database connection
-            db.session.execute('SELECT 1')
-            return {'status': 'healthy', 'database': 'connected'}, 200
+            db.session.execute(text('SELECT 1'))
+            return {'status': 'healthy', 'database': 'connected', 'compression': compression.stats(),
+                    'lifecycle': lifecycle.stats(), 'seat_push': seat_hub.stats()}, 200
         except Exception as e:
             return {'status': 'unhealthy', 'database': 'disconnected', 'error': str(e)}, 400
     
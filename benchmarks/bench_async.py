@@ -0,0 +1,193 @@
+"""Concurrency under slow upstreams: blocking create_booking vs ASYNC_MODE.
+
+Starts a stub CRM that answers /api/notify after an injected delay, then
+drives POST /api/bookings/ with many concurrent clients (one user per
+request) against:
+  - the blocking path on a threaded worker (1 process x --threads),
+  - the blocking path on the gevent worker (monkey-patched requests),
+  - ASYNC_MODE on the gevent worker (async views, httpx, bounded DB pool).
+
+Usage:
+    python benchmarks/bench_async.py [--latency 500] [--clients 64] [--requests 256]
+"""
+import argparse
+import os
+import queue
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def start_stub_crm(latency_ms):
+    """Threaded stub CRM that delays every response by latency_ms"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(latency_ms / 1000)
+            body = b'{"status": "success"}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 1024  # the default backlog of 5 resets connections under load
+
+    server = Server(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def seed(db_path, users):
+    """Create one large event and `users` users, return their access tokens"""
+    os.environ['TEST_DATABASE_URL'] = f'sqlite:///{db_path}'
+    from app import create_app
+    from extensions import db
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import insert
+    from models import User, Facilitator, Event, EventType
+
+    app = create_app('testing')
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        now = datetime.utcnow()
+        db.session.execute(insert(User), [{
+            'email': f'async{i}@example.com', 'first_name': 'Async', 'last_name': str(i),
+            'is_active': True, 'created_at': now, 'updated_at': now,
+        } for i in range(users)])
+        db.session.add(Facilitator(user=1, bio='bench'))
+        db.session.add(Event(title='Bench event', event_type=EventType.SESSION.value, facilitator_id=1,
+                             start_datetime=now + timedelta(days=7), end_datetime=now + timedelta(days=7, hours=2),
+                             max_participants=users * 10, price=Decimal('10.00')))
+        db.session.commit()
+        return [create_access_token(identity=str(i + 1)) for i in range(users)]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(f'http://127.0.0.1:{port}/health', timeout=1)
+            return True
+        except requests.RequestException:
+            time.sleep(0.2)
+    return False
+
+
+def drive(port, tokens, clients):
+    """Book once per token from N concurrent clients, return (req/s, p50 ms, p99 ms, errors by cause, not notified)"""
+    pending = queue.Queue()
+    for token in tokens:
+        pending.put(token)
+    latencies, errors, not_notified = [], Counter(), [0]
+    lock = threading.Lock()
+
+    def client():
+        session = requests.Session()
+        while True:
+            try:
+                token = pending.get_nowait()
+            except queue.Empty:
+                return
+            started = time.perf_counter()
+            try:
+                response = session.post(f'http://127.0.0.1:{port}/api/bookings/', json={'event_id': 1},
+                                        headers={'Authorization': f'Bearer {token}'}, timeout=60)
+                ok = response.status_code == 201
+                notified = ok and response.json().get('crm_notified')
+                outcome = response.status_code if not ok else None
+                if outcome:
+                    outcome = f"{outcome} {response.text[:80].strip()}"
+            except requests.RequestException as e:
+                ok = notified = False
+                outcome = type(e).__name__
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors[outcome] += 1
+                not_notified[0] += ok and not notified
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)]
+    return len(latencies) / wall, statistics.median(latencies) * 1000, p99 * 1000, errors, not_notified[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=int, default=500, help='injected CRM latency in ms')
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=256)
+    parser.add_argument('--threads', type=int, default=8, help='threads of the blocking threaded worker')
+    args = parser.parse_args()
+
+    crm = start_stub_crm(args.latency)
+    crm_url = f'http://127.0.0.1:{crm.server_address[1]}'
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench_async.db')
+
+    modes = [
+        (f'blocking, threaded x{args.threads}', 'false',
+         ['--worker-class', 'threaded', '--workers', '1', '--threads', str(args.threads)]),
+        ('blocking, gevent', 'false', ['--worker-class', 'gevent', '--workers', '1']),
+        ('ASYNC_MODE, gevent', 'true', ['--worker-class', 'gevent', '--workers', '1']),
+    ]
+
+    print(f"CRM latency {args.latency} ms, {args.clients} clients, {args.requests} bookings per mode")
+    print(f"{'mode':<28}{'req/s':>8}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}{'no CRM':>8}")
+    for name, async_mode, serve_args in modes:
+        tokens = seed(db_path, args.requests)
+        port = free_port()
+        env = dict(os.environ, FLASK_ENV='testing', TEST_DATABASE_URL=f'sqlite:///{db_path}',
+                   CRM_SERVICE_URL=crm_url, ASYNC_MODE=async_mode, RATE_LIMIT_ENABLED='false',
+                   PYTHONPATH=ROOT)
+        proc = subprocess.Popen([sys.executable, 'serve.py', 'api', '--bind', f'127.0.0.1:{port}', *serve_args],
+                                cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_ready(port):
+                print(f"{name:<28}failed to start")
+                continue
+            rps, p50, p99, errors, not_notified = drive(port, tokens, args.clients)
+            print(f"{name:<28}{rps:>8.1f}{p50:>10.0f}{p99:>10.0f}{sum(errors.values()):>8}{not_notified:>8}")
+            for cause, count in errors.most_common():
+                print(f"    {count} x {cause}")
+        finally:
+            proc.terminate()
+            proc.wait()
+    crm.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Response compression levels: CPU time vs transfer time saved.
+
+Takes the body of the verbose list endpoints (events with their embedded
+facilitator, a user's bookings, a CRM bookings page), compresses it at
+several gzip levels (and brotli qualities when brotli is installed) and
+reports the size, the CPU time per response and the net time won on a slow
+link: transfer time saved minus compression time. Decompression on the
+client is not counted. Used to pick COMPRESSION_GZIP_LEVEL and
+COMPRESSION_BROTLI_QUALITY.
+
+Usage:
+    python benchmarks/bench_compression.py [--rows 100] [--link-mbps 2] [--repeat 50]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_json import crm_bodies, page, seed
+from services.compression import _Compressor, brotli
+
+GZIP_LEVELS = (1, 3, 5, 6, 9)
+BROTLI_QUALITIES = (1, 4, 5, 6, 9, 11)
+
+
+def bodies(rows):
+    from models import Booking, Event
+
+    app = seed(rows)
+    with app.app_context():
+        events = Event.query.order_by(Event.start_datetime).all()
+        bookings = Booking.query.all()
+        result = {
+            f'/api/events/ ({rows} events)': app.json.response(page([event.to_dict() for event in events], 'events')),
+            f'/api/bookings/ ({rows} bookings)': app.json.response(
+                page([booking.to_dict() for booking in bookings], 'bookings')),
+        }
+        result = {name: response.get_data() for name, response in result.items()}
+    crm = crm_bodies(5000)
+    import crm_service
+    result['CRM /api/bookings?per_page=100'] = crm_service.app.json.response(crm['CRM /api/bookings?per_page=100']).get_data()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--link-mbps', type=float, default=2.0, help='client bandwidth, e.g. 2 for a slow mobile link')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    settings = [('gzip', level) for level in GZIP_LEVELS]
+    if brotli is not None:
+        settings += [('br', quality) for quality in BROTLI_QUALITIES]
+    else:
+        print("brotli is not installed, gzip only")
+
+    bytes_per_ms = args.link_mbps * 1e6 / 8 / 1000
+    for name, data in bodies(args.rows).items():
+        print(f"\n{name}: {len(data) / 1024:.1f} KiB, {len(data) / bytes_per_ms:.1f} ms at {args.link_mbps:g} Mbit/s")
+        print(f"{'encoding':<10}{'KiB':>8}{'ratio':>8}{'cpu ms':>9}{'saved ms':>10}{'net ms':>9}")
+        for encoding, level in settings:
+            times = []
+            for _ in range(args.repeat):
+                started = time.thread_time()
+                compressor = _Compressor(encoding, level)
+                body = compressor.process(data) + compressor.finish()
+                times.append(time.thread_time() - started)
+            cpu_ms = statistics.median(times) * 1000
+            saved_ms = (len(data) - len(body)) / bytes_per_ms
+            print(f"{f'{encoding} {level}':<10}{len(body) / 1024:>8.1f}{len(data) / len(body):>8.1f}"
+                  f"{cpu_ms:>9.3f}{saved_ms:>10.1f}{saved_ms - cpu_ms:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""CRM analytics: dict-based loops vs the NumPy columnar store.
+
+Generates a synthetic booking log (default 1M notifications) and, for a
+sample of facilitators, times the dashboard statistics, a filtered,
+newest-first listing and a 90-day daily booking curve both the old way
+(Python loops over the list of nested dicts) and with
+crm.columnar.BookingColumns and its rollups. Results of both paths are
+compared so the speedup is not bought with wrong answers.
+
+Usage:
+    python benchmarks/bench_crm_analytics.py [--records 1000000] [--facilitators 200] [--queries 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from crm.columnar import BookingColumns, to_epoch_us
+from crm.records import BookingRecord
+from crm.rollups import DAY_US
+
+
+def make_log(records, facilitators, events_per_facilitator=20, users=50000, days=365, seed=7):
+    """Synthetic notifications shaped like crm_service.store_notification's, oldest first"""
+    rng = random.Random(seed)
+    events = []
+    for facilitator_id in range(1, facilitators + 1):
+        for i in range(events_per_facilitator):
+            event_id = len(events) + 1
+            events.append(({'id': event_id, 'title': f'Event {event_id}', 'type': rng.choice(['SESSION', 'RETREAT']),
+                            'start_datetime': '2026-01-01T10:00:00', 'location': 'Studio'}, facilitator_id))
+    user_dicts = {}
+    start = datetime.utcnow() - timedelta(days=days)
+    step = timedelta(days=days) / records
+    log = []
+    for i in range(records):
+        event, facilitator_id = events[rng.randrange(len(events))]
+        user_id = rng.randrange(1, users + 1)
+        user = user_dicts.setdefault(user_id, {'id': user_id, 'email': f'user{user_id}@example.com',
+                                               'name': f'User {user_id}', 'phone': None})
+        log.append({
+            'id': i + 1,
+            'booking_id': i + 1,
+            'user': user,
+            'event': event,
+            'facilitator_id': facilitator_id,
+            'booking_date': None,
+            'notes': '',
+            'received_at': (start + step * i).isoformat(),
+            'status': 'received',
+            'crm_status': rng.choice(['new', 'new', 'reviewed', 'contacted']),
+        })
+    return log
+
+
+def dict_dashboard(bookings_storage, facilitator_id, since):
+    """The dashboard statistics as get_facilitator_dashboard computed them before the columnar store"""
+    facilitator_bookings = [b for b in bookings_storage if b['facilitator_id'] == facilitator_id]
+    session_bookings = [b for b in facilitator_bookings if b['event']['type'].lower() == 'session']
+    retreat_bookings = [b for b in facilitator_bookings if b['event']['type'].lower() == 'retreat']
+    recent_bookings = []
+    for booking in facilitator_bookings:
+        booking_date = datetime.fromisoformat(booking['received_at'].replace('Z', '+00:00'))
+        if booking_date.replace(tzinfo=None) >= since:
+            recent_bookings.append(booking)
+    event_counts = {}
+    for booking in facilitator_bookings:
+        event_id = booking['event']['id']
+        if event_id not in event_counts:
+            event_counts[event_id] = {'event_id': event_id, 'booking_count': 0}
+        event_counts[event_id]['booking_count'] += 1
+    popular_events = sorted(event_counts.values(), key=lambda x: x['booking_count'], reverse=True)[:5]
+    recent = sorted(recent_bookings, key=lambda x: x['received_at'], reverse=True)[:10]
+    return {
+        'total_bookings': len(facilitator_bookings),
+        'session_bookings': len(session_bookings),
+        'retreat_bookings': len(retreat_bookings),
+        'recent_bookings_count': len(recent_bookings),
+        'unique_events': len(set(b['event']['id'] for b in facilitator_bookings)),
+        'unique_users': len(set(b['user']['id'] for b in facilitator_bookings)),
+        'popular_events': [(e['event_id'], e['booking_count']) for e in popular_events],
+        'recent_booking_ids': [b['booking_id'] for b in recent],
+    }
+
+
+def columnar_dashboard(bookings_storage, columns, facilitator_id, since):
+    summary = columns.facilitator_summary(facilitator_id, since)
+    summary['recent_booking_ids'] = [bookings_storage[row]['booking_id'] for row in summary.pop('recent_rows')]
+    return summary
+
+
+def dict_listing(bookings_storage, facilitator_id, crm_status, per_page=10):
+    """Filtered, newest-first first page as get_facilitator_bookings built it before"""
+    bookings = [b for b in bookings_storage if b['facilitator_id'] == facilitator_id]
+    bookings = [b for b in bookings if b.get('crm_status') == crm_status]
+    bookings.sort(key=lambda x: x['received_at'], reverse=True)
+    return len(bookings), [b['booking_id'] for b in bookings[:per_page]]
+
+
+def columnar_listing(bookings_storage, columns, facilitator_id, crm_status, per_page=10):
+    rows = columns.filter_rows(facilitator=facilitator_id, crm_status=crm_status)
+    return len(rows), [bookings_storage[row]['booking_id'] for row in rows[:per_page]]
+
+
+def dict_trend(bookings_storage, facilitator_id, since, days=90):
+    """Daily session/retreat counts since a midnight, by scanning the notifications"""
+    counts = {}
+    for booking in bookings_storage:
+        if booking['facilitator_id'] != facilitator_id:
+            continue
+        received = datetime.fromisoformat(booking['received_at'])
+        if received >= since:
+            key = ((received - since).days, booking['event']['type'].lower())
+            counts[key] = counts.get(key, 0) + 1
+    return [[counts.get((day, event_type), 0) for day in range(days)] for event_type in ('session', 'retreat')]
+
+
+def columnar_trend(columns, facilitator_id, since, days=90):
+    start_us = to_epoch_us(since)
+    _, series = columns.rollups.series('day', columns.codes['facilitator'].get(facilitator_id),
+                                       start_us, start_us + days * DAY_US)
+    return [series[columns.codes['type'].get(event_type)].tolist() for event_type in ('session', 'retreat')]
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return (time.perf_counter() - started) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=1000000)
+    parser.add_argument('--facilitators', type=int, default=200)
+    parser.add_argument('--queries', type=int, default=20, help='facilitators sampled per query type')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    log = make_log(args.records, args.facilitators)
+    print(f"generated {len(log):,} notifications in {time.perf_counter() - started:.1f} s")
+
+    records = [BookingRecord.from_dict(notification) for notification in log]
+    events = {str(notification['event']['id']): notification['event'] for notification in log}
+    build_ms, columns = timed(BookingColumns.from_records, records, events)
+    print(f"built columnar store in {build_ms / 1000:.1f} s "
+          f"({sum(array[:columns.size].nbytes for array in columns.arrays.values()) / 2**20:.1f} MiB of arrays)")
+
+    rollup_ms, _ = timed(lambda: columns.rollups)
+    print(f"built hour/day/week rollups in {rollup_ms:.0f} ms "
+          f"({sum(counts.counts.nbytes for counts in columns.rollups.buckets.values()) / 2**20:.1f} MiB)")
+
+    since = datetime.utcnow() - timedelta(days=7)
+    trend_since = (datetime.utcnow() - timedelta(days=90)).replace(hour=0, minute=0, second=0, microsecond=0)
+    sample = random.Random(1).sample(range(1, args.facilitators + 1), min(args.queries, args.facilitators))
+    results = {'dashboard': ([], []), 'listing': ([], []), 'trend': ([], [])}
+    for facilitator_id in sample:
+        dict_ms, expected = timed(dict_dashboard, log, facilitator_id, since)
+        columnar_ms, actual = timed(columnar_dashboard, log, columns, facilitator_id, since)
+        assert actual == expected, (facilitator_id, actual, expected)
+        results['dashboard'][0].append(dict_ms)
+        results['dashboard'][1].append(columnar_ms)
+
+        dict_ms, expected = timed(dict_listing, log, facilitator_id, 'reviewed')
+        columnar_ms, actual = timed(columnar_listing, log, columns, facilitator_id, 'reviewed')
+        assert actual == expected, (facilitator_id, actual, expected)
+        results['listing'][0].append(dict_ms)
+        results['listing'][1].append(columnar_ms)
+
+        dict_ms, expected = timed(dict_trend, log, facilitator_id, trend_since)
+        columnar_ms, actual = timed(columnar_trend, columns, facilitator_id, trend_since)
+        assert actual == expected, facilitator_id
+        results['trend'][0].append(dict_ms)
+        results['trend'][1].append(columnar_ms)
+
+    print(f"{'query':<12}{'dict p50 ms':>14}{'columnar p50 ms':>18}{'speedup':>10}")
+    for name, (dict_times, columnar_times) in results.items():
+        dict_p50, columnar_p50 = statistics.median(dict_times), statistics.median(columnar_times)
+        print(f"{name:<12}{dict_p50:>14.1f}{columnar_p50:>18.2f}{dict_p50 / columnar_p50:>9.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""CRM consumer sync: paging through GET /api/bookings vs the GET /api/changes feed.
+
+Fills an in-process CRM store with --records bookings, then has a consumer
+pick up --updates new bookings and CRM status changes:
+  - full scan: page through /api/bookings (per_page=100) and diff the
+    crm_status of every booking against the previous scan,
+  - change feed: GET /api/changes?since=<last seq>.
+Reports requests, bytes and time per sync, and how long a long-polling
+consumer takes to see a status update.
+
+Usage:
+    python benchmarks/bench_crm_changes.py [--records 100000] [--updates 50]
+"""
+import argparse
+import contextlib
+import os
+import random
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def notification(i, rng):
+    return {
+        'booking_id': i,
+        'user': {'id': rng.randrange(1, 5000), 'email': 'user@example.com', 'name': 'User'},
+        'event': {'id': rng.randrange(1, 500), 'title': 'Morning Flow', 'type': rng.choice(['SESSION', 'RETREAT'])},
+        'facilitator_id': rng.randrange(1, 50),
+    }
+
+
+def full_scan(client, headers):
+    statuses, requests, received = {}, 0, 0
+    page = 1
+    while True:
+        response = client.get(f'/api/bookings?per_page=100&page={page}', headers=headers)
+        requests += 1
+        received += len(response.data)
+        body = response.get_json()
+        for booking in body['bookings']:
+            statuses[booking['booking_id']] = booking['crm_status']
+        if not body['pagination']['has_next']:
+            return statuses, requests, received
+        page += 1
+
+
+def feed_sync(client, headers, since):
+    requests, received, changed = 0, 0, {}
+    while True:
+        response = client.get(f'/api/changes?since={since}&limit=1000', headers=headers)
+        requests += 1
+        received += len(response.data)
+        body = response.get_json()
+        for change in body['changes']:
+            changed[change['booking_id']] = change['crm_status']
+        since = body['next_since']
+        if not body['has_more']:
+            return changed, since, requests, received
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=100000)
+    parser.add_argument('--updates', type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ.setdefault('CRM_SNAPSHOT_FILE', '/tmp/bench_crm_changes.snap')
+    import crm_service
+
+    rng = random.Random(3)
+    client = crm_service.app.test_client()
+    headers = {'Authorization': f'Bearer {crm_service.BEARER_TOKEN}'}
+    quiet = contextlib.redirect_stdout(open(os.devnull, 'w'))
+
+    with quiet:
+        for i in range(1, args.records + 1):
+            crm_service.store_notification(notification(i, rng))
+    before, _, _ = full_scan(client, headers)
+    since = crm_service.change_feed.latest
+
+    def apply_updates():
+        # Half new bookings, half status changes, through the endpoints
+        with quiet:
+            for i in range(args.updates):
+                if i % 2:
+                    client.post('/api/notify', headers=headers, json=notification(args.records + i + 1, rng))
+                else:
+                    client.put(f'/api/bookings/{rng.randrange(1, args.records + 1)}/status', headers=headers,
+                               json={'crm_status': 'reviewed'})
+
+    apply_updates()
+
+    started = time.perf_counter()
+    after, scan_requests, scan_bytes = full_scan(client, headers)
+    scan_changed = {booking_id for booking_id, status in after.items() if before.get(booking_id) != status}
+    scan_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    changed, since, feed_requests, feed_bytes = feed_sync(client, headers, since)
+    feed_seconds = time.perf_counter() - started
+    assert scan_changed <= set(changed), 'the feed missed a change the scan found'
+
+    print(f"{args.records:,} bookings, {args.updates} changes since the last sync")
+    print(f"{'sync':<12}{'requests':>10}{'KiB':>10}{'ms':>10}{'changed':>9}")
+    print(f"{'full scan':<12}{scan_requests:>10}{scan_bytes / 1024:>10.0f}{scan_seconds * 1000:>10.0f}{len(scan_changed):>9}")
+    print(f"{'change feed':<12}{feed_requests:>10}{feed_bytes / 1024:>10.0f}{feed_seconds * 1000:>10.1f}{len(changed):>9}")
+
+    latencies = []
+    for _ in range(20):
+        seen = threading.Event()
+        poll_since = crm_service.change_feed.latest
+
+        def poll():
+            crm_service.app.test_client().get(f'/api/changes?since={poll_since}&wait=5', headers=headers)
+            seen.set()
+
+        poller = threading.Thread(target=poll)
+        poller.start()
+        time.sleep(0.05)
+        changed_at = time.perf_counter()
+        with quiet:
+            crm_service.store_notification(notification(10 ** 7 + len(latencies), rng))
+        seen.wait()
+        latencies.append(time.perf_counter() - changed_at)
+        poller.join()
+    latencies.sort()
+    print(f"long-poll delivery latency: p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+          f"max {latencies[-1] * 1000:.2f} ms")
+    # Save now, so neither the saver thread nor the exit save writes it again after it is removed
+    crm_service.save_data_to_file()
+    os.remove(crm_service.SNAPSHOT_FILE)
+
+
+if __name__ == '__main__':
+    main()
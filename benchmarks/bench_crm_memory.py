@@ -0,0 +1,117 @@
+"""CRM notification storage: memory per booking, nested dicts vs slotted records.
+
+Feeds the same stream of notification payloads (each parsed from its own JSON
+body, like a request) into
+  - dicts: the original storage, one dict per booking holding the nested user
+    and event payloads and ISO timestamp strings,
+  - records: crm_service.store_notification, i.e. BookingRecords with interned
+    user/event payloads plus the columnar copy and booking id index,
+and reports the memory retained per booking (tracemalloc) and the cost of
+rebuilding a page of JSON dicts from records at response time.
+
+Usage:
+    python benchmarks/bench_crm_memory.py [--records 200000] [--users 20000] [--events 2000]
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def make_payloads(records, users, events, seed=7):
+    """JSON bodies of notifications as routes/bookings.py sends them"""
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    payloads = []
+    for i in range(records):
+        user_id, event_id = rng.randrange(1, users + 1), rng.randrange(1, events + 1)
+        payloads.append(json.dumps({
+            'booking_id': i + 1,
+            'user': {'id': user_id, 'email': f'user{user_id}@example.com', 'name': f'First{user_id} Last{user_id}',
+                     'phone': f'+1555{user_id:07d}'},
+            'event': {'id': event_id, 'title': f'Morning Flow Session {event_id}',
+                      'type': 'SESSION' if event_id % 3 else 'RETREAT',
+                      'start_datetime': (start + timedelta(hours=event_id)).isoformat(),
+                      'location': 'Studio 4, 12 Harbour Street'},
+            'facilitator_id': event_id % 200 + 1,
+            'booking_date': (start + timedelta(seconds=37 * i, microseconds=i % 1000000)).isoformat(),
+            'notes': '' if i % 4 else 'Please reserve a mat near the window',
+        }))
+    return payloads
+
+
+def store_dicts(payloads):
+    """The original store_notification storage"""
+    storage = []
+    for payload in payloads:
+        data = json.loads(payload)
+        storage.append({
+            'id': len(storage) + 1,
+            'booking_id': data['booking_id'],
+            'user': data['user'],
+            'event': data['event'],
+            'facilitator_id': data['facilitator_id'],
+            'booking_date': data.get('booking_date'),
+            'notes': data.get('notes', ''),
+            'received_at': datetime.utcnow().isoformat(),
+            'status': 'received',
+            'crm_status': 'new'
+        })
+    return storage
+
+
+def store_records(payloads):
+    import crm_service
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for payload in payloads:
+            crm_service.store_notification(json.loads(payload))
+    return crm_service
+
+
+def measure(func, payloads):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = func(payloads)
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return kept, retained
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--events', type=int, default=2000)
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.records, args.users, args.events)
+    import crm_service  # imported outside the measurement
+
+    _, dict_bytes = measure(store_dicts, payloads)
+    service, record_bytes = measure(store_records, payloads)
+    columns_bytes = sum(array.nbytes for array in service.booking_columns.arrays.values())
+
+    print(f"{args.records:,} notifications, {args.users:,} users, {args.events:,} events")
+    print(f"{'storage':<10}{'bytes/booking':>15}{'total MiB':>12}")
+    for name, retained in (('dicts', dict_bytes), ('records', record_bytes)):
+        print(f"{name:<10}{retained / args.records:>15.0f}{retained / 2**20:>12.1f}")
+    print(f"records include {columns_bytes / 2**20:.1f} MiB of columnar arrays and the booking id index")
+
+    page = [service.bookings_storage[row] for row in range(100)]
+    started = time.perf_counter()
+    for _ in range(100):
+        [service.booking_json(booking) for booking in page]
+    print(f"rebuilding a page of 100 bookings as JSON dicts: {(time.perf_counter() - started) * 10:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
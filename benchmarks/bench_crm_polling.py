@@ -0,0 +1,84 @@
+"""CRM dashboard polling: rebuilt responses vs the per-facilitator response cache.
+
+Writes a synthetic CRM snapshot (default 1M bookings), opens it like the
+service does and polls GET /api/facilitators/<id>/dashboard and
+/bookings for a sample of facilitators:
+  - rebuilt: the facilitator's version is bumped before every poll, as if
+    a booking had just arrived, so each poll filters, sorts and serializes,
+  - cached: unchanged data, no ETag sent (200 from the cache),
+  - revalidated: unchanged data with If-None-Match (304, empty body).
+Reports the time and bytes per poll.
+
+Usage:
+    python benchmarks/bench_crm_polling.py [--records 1000000] [--polls 200]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_crm_analytics import make_log
+
+
+def poll(client, url, headers, polls, before=None):
+    """Median ms and mean bytes of polls GET requests"""
+    times, sizes = [], []
+    for _ in range(polls):
+        if before:
+            before()
+        started = time.perf_counter()
+        response = client.get(url, headers=headers)
+        times.append(time.perf_counter() - started)
+        sizes.append(len(response.data))
+    return statistics.median(times) * 1000, sum(sizes) / len(sizes), response.status_code
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=1000000)
+    parser.add_argument('--facilitators', type=int, default=200)
+    parser.add_argument('--polls', type=int, default=200)
+    parser.add_argument('--dir', default='/tmp/crm-bench')
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    json_path = os.path.join(args.dir, 'crm_data.json')
+    snapshot_path = os.path.join(args.dir, 'crm_data.snap')
+    log = make_log(args.records, args.facilitators)
+    events = {str(notification['event']['id']): notification['event'] for notification in log}
+    with open(json_path, 'w') as f:
+        json.dump({'bookings': log, 'facilitators': {}, 'events': events, 'last_updated': log[-1]['received_at']}, f)
+    del log
+
+    from convert_crm_data import convert
+    convert(json_path, snapshot_path)
+    os.environ.update(CRM_DATA_FILE=json_path, CRM_SNAPSHOT_FILE=snapshot_path)
+    import crm_service
+    with contextlib.redirect_stdout(io.StringIO()):
+        crm_service.load_data_from_file()
+
+    client = crm_service.app.test_client()
+    headers = {'Authorization': f'Bearer {crm_service.BEARER_TOKEN}'}
+    facilitator_id = args.facilitators // 2
+    print(f"{args.records:,} bookings, facilitator {facilitator_id}, {args.polls} polls per mode")
+    print(f"{'endpoint':<22}{'mode':<13}{'ms/poll':>9}{'bytes':>9}{'status':>8}")
+    for name, url in (('dashboard', f'/api/facilitators/{facilitator_id}/dashboard'),
+                      ('bookings', f'/api/facilitators/{facilitator_id}/bookings?per_page=20&crm_status=new')):
+        results = {'rebuilt': poll(client, url, headers, args.polls,
+                                   before=lambda: crm_service.response_cache.invalidate(facilitator_id))}
+        etag = client.get(url, headers=headers).headers['ETag']
+        results['cached'] = poll(client, url, headers, args.polls)
+        results['revalidated'] = poll(client, url, dict(headers, **{'If-None-Match': etag}), args.polls)
+        for mode, (ms, size, status) in results.items():
+            print(f"{name:<22}{mode:<13}{ms:>9.3f}{size:>9.0f}{status:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""CRM cold start: JSON data file vs mmap'd binary snapshot.
+
+Writes a synthetic CRM data file in the JSON format the service used to
+persist (default 1M bookings), converts it with convert_crm_data.py, then
+starts a fresh Python process per mode and reports, after the imports:
+  - load: time until the service can answer (json.load and rebuilding the
+    records and columns, or opening the snapshot),
+  - lookup: the first GET /api/bookings/<id> style lookup,
+  - dashboard: the first facilitator dashboard statistics,
+  - resident memory the process gained over the whole run.
+The file is in the page cache for both modes; the snapshot mode only touches
+the pages it reads.
+
+Usage:
+    python benchmarks/bench_crm_startup.py [--records 1000000] [--dir /tmp/crm-bench]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_crm_analytics import make_log
+
+CHILD = r'''
+import gc, json, sys, time
+sys.path.insert(0, sys.argv[1])
+import crm_service
+from crm.columnar import BookingColumns
+from crm.records import load_json_store
+
+mode, booking_id = sys.argv[2], int(sys.argv[3])
+
+def rss():
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith('VmRSS')) / 1024
+
+before = rss()
+started = time.perf_counter()
+if mode == 'json':
+    with open(crm_service.DATA_FILE) as f:
+        data = json.load(f)
+    (crm_service.bookings_storage, crm_service.users_cache, crm_service.events_cache,
+     crm_service.facilitators_cache) = load_json_store(data)
+    crm_service.booking_columns = BookingColumns.from_records(crm_service.bookings_storage, crm_service.events_cache)
+    del data
+    gc.collect()
+else:
+    crm_service.load_data_from_file()
+loaded = time.perf_counter()
+booking = crm_service.booking_json(crm_service.find_booking(booking_id))
+looked_up = time.perf_counter()
+crm_service.booking_columns.facilitator_summary(booking['facilitator_id'], crm_service.recent_since())
+summarized = time.perf_counter()
+print(json.dumps({'load': loaded - started, 'lookup': looked_up - loaded, 'dashboard': summarized - looked_up,
+                  'rss': rss() - before}))
+'''
+
+
+def run_child(mode, env, booking_id):
+    output = subprocess.run([sys.executable, '-c', CHILD, ROOT, mode, str(booking_id)], env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=1000000)
+    parser.add_argument('--facilitators', type=int, default=200)
+    parser.add_argument('--dir', default='/tmp/crm-bench')
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    json_path = os.path.join(args.dir, 'crm_data.json')
+    snapshot_path = os.path.join(args.dir, 'crm_data.snap')
+
+    log = make_log(args.records, args.facilitators)
+    events = {str(notification['event']['id']): notification['event'] for notification in log}
+    with open(json_path, 'w') as f:
+        json.dump({'bookings': log, 'facilitators': {}, 'events': events, 'last_updated': log[-1]['received_at']},
+                  f, indent=2)
+    booking_id = log[len(log) // 2]['booking_id']
+    del log
+
+    from convert_crm_data import convert
+
+    started = time.perf_counter()
+    convert(json_path, snapshot_path)
+    print(f"converted {args.records:,} bookings in {time.perf_counter() - started:.1f} s: "
+          f"JSON {os.path.getsize(json_path) / 2**20:.0f} MiB -> snapshot {os.path.getsize(snapshot_path) / 2**20:.0f} MiB")
+
+    env = dict(os.environ, CRM_DATA_FILE=json_path, CRM_SNAPSHOT_FILE=snapshot_path)
+    print(f"{'mode':<10}{'load ms':>10}{'lookup ms':>11}{'dashboard ms':>14}{'RSS MiB':>10}")
+    for mode in ('json', 'snapshot'):
+        result = run_child(mode, env, booking_id)
+        print(f"{mode:<10}{result['load'] * 1000:>10.1f}{result['lookup'] * 1000:>11.2f}"
+              f"{result['dashboard'] * 1000:>14.1f}{result['rss']:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
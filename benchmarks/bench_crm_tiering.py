@@ -0,0 +1,102 @@
+"""CRM record memory: every decoded booking kept vs the hot/cold record cache.
+
+Writes a synthetic CRM snapshot (default 1M bookings over a year), then
+starts a fresh Python process per mode that serves --lookups booking reads
+through crm_service.find_booking, most of them to the last 30 days and the
+rest spread over the whole year:
+  - unbounded: snapshot rows stay decoded once read (no record cache),
+  - tiered: the record cache with a --ceiling MiB memory ceiling.
+Reports the resident memory the process gained, split into heap (what the
+ceiling bounds) and pages of the mapped snapshot (clean file pages the OS
+can drop under memory pressure), the read throughput and the cache's hit
+rate and evictions.
+
+Usage:
+    python benchmarks/bench_crm_tiering.py [--records 1000000] [--lookups 1000000] [--ceiling 32]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_crm_analytics import make_log
+
+CHILD = r'''
+import contextlib, io, json, random, sys, time
+sys.path.insert(0, sys.argv[1])
+import crm_service
+
+mode, records, lookups, recent_share = sys.argv[2], int(sys.argv[3]), int(sys.argv[4]), float(sys.argv[5])
+
+def rss():
+    """Anonymous (heap) and file-backed (mapped snapshot) resident MiB"""
+    with open('/proc/self/status') as f:
+        fields = dict(line.split(':', 1) for line in f)
+    return [int(fields[name].split()[0]) / 1024 for name in ('RssAnon', 'RssFile')]
+
+with contextlib.redirect_stdout(io.StringIO()):
+    crm_service.load_data_from_file()
+if mode == 'unbounded':
+    crm_service.bookings_storage.cache = None
+rng = random.Random(11)
+# Bookings are spread evenly over a year, so the last 30 days are the newest 30/365 of them
+recent = records - records * 30 // 365
+booking_ids = [rng.randrange(recent, records) + 1 if rng.random() < recent_share else rng.randrange(records) + 1
+               for _ in range(lookups)]
+
+before = rss()
+started = time.perf_counter()
+for booking_id in booking_ids:
+    crm_service.find_booking(booking_id)
+elapsed = time.perf_counter() - started
+after = rss()
+print(json.dumps({'seconds': elapsed, 'heap': after[0] - before[0], 'mapped': after[1] - before[1],
+                  'cache': crm_service.record_cache.stats()}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=1000000)
+    parser.add_argument('--lookups', type=int, default=1000000)
+    parser.add_argument('--recent-share', type=float, default=0.9)
+    parser.add_argument('--ceiling', type=float, default=32, help='record cache ceiling in MiB')
+    parser.add_argument('--dir', default='/tmp/crm-bench')
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    json_path = os.path.join(args.dir, 'crm_data.json')
+    snapshot_path = os.path.join(args.dir, 'crm_data.snap')
+
+    log = make_log(args.records, facilitators=200)
+    events = {str(notification['event']['id']): notification['event'] for notification in log}
+    with open(json_path, 'w') as f:
+        json.dump({'bookings': log, 'facilitators': {}, 'events': events, 'last_updated': log[-1]['received_at']}, f)
+    del log
+
+    from convert_crm_data import convert
+    convert(json_path, snapshot_path)
+
+    env = dict(os.environ, CRM_DATA_FILE=json_path, CRM_SNAPSHOT_FILE=snapshot_path,
+               CRM_RECORD_CACHE_MB=str(args.ceiling))
+    print(f"{args.records:,} bookings, {args.lookups:,} reads ({args.recent_share:.0%} to the last 30 days), "
+          f"ceiling {args.ceiling:g} MiB")
+    print(f"{'mode':<11}{'heap MiB':>10}{'mapped MiB':>12}{'reads/s':>11}{'hit rate':>10}{'evicted':>10}"
+          f"{'cached MiB':>12}")
+    for mode in ('unbounded', 'tiered'):
+        output = subprocess.run([sys.executable, '-c', CHILD, ROOT, mode, str(args.records), str(args.lookups),
+                                 str(args.recent_share)], env=env, check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        cache = result['cache']
+        tiered = mode == 'tiered'
+        print(f"{mode:<11}{result['heap']:>10.0f}{result['mapped']:>12.0f}{args.lookups / result['seconds']:>11,.0f}"
+              f"{cache['hit_rate'] if tiered else '-':>10}{sum(cache['evictions'].values()) if tiered else '-':>10}"
+              f"{cache['resident_bytes'] / 2**20 if tiered else 0:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
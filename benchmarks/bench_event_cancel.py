@@ -0,0 +1,135 @@
+"""Event cancellation: one set-based PUT /api/events/<id>/cancel vs cancelling every booking.
+
+Seeds a SQLite database with one event booked by --attendees users and
+starts a stub CRM that counts the requests it receives, then cancels the
+event's bookings:
+  - per booking: every attendee calls PUT /api/bookings/<id>/cancel (one
+    request, commit and participant decrement each),
+  - per event: the facilitator calls PUT /api/events/<id>/cancel once.
+Reports the time, SQL statements and CRM requests of each, and asserts the
+set-based path leaves every booking cancelled, the event cancelled with no
+participants, and sends one CRM request with every booking id.
+
+Usage:
+    python benchmarks/bench_event_cancel.py [--attendees 50 200 500]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_fieldsets import StatementCounter
+
+
+def start_stub_crm(received):
+    """Threaded stub CRM that records the path and JSON body of every request"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append((self.path, json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))))
+            body = b'{"status": "success"}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+
+    server = Server(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def seed(path, attendees):
+    """One event with a booking per attendee. Returns the app, the event id and the users' tokens"""
+    from app import create_app
+    from extensions import db
+    from flask_jwt_extended import create_access_token
+    from models import Booking, BookingStatus, Event, EventType, Facilitator, User
+
+    app = create_app('testing', {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'LIFECYCLE_ENABLED': False})
+    now = datetime.utcnow()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        # User 1 is the facilitator, the others attend
+        db.session.execute(db.insert(User), [
+            {'id': i, 'email': f'user{i}@example.com', 'first_name': 'Bench', 'last_name': 'User',
+             'created_at': now, 'updated_at': now} for i in range(1, attendees + 2)])
+        db.session.execute(db.insert(Facilitator), [{'id': 1, 'user': 1}])
+        db.session.execute(db.insert(Event), [{
+            'id': 1, 'title': 'Retreat', 'event_type': EventType.RETREAT, 'facilitator_id': 1,
+            'start_datetime': now + timedelta(days=30), 'end_datetime': now + timedelta(days=33),
+            'max_participants': attendees, 'current_participants': attendees, 'price': 900,
+            'created_at': now, 'updated_at': now}])
+        db.session.execute(db.insert(Booking), [
+            {'id': i, 'user_id': i + 1, 'event_id': 1, 'booking_date': now, 'status': BookingStatus.CONFIRMED,
+             'created_at': now, 'updated_at': now} for i in range(1, attendees + 1)])
+        db.session.commit()
+        tokens = {i: create_access_token(identity=str(i)) for i in range(1, attendees + 2)}
+    return app, tokens
+
+
+def run(app, counter, requests):
+    client = app.test_client()
+    counter.statements.clear()
+    started = time.perf_counter()
+    for path, token in requests:
+        response = client.put(path, headers={'Authorization': f'Bearer {token}'}, json={'reason': 'Venue closed'})
+        assert response.status_code == 200, response.get_json()
+    return time.perf_counter() - started, len(counter.statements), response.get_json()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--attendees', type=int, nargs='+', default=[50, 200, 500])
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    received = []
+    crm = start_stub_crm(received)
+    # Config reads the CRM URL at import
+    os.environ['CRM_SERVICE_URL'] = f'http://127.0.0.1:{crm.server_address[1]}'
+    from extensions import db
+    from models import Booking, BookingStatus, Event, EventStatus
+
+    directory = tempfile.mkdtemp()
+    print(f"{'attendees':>9}  {'path':<12}{'ms':>9}{'statements':>12}{'CRM requests':>14}")
+    for attendees in args.attendees:
+        for name in ('per booking', 'per event'):
+            app, tokens = seed(os.path.join(directory, f'{attendees}.db'), attendees)
+            with app.app_context():
+                counter = StatementCounter(db.engine)
+            if name == 'per booking':
+                requests = [(f'/api/bookings/{i}/cancel', tokens[i + 1]) for i in range(1, attendees + 1)]
+            else:
+                requests = [('/api/events/1/cancel', tokens[1])]
+            received.clear()
+            seconds, statements, body = run(app, counter, requests)
+            print(f"{attendees:>9}  {name:<12}{seconds * 1000:>9.1f}{statements:>12}{len(received):>14}")
+
+        assert body['cancelled_bookings'] == attendees and body['crm_notified']
+        assert [path for path, _ in received] == ['/api/notify/cancellations']
+        assert received[0][1]['booking_ids'] == list(range(1, attendees + 1))
+        with app.app_context():
+            event = db.session.get(Event, 1)
+            assert event.status == EventStatus.CANCELLED and event.current_participants == 0
+            assert not Booking.query.filter(Booking.status != BookingStatus.CANCELLED).count()
+    crm.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Sparse fieldsets: SQL statements, response size and time per list request.
+
+Seeds a SQLite database (bench_json.seed: one user booked on every event)
+and calls the list endpoints through the test client while counting the SQL
+statements they run:
+  - legacy: the query and to_dict() before ?fields=/?embed=, relationships
+    lazy loaded one statement per row (run in-process, same data),
+  - default: no parameters, the same JSON with the relationships eager loaded,
+  - sparse: the fields of the app's list screen only.
+Asserted: the default responses are the legacy JSON, a page costs a fixed
+number of statements whatever its size, and the sparse requests select only
+the columns asked for.
+
+Usage:
+    python benchmarks/bench_fieldsets.py [--rows 100] [--repeat 50]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_json import default_booking_dict, default_event_dict, page, seed
+
+# (name, url, expected statements: pagination count + page [+ select-in loads])
+REQUESTS = [
+    ('events', '/api/events/?per_page={rows}', 2),
+    ('events', '/api/events/?per_page={rows}&fields=title,start_datetime,status', 2),
+    ('bookings', '/api/bookings/?per_page={rows}', 2),
+    ('bookings', '/api/bookings/?per_page={rows}&fields=status,event.title,event.start_datetime,event.status', 2),
+    ('facilitators', '/api/facilitators/?embed=events&fields=first_name,last_name,events.title', 3),
+]
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        from sqlalchemy import event as sa_event
+        self.statements = []
+        sa_event.listen(engine, 'before_cursor_execute', self.before_cursor_execute)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def count(self, function):
+        self.statements.clear()
+        result = function()
+        return len(self.statements), result
+
+
+def timed(repeat, function):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    from flask_jwt_extended import create_access_token
+    from extensions import db
+    from models import Booking, Event, EventStatus
+
+    app = seed(args.rows)
+    client = app.test_client()
+    with app.app_context():
+        headers = {'Authorization': f'Bearer {create_access_token(identity="1")}'}
+        counter = StatementCounter(db.engine)
+
+    def legacy(build):
+        with app.app_context():
+            body = app.json.response(build()).get_data()
+            db.session.remove()
+            return body
+
+    legacy_requests = {
+        'events': lambda: page([default_event_dict(event) for event in Event.query.filter(
+            Event.status == EventStatus.ACTIVE).order_by(Event.start_datetime).limit(args.rows)], 'events'),
+        'bookings': lambda: page([default_booking_dict(booking) for booking in Booking.query.filter(
+            Booking.user_id == 1).order_by(Booking.created_at.desc()).limit(args.rows)], 'bookings'),
+    }
+
+    legacy_bodies = {}
+    print(f"{args.rows} rows per page")
+    print(f"{'request':<100}{'statements':>11}{'KiB':>8}{'ms':>9}")
+    for name, build in legacy_requests.items():
+        statements, _ = counter.count(lambda: legacy(build))
+        ms, body = timed(args.repeat, lambda: legacy(build))
+        legacy_bodies[name] = json.loads(body)
+        print(f"{f'{name} (legacy)':<100}{statements:>11}{len(body) / 1024:>8.1f}{ms:>9.3f}")
+
+    for name, url, expected in REQUESTS:
+        url = url.format(rows=args.rows)
+        statements, response = counter.count(lambda: client.get(url, headers=headers))
+        assert response.status_code == 200, (url, response.get_json())
+        assert statements == expected, (url, statements, counter.statements)
+        if '?per_page' in url and '&' not in url:
+            assert response.get_json()[name] == legacy_bodies[name][name], url
+        if 'fields=' in url:
+            selected = ' '.join(statement for statement in counter.statements if 'count(*)' not in statement)
+            assert 'description' not in selected and 'phone' not in selected, (url, counter.statements)
+        ms, response = timed(args.repeat, lambda: client.get(url, headers=headers))
+        print(f"{url:<100}{statements:>11}{len(response.data) / 1024:>8.1f}{ms:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Google ID token verification against a local stub key server: per-call cert fetch vs cached certs.
+
+Generates an RSA key, serves its certificate from a stub of Google's certs
+endpoint (with injected latency and a Cache-Control max-age), signs ID tokens
+with it and verifies them the way google_login does:
+  - per-call fetch: what google_login used to do (id_token.verify_token with a
+    new transport Request every time),
+  - cached: the app's GoogleTokenVerifier.
+Prints per-token latency and how many times the stub was hit. With a short
+--max-age and some --spacing the cached run also shows background refreshes
+happening without any login paying for a fetch.
+
+Usage:
+    python benchmarks/bench_google_certs.py [--tokens 200] [--latency 50] [--max-age 3600] [--spacing 0]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CLIENT_ID = 'bench-client-id.apps.googleusercontent.com'
+KEY_ID = 'bench-key'
+
+
+def make_key():
+    """RSA private key PEM and a self-signed certificate PEM for it"""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'bench')])
+    now = datetime.now(timezone.utc)
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(x509.random_serial_number()).not_valid_before(now - timedelta(days=1))
+            .not_valid_after(now + timedelta(days=1)).sign(key, hashes.SHA256()))
+    private_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                    serialization.NoEncryption())
+    return private_pem, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+def start_key_server(cert_pem, latency_ms, max_age):
+    """Stub of Google's certs endpoint; server.hits counts the requests it answered"""
+    body = json.dumps({KEY_ID: cert_pem}).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(latency_ms / 1000)
+            server.hits += 1
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Cache-Control', f'public, max-age={max_age}, must-revalidate, no-transform')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+
+    server = Server(('127.0.0.1', 0), Handler)
+    server.hits = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_tokens(private_pem, count):
+    from google.auth import crypt, jwt as google_jwt
+
+    signer = crypt.RSASigner.from_string(private_pem, key_id=KEY_ID)
+    now = int(time.time())
+    return [google_jwt.encode(signer, {
+        'iss': 'https://accounts.google.com', 'aud': CLIENT_ID, 'sub': f'google-{i}',
+        'email': f'google{i}@example.com', 'given_name': 'Google', 'family_name': str(i),
+        'iat': now, 'exp': now + 3600,
+    }).decode() for i in range(count)]
+
+
+def run(verifier, tokens, spacing):
+    latencies, failures = [], 0
+    for token in tokens:
+        started = time.perf_counter()
+        try:
+            verifier.verify(token)
+        except Exception:
+            failures += 1
+        latencies.append(time.perf_counter() - started)
+        if spacing:
+            time.sleep(spacing)
+    latencies.sort()
+    return statistics.median(latencies) * 1000, latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000, failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tokens', type=int, default=200)
+    parser.add_argument('--latency', type=int, default=50, help='injected key server latency in ms')
+    parser.add_argument('--max-age', type=int, default=3600, help='Cache-Control max-age sent by the key server')
+    parser.add_argument('--spacing', type=float, default=0, help='seconds between verifications')
+    args = parser.parse_args()
+
+    private_pem, cert_pem = make_key()
+    server = start_key_server(cert_pem, args.latency, args.max_age)
+    certs_url = f'http://127.0.0.1:{server.server_address[1]}/oauth2/v1/certs'
+    from app import create_app
+
+    app = create_app('testing', {
+        'GOOGLE_CLIENT_ID': CLIENT_ID, 'GOOGLE_CERTS_URL': certs_url,
+        'GOOGLE_CERTS_REFRESH_MARGIN': max(1, args.max_age // 4),
+    })
+
+    class PerCallVerifier:
+        """google_login's original verification: a new transport Request and cert fetch per call"""
+        def verify(self, token):
+            from google.oauth2 import id_token
+            from google.auth.transport import requests
+            return id_token.verify_token(token, requests.Request(), CLIENT_ID, certs_url=certs_url)
+
+    modes = [('per-call fetch', PerCallVerifier()), ('cached', app.extensions['google_verifier'])]
+    print(f"key server latency {args.latency} ms, max-age {args.max_age} s, {args.tokens} tokens per mode")
+    print(f"{'mode':<18}{'p50 ms':>10}{'p99 ms':>10}{'failed':>8}{'fetches':>9}")
+    for name, verifier in modes:
+        tokens = make_tokens(private_pem, args.tokens)
+        hits = server.hits
+        with app.app_context():
+            p50, p99, failures = run(verifier, tokens, args.spacing)
+        print(f"{name:<18}{p50:>10.2f}{p99:>10.2f}{failures:>8}{server.hits - hits:>9}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
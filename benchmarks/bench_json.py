@@ -0,0 +1,201 @@
+"""JSON serialization per endpoint: Flask's default provider vs FastJSONProvider.
+
+Builds the response object of the heaviest list endpoints of both services
+and times turning it into a response:
+  - default: the old to_dict() (isoformat() and float() per field) and
+    Flask's stdlib json provider,
+  - fast: to_dict() returning datetime and Decimal as they are and
+    services.json_provider.FastJSONProvider (orjson when installed).
+The booking API endpoints are built from a seeded SQLite database (the
+to_dict() calls are timed too); the CRM ones from the body of the real
+endpoint on an in-process store (serialization only). Both outputs are
+parsed and compared so the speedup is not bought with different JSON.
+
+Usage:
+    python benchmarks/bench_json.py [--rows 100] [--crm-bookings 20000] [--repeat 200]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+# The to_dict() methods before FastJSONProvider
+def default_user_dict(user):
+    return {
+        'id': user.id,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'phone': user.phone,
+        'created_at': user.created_at.isoformat(),
+        'is_active': user.is_active
+    }
+
+
+def default_event_dict(event):
+    from models import EventStatus, EventType
+    return {
+        'id': event.id,
+        'title': event.title,
+        'description': event.description,
+        'event_type': EventType(event.event_type).name,
+        'facilitator': event.facilitator.to_dict() if event.facilitator else None,
+        'start_datetime': event.start_datetime.isoformat(),
+        'end_datetime': event.end_datetime.isoformat(),
+        'location': event.location,
+        'virtual_link': event.virtual_link,
+        'max_participants': event.max_participants,
+        'current_participants': event.current_participants,
+        'available_spots': event.available_spots,
+        'price': float(event.price),
+        'status': EventStatus(event.status).name,
+        'requirements': event.requirements,
+        'is_full': event.is_full,
+        'created_at': event.created_at.isoformat()
+    }
+
+
+def default_booking_dict(booking):
+    from models import BookingStatus
+    return {
+        'id': booking.id,
+        'user': default_user_dict(booking.user) if booking.user else None,
+        'event': default_event_dict(booking.event) if booking.event else None,
+        'booking_date': booking.booking_date.isoformat(),
+        'status': BookingStatus(booking.status).name,
+        'notes': booking.notes,
+        'payment_status': booking.payment_status,
+        'created_at': booking.created_at.isoformat()
+    }
+
+
+def seed(rows):
+    """SQLite database with one user booked on rows events, returns the app"""
+    os.environ['TEST_DATABASE_URL'] = f'sqlite:///{tempfile.mkdtemp()}/bench_json.db'
+    from app import create_app
+    from extensions import db
+    from models import Booking, BookingStatus, Event, EventType, Facilitator, User
+
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        user = User(email='bench@example.com', first_name='Bench', last_name='User', phone='+15550000000')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Facilitator(user=user.id, bio='Teaches breath work', specialization='Yoga', experience_years=7))
+        db.session.flush()
+        now = datetime.utcnow()
+        for i in range(rows):
+            event = Event(title=f'Morning Flow {i}', description='A gentle morning practice for all levels.',
+                          event_type=EventType.SESSION.value if i % 2 else EventType.RETREAT.value,
+                          facilitator_id=1, start_datetime=now + timedelta(days=i + 1, microseconds=i),
+                          end_datetime=now + timedelta(days=i + 1, hours=2), location='Studio 4',
+                          max_participants=20, current_participants=i % 20, price=Decimal('25.50'))
+            db.session.add(event)
+            db.session.flush()
+            db.session.add(Booking(user_id=user.id, event_id=event.id, notes='Near the window',
+                                   status=BookingStatus.CONFIRMED.value))
+        db.session.commit()
+    return app
+
+
+def page(items, key):
+    return {key: items, 'pagination': {'page': 1, 'pages': 1, 'per_page': len(items), 'total': len(items),
+                                       'has_next': False, 'has_prev': False}}
+
+
+def crm_bodies(bookings):
+    """Bodies of the CRM's heaviest endpoints on a store of bookings notifications"""
+    import crm_service
+
+    rng = random.Random(5)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(1, bookings + 1):
+            crm_service.store_notification({
+                'booking_id': i,
+                'user': {'id': rng.randrange(1, 2000), 'email': 'user@example.com', 'name': 'Jane Doe',
+                         'phone': '+15550000000'},
+                'event': {'id': rng.randrange(1, 200), 'title': 'Morning Flow', 'type': rng.choice(['SESSION', 'RETREAT']),
+                          'start_datetime': '2026-01-01T10:00:00', 'location': 'Studio 4'},
+                'facilitator_id': rng.randrange(1, 10),
+                'booking_date': datetime.utcnow().isoformat(),
+                'notes': 'Near the window',
+            })
+    client = crm_service.app.test_client()
+    headers = {'Authorization': f'Bearer {crm_service.BEARER_TOKEN}'}
+    return {
+        f'CRM {url}': client.get(url, headers=headers).get_json()
+        for url in ('/api/bookings?per_page=100', '/api/facilitators/3/bookings?per_page=100',
+                    '/api/facilitators/3/dashboard')
+    }
+
+
+def timed(repeat, function):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100, help='events and bookings per booking API page')
+    parser.add_argument('--crm-bookings', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    from flask import Flask
+    from flask.json.provider import DefaultJSONProvider
+    from services import json_provider
+    from models import Booking, Event
+
+    app = seed(args.rows)
+    default_app = Flask('default')
+    default_provider = DefaultJSONProvider(default_app)
+    fast_provider = json_provider.FastJSONProvider(app)
+    print(f"fast provider encoder: {'orjson' if json_provider.orjson else 'json (orjson not installed)'}")
+    print(f"{'endpoint':<48}{'default ms':>11}{'fast ms':>9}{'speedup':>9}{'KiB':>7}")
+
+    def report(name, default_build, fast_build):
+        default_ms, default_response = timed(args.repeat, lambda: default_provider.response(default_build()))
+        fast_ms, fast_response = timed(args.repeat, lambda: fast_provider.response(fast_build()))
+        assert json.loads(default_response.get_data()) == json.loads(fast_response.get_data()), name
+        print(f"{name:<48}{default_ms:>11.3f}{fast_ms:>9.3f}{default_ms / fast_ms:>8.1f}x"
+              f"{len(fast_response.get_data()) / 1024:>7.0f}")
+
+    with app.app_context():
+        events = Event.query.order_by(Event.start_datetime).all()
+        bookings = Booking.query.all()
+        for booking in bookings:
+            booking.user, booking.event  # load the relationships outside the timings
+        report(f'GET /api/events/ ({len(events)} events)',
+               lambda: page([default_event_dict(event) for event in events], 'events'),
+               lambda: page([event.to_dict() for event in events], 'events'))
+        report(f'GET /api/bookings/ ({len(bookings)} bookings)',
+               lambda: page([default_booking_dict(booking) for booking in bookings], 'bookings'),
+               lambda: page([booking.to_dict() for booking in bookings], 'bookings'))
+        report(f'GET /api/facilitators/1/events ({len(events)} events)',
+               lambda: {'events': [default_event_dict(event) for event in events]},
+               lambda: {'events': [event.to_dict() for event in events]})
+
+    for name, body in crm_bodies(args.crm_bookings).items():
+        report(name, lambda: body, lambda: body)
+
+
+if __name__ == '__main__':
+    main()
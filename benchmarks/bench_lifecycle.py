@@ -0,0 +1,161 @@
+"""Lifecycle run: completing ended events and archiving old ones.
+
+Seeds a SQLite database with a history of events (default 50k, spread over
+the past three years and the next three months) and their bookings, then:
+  - times the event and booking listing queries on the hot tables,
+  - runs LifecycleScheduler.run_once() and reports what it completed and
+    archived and how long it took, per chunk size,
+  - checks that no ended event is left ACTIVE, no booking of a completed
+    event left CONFIRMED, and that hot + archived rows add up,
+  - times the listing queries again.
+The ORM row-by-row equivalent of the completion step (load every ended
+event and its bookings, set the statuses, commit) is timed on a copy for
+comparison.
+
+Usage:
+    python benchmarks/bench_lifecycle.py [--events 50000] [--bookings-per-event 5] [--chunk-size 1000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def seed(path, events, bookings_per_event):
+    from app import create_app
+    from extensions import db
+    from models import Booking, BookingStatus, Event, EventStatus, EventType, Facilitator, User
+
+    app = create_app('testing', {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'LIFECYCLE_ENABLED': False})
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.execute(db.insert(User), [
+            {'id': i, 'email': f'user{i}@example.com', 'first_name': 'Bench', 'last_name': 'User',
+             'created_at': now, 'updated_at': now} for i in range(1, 1001)])
+        db.session.execute(db.insert(Facilitator), [{'id': i, 'user': i} for i in range(1, 21)])
+        rows, booking_rows = [], []
+        for i in range(1, events + 1):
+            start = now - timedelta(days=3 * 365) + timedelta(minutes=rng.randrange(0, (3 * 365 + 90) * 1440))
+            status = EventStatus.CANCELLED if rng.random() < 0.05 else EventStatus.ACTIVE
+            rows.append({'id': i, 'title': f'Event {i}', 'event_type': EventType.SESSION, 'facilitator_id': rng.randint(1, 20),
+                         'start_datetime': start, 'end_datetime': start + timedelta(hours=2), 'max_participants': 20,
+                         'current_participants': bookings_per_event, 'price': 25, 'status': status,
+                         'created_at': start - timedelta(days=30), 'updated_at': now})
+            for user_id in rng.sample(range(1, 1001), bookings_per_event):
+                booking_rows.append({'user_id': user_id, 'event_id': i, 'booking_date': start - timedelta(days=7),
+                                     'status': BookingStatus.CONFIRMED if rng.random() < 0.9 else BookingStatus.CANCELLED,
+                                     'created_at': start - timedelta(days=7), 'updated_at': now})
+        db.session.execute(db.insert(Event), rows)
+        db.session.execute(db.insert(Booking), booking_rows)
+        db.session.commit()
+    return app
+
+
+def time_listings(app, repeat=20):
+    from extensions import db
+    from models import Booking, Event, EventStatus
+
+    def events():
+        return Event.query.filter(Event.status == EventStatus.ACTIVE, Event.start_datetime > datetime.utcnow()) \
+            .order_by(Event.start_datetime).limit(10).all()
+
+    def bookings():
+        return Booking.query.filter(Booking.user_id == 7).order_by(Booking.created_at.desc()).limit(10).all()
+
+    result = {}
+    with app.app_context():
+        for name, query in (('events list', events), ('bookings list', bookings)):
+            times = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                query()
+                times.append(time.perf_counter() - started)
+                db.session.remove()
+            result[name] = statistics.median(times) * 1000
+    return result
+
+
+def counts(app):
+    from extensions import db
+    from models import Booking, Event, bookings_archive, events_archive
+
+    with app.app_context():
+        return {name: db.session.execute(db.select(db.func.count()).select_from(table)).scalar()
+                for name, table in (('events', Event.__table__), ('bookings', Booking.__table__),
+                                    ('events_archive', events_archive), ('bookings_archive', bookings_archive))}
+
+
+def orm_complete(app):
+    """Row-by-row equivalent of the completion step, for comparison"""
+    from extensions import db
+    from models import BookingStatus, Event, EventStatus
+
+    now = datetime.utcnow()
+    with app.app_context():
+        started = time.perf_counter()
+        for event in Event.query.filter(Event.status == EventStatus.ACTIVE, Event.end_datetime <= now):
+            event.status = EventStatus.COMPLETED
+            for booking in event.bookings:
+                if booking.status == BookingStatus.CONFIRMED:
+                    booking.status = BookingStatus.COMPLETED
+        db.session.commit()
+        elapsed = time.perf_counter() - started
+        db.session.rollback()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=50000)
+    parser.add_argument('--bookings-per-event', type=int, default=5)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    from extensions import db, lifecycle
+    from models import Booking, BookingStatus, Event, EventStatus
+
+    directory = tempfile.mkdtemp()
+    orm_seconds = orm_complete(seed(os.path.join(directory, 'orm.db'), args.events, args.bookings_per_event))
+    # Seeded last: the lifecycle extension runs against the app it was last initialised with
+    app = seed(os.path.join(directory, 'lifecycle.db'), args.events, args.bookings_per_event)
+    before_rows = counts(app)
+    before = time_listings(app)
+
+    lifecycle.chunk_size = args.chunk_size
+    started = time.perf_counter()
+    result = lifecycle.run_once()
+    seconds = time.perf_counter() - started
+    after_rows = counts(app)
+    after = time_listings(app)
+
+    with app.app_context():
+        now = datetime.utcnow()
+        assert not Event.query.filter(Event.status == EventStatus.ACTIVE, Event.end_datetime <= now).count()
+        assert not Booking.query.join(Event).filter(Event.status == EventStatus.COMPLETED,
+                                                    Booking.status == BookingStatus.CONFIRMED).count()
+    for table in ('events', 'bookings'):
+        assert before_rows[table] == after_rows[table] + after_rows[f'{table}_archive'], table
+
+    print(f"{args.events:,} events, {before_rows['bookings']:,} bookings, chunks of {args.chunk_size}")
+    print(f"run_once: {seconds:.2f}s {result}")
+    print(f"ORM row by row, completion step only: {orm_seconds:.2f}s")
+    print(f"hot rows: {before_rows['events']:,} -> {after_rows['events']:,} events, "
+          f"{before_rows['bookings']:,} -> {after_rows['bookings']:,} bookings")
+    for name in before:
+        print(f"{name:<14} {before[name]:.3f} ms -> {after[name]:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
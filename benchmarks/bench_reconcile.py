@@ -0,0 +1,154 @@
+"""CRM reconciliation: range digests vs comparing every booking id.
+
+Seeds a SQLite database with --bookings bookings (a tenth of them already in
+bookings_archive) and an in-process CRM store holding all of them but
+1000, then runs services.reconciliation.CrmReconciler against the CRM's
+test client as the CRM catches up: at each level of drift (1000, 100, 10,
+1, 0 missing bookings) it reports the CRM requests, the bytes received, the
+database queries, the ranges and ids compared and the time of a dry run,
+next to fetching every id of both sides. Between levels the reconciler
+resends part of the missing bookings; the last run resends the rest and a
+final run checks both sides are in sync.
+
+Usage:
+    python benchmarks/bench_reconcile.py [--bookings 100000] [--fanout 16] [--leaf-size 64]
+"""
+import argparse
+import contextlib
+import os
+import random
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DRIFTS = (1000, 100, 10, 1, 0)
+
+
+def seed(path, bookings):
+    from app import create_app
+    from extensions import db
+    from models import Booking, BookingStatus, Event, EventType, Facilitator, User, bookings_archive
+
+    app = create_app('testing', {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'LIFECYCLE_ENABLED': False})
+    now = datetime.utcnow()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.execute(db.insert(User), [
+            {'id': i, 'email': f'user{i}@example.com', 'first_name': 'Bench', 'last_name': 'User',
+             'created_at': now, 'updated_at': now} for i in range(1, 1001)])
+        db.session.execute(db.insert(Facilitator), [{'id': i, 'user': i} for i in range(1, 21)])
+        db.session.execute(db.insert(Event), [
+            {'id': i, 'title': f'Event {i}', 'event_type': EventType.SESSION, 'facilitator_id': i % 20 + 1,
+             'start_datetime': now + timedelta(days=i % 90), 'end_datetime': now + timedelta(days=i % 90, hours=2),
+             'max_participants': 100, 'current_participants': 0, 'price': 25, 'created_at': now, 'updated_at': now}
+            for i in range(1, 2001)])
+        # One booking per user and event
+        rows = [{'id': i, 'user_id': i % 1000 + 1, 'event_id': i // 1000 % 2000 + 1, 'booking_date': now,
+                 'status': BookingStatus.CONFIRMED, 'created_at': now, 'updated_at': now}
+                for i in range(1, bookings + 1)]
+        archived = bookings // 10
+        db.session.execute(db.insert(bookings_archive), [dict(row, archived_at=now) for row in rows[:archived]])
+        db.session.execute(db.insert(Booking), rows[archived:])
+        db.session.commit()
+    return app
+
+
+def notification(booking_id):
+    return {
+        'booking_id': booking_id,
+        'user': {'id': booking_id % 1000 + 1, 'email': 'user@example.com', 'name': 'Bench User'},
+        'event': {'id': booking_id % 2000 + 1, 'title': 'Event', 'type': 'SESSION'},
+        'facilitator_id': booking_id % 20 + 1,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bookings', type=int, default=100000)
+    parser.add_argument('--fanout', type=int, default=16)
+    parser.add_argument('--leaf-size', type=int, default=64)
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    directory = tempfile.mkdtemp()
+    os.environ['CRM_SNAPSHOT_FILE'] = os.path.join(directory, 'crm.snap')
+    import crm_service
+    from extensions import db
+    from services.reconciliation import CrmReconciler
+
+    app = seed(os.path.join(directory, 'reconcile.db'), args.bookings)
+    rng = random.Random(5)
+    # Missing bookings are drawn from the hot table, so the reconciler can resend them
+    missing = rng.sample(range(args.bookings // 10 + 1, args.bookings + 1), DRIFTS[0])
+    quiet = contextlib.redirect_stdout(open(os.devnull, 'w'))
+    with quiet:
+        skipped = set(missing)
+        for booking_id in range(1, args.bookings + 1):
+            if booking_id not in skipped:
+                crm_service.store_notification(notification(booking_id))
+        crm_service.save_data_to_file()
+
+    client = crm_service.app.test_client()
+    headers = {'Authorization': f'Bearer {crm_service.BEARER_TOKEN}'}
+    received = [0]
+
+    def post(path, body):
+        with quiet:
+            response = client.post(path, headers=headers, json=body)
+        received[0] += len(response.data)
+        return response.get_json() if response.status_code == 200 else None
+
+    def full_comparison():
+        from models import Booking, bookings_archive
+
+        started = time.perf_counter()
+        crm_ids = post('/api/reconcile/ids', {'ranges': [[0, args.bookings + 1]]})['booking_ids']
+        db_ids = set(db.session.execute(db.select(Booking.id)).scalars())
+        db_ids.update(db.session.execute(db.select(bookings_archive.c.id)).scalars())
+        assert len(db_ids - set(crm_ids)) == len(missing)
+        return time.perf_counter() - started, len(crm_ids) + len(db_ids)
+
+    reconciler = CrmReconciler(args.fanout, args.leaf_size, post=post)
+    print(f"{args.bookings:,} bookings, fanout {args.fanout}, leaves of {args.leaf_size} ids")
+    print(f"{'missing':>8}{'requests':>10}{'KiB':>9}{'queries':>9}{'ranges':>8}{'ids':>7}{'ms':>8}")
+    with app.app_context():
+        received[0] = 0
+        full_seconds, full_ids = full_comparison()
+        full_bytes = received[0]
+        for index, drift in enumerate(DRIFTS):
+            assert len(missing) == drift
+            received[0] = 0
+            started = time.perf_counter()
+            report = reconciler.run(dry_run=True)
+            seconds = time.perf_counter() - started
+            assert sorted(report['missing']) == sorted(missing), drift
+            assert not report['missing_archived'] and not report['crm_only']
+            print(f"{drift:>8}{report['crm_requests']:>10}{received[0] / 1024:>9.1f}{report['db_queries']:>9}"
+                  f"{report['ranges_compared']:>8}{report['ids_compared']:>7}{seconds * 1000:>8.1f}")
+            # Catch the CRM up to the next level of drift; the last one through a full run
+            if drift == 1:
+                report = reconciler.run()
+                assert report['resent'] == 1 and not report['resend_failures']
+                missing.clear()
+            elif drift:
+                keep = DRIFTS[index + 1]
+                reconciler.report = dict.fromkeys(('crm_requests', 'db_queries', 'resent', 'resend_failures'), 0)
+                reconciler.resend(db.session, sorted(missing[keep:]))
+                assert reconciler.report['resent'] == drift - keep
+                del missing[keep:]
+    assert crm_service.booking_columns.size == args.bookings
+    print(f"{'every id':>8}{1:>10}{full_bytes / 1024:>9.1f}{2:>9}{'-':>8}{full_ids:>7}"
+          f"{full_seconds * 1000:>8.1f}")
+    # Save now, so neither the saver thread nor the exit save writes it again after it is removed
+    crm_service.save_data_to_file()
+    os.remove(crm_service.SNAPSHOT_FILE)
+
+
+if __name__ == '__main__':
+    main()
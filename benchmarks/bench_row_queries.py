@@ -0,0 +1,91 @@
+"""Read-only listings: ORM instances vs plain rows (Fieldset.rows()).
+
+Seeds a SQLite database (bench_json.seed) and reads every future event the
+way GET /api/events/ does, for the default fieldset and the list screen's
+sparse one:
+  - orm: Event instances loaded with Fieldset.options() (facilitator and
+    its user joined in) and written with to_dict(),
+  - rows: the same columns selected as tuples, available_spots and is_full
+    computed in SQL, written with serialize_row().
+Each read runs in a fresh session, as a request does. Reports rows/sec and
+the peak Python memory allocated (tracemalloc) per read; both outputs are
+compared.
+
+Usage:
+    python benchmarks/bench_row_queries.py [--rows 5000] [--repeat 10]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_json import seed
+
+FIELDSETS = [
+    ('default', None, None),
+    ('list screen', 'title,start_datetime,status,available_spots', None),
+]
+
+
+def measure(repeat, read):
+    """Median seconds, peak traced bytes and the result of read()"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = read()
+        times.append(time.perf_counter() - started)
+    tracemalloc.start()
+    read()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(times), peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    from extensions import db
+    from models import Event, EventStatus, Fieldset
+
+    app = seed(args.rows)
+    print(f"{args.rows} events")
+    print(f"{'fieldset':<14}{'path':<6}{'rows/s':>11}{'peak KiB':>10}{'speedup':>9}{'memory':>8}")
+    with app.app_context():
+        def query():
+            return Event.query.filter(Event.status == EventStatus.ACTIVE).order_by(Event.start_datetime.asc())
+
+        for name, fields, embed in FIELDSETS:
+            fieldset = Fieldset.parse(Event, fields, embed)
+
+            def orm():
+                try:
+                    return [event.to_dict(fieldset) for event in query().options(*fieldset.options()).all()]
+                finally:
+                    db.session.remove()
+
+            def rows():
+                try:
+                    return [fieldset.serialize_row(row) for row in fieldset.rows(query()).all()]
+                finally:
+                    db.session.remove()
+
+            orm_seconds, orm_peak, orm_result = measure(args.repeat, orm)
+            rows_seconds, rows_peak, rows_result = measure(args.repeat, rows)
+            assert orm_result == rows_result, name
+            print(f"{name:<14}{'orm':<6}{len(orm_result) / orm_seconds:>11,.0f}{orm_peak / 1024:>10,.0f}")
+            print(f"{name:<14}{'rows':<6}{len(rows_result) / rows_seconds:>11,.0f}{rows_peak / 1024:>10,.0f}"
+                  f"{orm_seconds / rows_seconds:>8.1f}x{orm_peak / rows_peak:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
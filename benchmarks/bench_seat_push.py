@@ -0,0 +1,97 @@
+"""Seat availability push: watchers of a hot event, SSE hub vs polling.
+
+Opens --watchers streams of one event on services.seat_push.SeatHub (each
+consumed by its own thread, as a threaded or gevent worker would) and
+publishes --rate bookings per second for --seconds, the way create_booking
+does. Reports how many broadcasts the publishes coalesced into, the
+messages and bytes each watcher received, the delay from the newest
+publish a broadcast carries to its delivery, and the database reads: the
+hub's resyncs against what the watchers would have run polling
+GET /api/events/<id> every --poll-interval seconds.
+
+Usage:
+    python benchmarks/bench_seat_push.py [--watchers 1000] [--rate 200] [--seconds 5] [--coalesce-ms 250]
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_json import seed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--watchers', type=int, default=1000)
+    parser.add_argument('--rate', type=int, default=200, help='bookings per second on the event')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--coalesce-ms', type=int, default=250)
+    parser.add_argument('--resync', type=int, default=5)
+    parser.add_argument('--poll-interval', type=float, default=2, help='polling period of the clients without push')
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    from extensions import seat_hub
+
+    app = seed(1)
+    app.config.update(SEAT_PUSH_COALESCE_MS=args.coalesce_ms, SEAT_PUSH_RESYNC=args.resync, SEAT_PUSH_KEEPALIVE=1,
+                      SEAT_PUSH_MAX_WATCHERS=args.watchers)
+    seat_hub.init_app(app)
+    published_at = {}  # participant count -> when it was published
+    delays, received, received_bytes = [], [0] * args.watchers, [0] * args.watchers
+    lock = threading.Lock()
+    max_participants = 10 ** 9
+
+    def watch(index, stream):
+        for chunk in stream:
+            arrived = time.perf_counter()
+            received[index] += 1
+            received_bytes[index] += len(chunk)
+            if b'current_participants' in chunk:
+                count = int(chunk.split(b'"current_participants":')[1].split(b',')[0])
+                if count in published_at:
+                    with lock:
+                        delays.append(arrived - published_at[count])
+
+    streams = []
+    for index in range(args.watchers):
+        channel = seat_hub.join(1, 0, max_participants)
+        stream = seat_hub.stream(1, channel)
+        streams.append(stream)
+        threading.Thread(target=watch, args=(index, stream), daemon=True).start()
+    time.sleep(0.5)
+
+    started = time.perf_counter()
+    count, bookings = 0, int(args.rate * args.seconds)
+    for booking in range(bookings):
+        count += 1
+        published_at[count] = time.perf_counter()
+        seat_hub.publish(1, count, max_participants)
+        time.sleep(max(0.0, started + (booking + 1) / args.rate - time.perf_counter()))
+    time.sleep(args.coalesce_ms / 1000 * 2)
+    elapsed = time.perf_counter() - started
+    stats = seat_hub.stats()
+    for stream in streams:
+        stream.close()
+
+    polls = args.watchers * elapsed / args.poll_interval
+    print(f"{args.watchers} watchers, {bookings} bookings in {elapsed:.1f}s, coalescing {args.coalesce_ms} ms")
+    print(f"broadcasts: {stats['broadcasts']} for {stats['published']} publishes")
+    print(f"per watcher: {statistics.mean(received):.1f} messages, {statistics.mean(received_bytes):.0f} bytes "
+          f"(keepalives included)")
+    if delays:
+        delays.sort()
+        print(f"newest publish of a broadcast -> delivery: p50 {delays[len(delays) // 2] * 1000:.0f} ms, "
+              f"p99 {delays[int(len(delays) * 0.99)] * 1000:.0f} ms")
+    print(f"database reads: {stats['resyncs']} resyncs vs {polls:,.0f} polls every {args.poll_interval:g}s")
+    assert seat_hub.stats()['watchers'] == 0
+
+
+if __name__ == '__main__':
+    main()
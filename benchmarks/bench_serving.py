@@ -0,0 +1,162 @@
+"""Throughput comparison: Flask dev server vs serve.py worker models.
+
+Seeds a SQLite stand-in database, starts each server as a subprocess and
+drives it with concurrent keep-alive clients.
+
+Usage:
+    python benchmarks/bench_serving.py [--clients 32] [--duration 5]
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEV_SERVER = (
+    "from app import create_app; "
+    "create_app().run(host='127.0.0.1', port={port}, debug=True, use_reloader=False)"
+)
+
+
+def seed(db_path):
+    """Create tables and a handful of events, return a valid access token"""
+    os.environ['TEST_DATABASE_URL'] = f'sqlite:///{db_path}'
+    from app import create_app
+    from extensions import db
+    from flask_jwt_extended import create_access_token
+    from models import User, Facilitator, Event, EventType
+
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        user = User(email='bench@example.com', first_name='Bench', last_name='User')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.flush()
+        facilitator = Facilitator(user=user.id, bio='bench', specialization='bench', experience_years=1)
+        db.session.add(facilitator)
+        db.session.flush()
+        now = datetime.utcnow()
+        for i in range(50):
+            db.session.add(Event(
+                title=f'Bench event {i}',
+                event_type=EventType.SESSION.value if i % 2 else EventType.RETREAT.value,
+                facilitator_id=facilitator.id,
+                start_datetime=now + timedelta(days=i + 1),
+                end_datetime=now + timedelta(days=i + 1, hours=2),
+                max_participants=20,
+                price=Decimal('25.00'),
+            ))
+        db.session.commit()
+        return create_access_token(identity=str(user.id))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(f'http://127.0.0.1:{port}/health', timeout=1)
+            return True
+        except requests.RequestException:
+            time.sleep(0.2)
+    return False
+
+
+def drive(port, path, token, clients, duration):
+    """Hammer one path from N client threads, return (req/s, p50 ms, p99 ms, errors)"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def client():
+        session = requests.Session()
+        session.headers['Authorization'] = f'Bearer {token}'
+        local, local_errors = [], 0
+        while time.time() < stop_at:
+            started = time.perf_counter()
+            try:
+                response = session.get(f'http://127.0.0.1:{port}{path}', timeout=10)
+                if response.status_code != 200:
+                    local_errors += 1
+            except requests.RequestException:
+                local_errors += 1
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0
+    return len(latencies) / duration, statistics.median(latencies) * 1000, p99 * 1000, errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    token = seed(db_path)
+    env = dict(os.environ, FLASK_ENV='testing', TEST_DATABASE_URL=f'sqlite:///{db_path}', PYTHONPATH=ROOT)
+
+    modes = [
+        ('dev server (debug)', lambda port: [sys.executable, '-c', DEV_SERVER.format(port=port)]),
+        ('serve.py sync', lambda port: [sys.executable, 'serve.py', 'api', '--worker-class', 'sync',
+                                        '--workers', str(args.workers), '--bind', f'127.0.0.1:{port}']),
+        ('serve.py threaded', lambda port: [sys.executable, 'serve.py', 'api', '--worker-class', 'threaded',
+                                            '--workers', str(args.workers), '--threads', '8',
+                                            '--bind', f'127.0.0.1:{port}']),
+    ]
+    try:
+        import gevent  # noqa: F401
+        modes.append(('serve.py gevent', lambda port: [sys.executable, 'serve.py', 'api', '--worker-class', 'gevent',
+                                                       '--workers', str(args.workers),
+                                                       '--bind', f'127.0.0.1:{port}']))
+    except ImportError:
+        pass
+
+    print(f"{'mode':<22}{'path':<16}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, command in modes:
+        port = free_port()
+        proc = subprocess.Popen(command(port), cwd=ROOT, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_ready(port):
+                print(f"{name:<22}failed to start")
+                continue
+            for path in ('/health', '/api/events/'):
+                rps, p50, p99, errors = drive(port, path, token, args.clients, args.duration)
+                print(f"{name:<22}{path:<16}{rps:>10.0f}{p50:>10.1f}{p99:>10.1f}{errors:>8}")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Cold-start benchmark: import time per module and create_app wall time.
+
+Runs `create_app()` in fresh interpreters under `python -X importtime`, once
+with the default eager startup and once with FAST_STARTUP, and reports the
+slowest top-level imports. Use --json to record a run and --baseline to fail
+when total startup regresses against a recorded one.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--top 15] [--json out.json] [--baseline base.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = (
+    "import time; started = time.perf_counter(); "
+    "from app import create_app; create_app(); "
+    "print('create_app_ms', (time.perf_counter() - started) * 1000)"
+)
+
+
+def run_once(fast):
+    """Return (create_app ms, {module: cumulative import us}) for one cold start"""
+    env = dict(os.environ, FLASK_ENV='testing', FAST_STARTUP='true' if fast else 'false', PYTHONPATH=ROOT)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative_us)
+
+    wall_ms = next(float(line.split()[1]) for line in result.stdout.splitlines() if line.startswith('create_app_ms'))
+    return wall_ms, modules
+
+
+def measure(fast, runs):
+    walls, per_module = [], {}
+    for _ in range(runs):
+        wall_ms, modules = run_once(fast)
+        walls.append(wall_ms)
+        for name, us in modules.items():
+            per_module.setdefault(name, []).append(us)
+    return {
+        'create_app_ms': statistics.median(walls),
+        'modules_ms': {name: statistics.median(values) / 1000 for name, values in per_module.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--baseline', help='compare against a previous --json run')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='allowed slowdown vs baseline (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    results = {'eager': measure(False, args.runs), 'fast': measure(True, args.runs)}
+
+    for mode, data in results.items():
+        print(f"\n== {mode} startup: create_app {data['create_app_ms']:.1f} ms (median of {args.runs})")
+        # Cumulative time, so a package's row includes everything it pulled in
+        slowest = sorted(data['modules_ms'].items(), key=lambda item: item[1], reverse=True)[:args.top]
+        for name, ms in slowest:
+            print(f"   {ms:8.1f} ms  {name}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failed = False
+        for mode, data in results.items():
+            allowed = baseline[mode]['create_app_ms'] * (1 + args.max_regression)
+            if data['create_app_ms'] > allowed:
+                print(f"❌ {mode} startup regressed: {data['create_app_ms']:.1f} ms > {allowed:.1f} ms")
+                failed = True
+        if failed:
+            sys.exit(1)
+        print("✅ Startup time within budget")
+
+
+if __name__ == '__main__':
+    main()
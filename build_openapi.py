@@ -0,0 +1,30 @@
+"""Generate the OpenAPI spec at build time so FAST_STARTUP workers never import flasgger.
+
+Usage:
+    python build_openapi.py [output_path]
+"""
+import json
+import os
+import sys
+
+from app import create_app
+
+
+def build_spec(output_path=None):
+    """Render the flasgger spec once and write it to OPENAPI_SPEC_PATH"""
+    app = create_app(config_overrides={'FAST_STARTUP': False})
+    output_path = output_path or app.config['OPENAPI_SPEC_PATH']
+    
+    response = app.test_client().get('/apispec_1.json')
+    if response.status_code != 200:
+        raise RuntimeError(f'Could not render spec: HTTP {response.status_code}')
+    
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump(response.get_json(), f, indent=2, sort_keys=True)
+    
+    return output_path
+
+if __name__ == '__main__':
+    path = build_spec(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"✅ OpenAPI spec written to {path}")
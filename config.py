@@ -1,6 +1,8 @@
 import os
 from datetime import timedelta
 
+basedir = os.path.abspath(os.path.dirname(__file__))
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     
@@ -15,6 +17,12 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         f'mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}?charset=utf8mb4'
     
+    # Read replicas for GET requests (comma-separated URLs); writes always use the primary
+    SQLALCHEMY_REPLICA_URIS = [url for url in (os.environ.get('DATABASE_REPLICA_URLS') or '').split(',') if url]
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS') or 5)  # read-your-writes window
+    # Where the window is kept: memory:// (per process), sqlite:////path/to/file.db (workers of a host) or redis://...
+    REPLICA_STICKY_STORAGE_URL = os.environ.get('REPLICA_STICKY_STORAGE_URL') or 'memory://'
+    
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_pre_ping': True,
@@ -37,16 +45,99 @@ class Config:
     # Google OAuth Configuration
     GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID')
     GOOGLE_CLIENT_SECRET = os.environ.get('GOOGLE_CLIENT_SECRET')
+    # Google's ID token signing certificates, cached for their Cache-Control max-age
+    GOOGLE_CERTS_URL = os.environ.get('GOOGLE_CERTS_URL') or 'https://www.googleapis.com/oauth2/v1/certs'
+    GOOGLE_CERTS_REFRESH_MARGIN = int(os.environ.get('GOOGLE_CERTS_REFRESH_MARGIN') or 300)  # refetch this many seconds before expiry
+    GOOGLE_CERTS_DEFAULT_MAX_AGE = int(os.environ.get('GOOGLE_CERTS_DEFAULT_MAX_AGE') or 3600)  # when no max-age is sent
     
     # CRM Service Configuration
     CRM_SERVICE_URL = os.environ.get('CRM_SERVICE_URL') or 'http://localhost:8003'
     CRM_BEARER_TOKEN = os.environ.get('CRM_BEARER_TOKEN') or 'crm-static-bearer-token-123'
+    
+    # Cart checkout (POST /api/bookings/cart)
+    CART_MAX_ITEMS = int(os.environ.get('CART_MAX_ITEMS') or 20)
+    
+    # Idempotency-Key support for POST /api/bookings
+    IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL') or 24 * 3600)  # seconds
+    IDEMPOTENCY_MAX_KEYS = int(os.environ.get('IDEMPOTENCY_MAX_KEYS') or 100000)
+    IDEMPOTENCY_WAIT_TIMEOUT = int(os.environ.get('IDEMPOTENCY_WAIT_TIMEOUT') or 15)  # seconds a duplicate waits
+    # memory:// (per process), sqlite:////path/to/file.db (shared by workers on a host) or redis://host:6379/0; with
+    # several workers a per-process store lets a retry that lands on another worker book again
+    IDEMPOTENCY_STORAGE_URL = os.environ.get('IDEMPOTENCY_STORAGE_URL') or 'memory://'
+    # Seconds a shared claim stays in flight, so a worker dying mid-request does not block its key (above WSGI_TIMEOUT)
+    IDEMPOTENCY_CLAIM_TTL = int(os.environ.get('IDEMPOTENCY_CLAIM_TTL') or 120)
+    
+    # Async execution mode: Flask async views for I/O-bound endpoints (serve with the gevent worker)
+    ASYNC_MODE = (os.environ.get('ASYNC_MODE') or 'false').lower() == 'true'
+    DB_THREAD_POOL_SIZE = int(os.environ.get('DB_THREAD_POOL_SIZE') or 0)  # 0 = pool_size + max_overflow
+    ASYNC_HTTP_MAX_CONNECTIONS = int(os.environ.get('ASYNC_HTTP_MAX_CONNECTIONS') or 100)
+    
+    # Rate limiting (token buckets per route and client IP / user id)
+    RATE_LIMIT_ENABLED = (os.environ.get('RATE_LIMIT_ENABLED') or 'true').lower() == 'true'
+    # memory:// (per process), sqlite:////path/to/file.db (shared by workers on a host) or redis://host:6379/0
+    RATE_LIMIT_STORAGE_URL = os.environ.get('RATE_LIMIT_STORAGE_URL') or 'memory://'
+    RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS') or 100000)
+    RATE_LIMITS = {
+        'login': os.environ.get('RATE_LIMIT_LOGIN') or '10/minute',
+        'register': os.environ.get('RATE_LIMIT_REGISTER') or '5/minute',
+        'booking': os.environ.get('RATE_LIMIT_BOOKING') or '30/minute',
+    }
+    
+    # Response compression (gzip, and brotli when installed) of JSON/text responses of at least COMPRESSION_MIN_SIZE
+    # bytes; levels picked with benchmarks/bench_compression.py, higher ones cost more CPU than they save in transfer
+    COMPRESSION_ENABLED = (os.environ.get('COMPRESSION_ENABLED') or 'true').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE') or 1024)
+    COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL') or 5)
+    COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY') or 4)
+    
+    # Live seat availability (GET /api/events/<id>/seats/stream, services/seat_push.py): updates within the coalescing
+    # window go out as one broadcast; watched events are re-read every SEAT_PUSH_RESYNC seconds (0 = never) to pick up
+    # bookings made by other worker processes. Each open stream holds a worker thread or greenlet: serve with gevent
+    SEAT_PUSH_COALESCE_MS = int(os.environ.get('SEAT_PUSH_COALESCE_MS') or 250)
+    SEAT_PUSH_KEEPALIVE = int(os.environ.get('SEAT_PUSH_KEEPALIVE') or 15)  # seconds between keepalive comments
+    SEAT_PUSH_RESYNC = int(os.environ.get('SEAT_PUSH_RESYNC') or 5)
+    # Open streams per process; serve.py lowers it to half the threads of a worker that is not gevent
+    SEAT_PUSH_MAX_WATCHERS = int(os.environ.get('SEAT_PUSH_MAX_WATCHERS') or 10000)
+    
+    # Lifecycle scheduler (services/lifecycle.py): completes ended events and their bookings, then moves events that
+    # ended more than LIFECYCLE_RETENTION_DAYS ago, and their bookings, to the archive tables
+    LIFECYCLE_ENABLED = (os.environ.get('LIFECYCLE_ENABLED') or 'false').lower() == 'true'
+    LIFECYCLE_INTERVAL = int(os.environ.get('LIFECYCLE_INTERVAL') or 300)  # seconds between runs
+    LIFECYCLE_CHUNK_SIZE = int(os.environ.get('LIFECYCLE_CHUNK_SIZE') or 1000)  # events per transaction
+    LIFECYCLE_RETENTION_DAYS = int(os.environ.get('LIFECYCLE_RETENTION_DAYS') or 365)
+    # Lock file electing the one process of the host that runs it
+    LIFECYCLE_LOCK_PATH = os.environ.get('LIFECYCLE_LOCK_PATH') or '/tmp/booking_lifecycle.lock'
+    
+    # Startup-optimized mode: skip flasgger/flask-migrate at boot and serve a prebuilt spec
+    FAST_STARTUP = (os.environ.get('FAST_STARTUP') or 'false').lower() == 'true'
+    OPENAPI_SPEC_PATH = os.environ.get('OPENAPI_SPEC_PATH') or os.path.join(basedir, 'static', 'openapi.json')
+    
+    # WSGI Server Configuration (see serve.py)
+    WSGI_BIND = os.environ.get('WSGI_BIND') or '0.0.0.0:8000'
+    CRM_WSGI_BIND = os.environ.get('CRM_WSGI_BIND') or '0.0.0.0:8003'
+    WSGI_WORKER_CLASS = os.environ.get('WSGI_WORKER_CLASS') or 'threaded'  # sync, threaded or gevent
+    WSGI_WORKERS = int(os.environ.get('WSGI_WORKERS') or 0)  # 0 = derive from CPU count
+    WSGI_THREADS = int(os.environ.get('WSGI_THREADS') or 4)
+    WSGI_WORKER_CONNECTIONS = int(os.environ.get('WSGI_WORKER_CONNECTIONS') or 100)  # gevent only
+    WSGI_PRELOAD = (os.environ.get('WSGI_PRELOAD') or 'true').lower() == 'true'
+    WSGI_TIMEOUT = int(os.environ.get('WSGI_TIMEOUT') or 30)
+    WSGI_GRACEFUL_TIMEOUT = int(os.environ.get('WSGI_GRACEFUL_TIMEOUT') or 30)
+    WSGI_KEEPALIVE = int(os.environ.get('WSGI_KEEPALIVE') or 5)
+    WSGI_MAX_REQUESTS = int(os.environ.get('WSGI_MAX_REQUESTS') or 5000)
+    WSGI_MAX_REQUESTS_JITTER = int(os.environ.get('WSGI_MAX_REQUESTS_JITTER') or 500)
 
 class DevelopmentConfig(Config):
     DEBUG = True
 
 class ProductionConfig(Config):
     DEBUG = False
+    FAST_STARTUP = (os.environ.get('FAST_STARTUP') or 'true').lower() == 'true'
+    LIFECYCLE_ENABLED = (os.environ.get('LIFECYCLE_ENABLED') or 'true').lower() == 'true'
+    # Workers of a host share Idempotency-Keys
+    IDEMPOTENCY_STORAGE_URL = os.environ.get('IDEMPOTENCY_STORAGE_URL') or 'sqlite:////tmp/booking_idempotency.db'
+    # ... and users' read-your-writes windows
+    REPLICA_STICKY_STORAGE_URL = (os.environ.get('REPLICA_STICKY_STORAGE_URL')
+                                  or 'sqlite:////tmp/booking_replica_sticky.db')
     # Production MySQL settings
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_pre_ping': True,
@@ -60,8 +151,16 @@ class ProductionConfig(Config):
         }
     }
 
+class TestingConfig(Config):
+    TESTING = True
+    # SQLite stand-in for local runs, benchmarks and tooling
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or 'sqlite:////tmp/booking_system_test.db'
+    SQLALCHEMY_REPLICA_URIS = [url for url in (os.environ.get('TEST_DATABASE_REPLICA_URLS') or '').split(',') if url]
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
+    'testing': TestingConfig,
     'default': DevelopmentConfig
 }
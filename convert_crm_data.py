@@ -0,0 +1,32 @@
+"""Convert the CRM service's JSON data file to the binary snapshot it starts from.
+
+Usage:
+    python convert_crm_data.py [json_path] [snapshot_path]
+"""
+import json
+import os
+import sys
+from datetime import datetime
+
+from crm.changes import ChangeFeed
+from crm.columnar import BookingColumns
+from crm.records import load_json_store
+from crm.snapshot import write_snapshot
+
+
+def convert(json_path, snapshot_path):
+    """Write a snapshot of a JSON data file and return the number of bookings in it"""
+    with open(json_path, 'r') as f:
+        data = json.load(f)
+    log, users, events, facilitators = load_json_store(data)
+    columns = BookingColumns.from_records(log, events)
+    changes = ChangeFeed.of_inserts(columns.view()['received_us'])
+    write_snapshot(snapshot_path, log, columns, changes, users, events, facilitators,
+                   data.get('last_updated') or datetime.utcnow().isoformat())
+    return len(log)
+
+if __name__ == '__main__':
+    json_path = sys.argv[1] if len(sys.argv) > 1 else os.environ.get('CRM_DATA_FILE', '/tmp/crm_data.json')
+    snapshot_path = sys.argv[2] if len(sys.argv) > 2 else os.environ.get('CRM_SNAPSHOT_FILE', '/tmp/crm_data.snap')
+    count = convert(json_path, snapshot_path)
+    print(f"✅ Wrote {count} bookings from {json_path} to {snapshot_path}")
@@ -0,0 +1,98 @@
+import threading
+
+import numpy as np
+
+from crm.columnar import Codes
+
+
+class ChangeFeed:
+    """Monotonic log of the CRM store's changes: booking inserts and CRM status updates.
+
+    Change n (n = 1, 2, ...) is entry n - 1 of a set of NumPy arrays that grow
+    by doubling: the row of the booking it touched, its kind, the CRM status it
+    set and when. Consumers read the entries after the last sequence number
+    they saw, and can block in wait() until there is one.
+    """
+
+    KINDS = ('insert', 'status')
+    COLUMNS = {
+        'row': np.int32,
+        'kind': np.int8,
+        'crm_status': np.int8,
+        'at_us': np.int64,
+    }
+
+    def __init__(self, capacity=1024):
+        self._condition = threading.Condition()
+        self.size = 0
+        self.arrays = {name: np.zeros(capacity, dtype=dtype) for name, dtype in self.COLUMNS.items()}
+        self.statuses = Codes()
+
+    @classmethod
+    def of_inserts(cls, received_us):
+        """Feed of a store whose changes were not recorded: one insert per row, in row order"""
+        feed = cls(capacity=max(1024, len(received_us)))
+        size = len(received_us)
+        feed.arrays['row'][:size] = np.arange(size)
+        feed.arrays['crm_status'][:size] = feed.statuses.encode('new')
+        feed.arrays['at_us'][:size] = received_us
+        feed.size = size
+        return feed
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """The feed saved in a crm.snapshot.Snapshot; snapshots written before the feed get of_inserts()"""
+        if 'changes.row' not in snapshot.directory['sections']:
+            return cls.of_inserts(snapshot.section('received_us'))
+        feed = cls(capacity=0)
+        feed.arrays = {name: snapshot.section(f'changes.{name}') for name in cls.COLUMNS}
+        feed.statuses = Codes(snapshot.meta['change_statuses'])
+        feed.size = len(feed.arrays['row'])
+        return feed
+
+    @property
+    def latest(self):
+        """Sequence number of the newest change, 0 when there is none"""
+        return self.size
+
+    def _grow(self):
+        capacity = max(1024, len(self.arrays['row']) * 2)
+        for name, array in self.arrays.items():
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            self.arrays[name] = grown
+
+    def record(self, kind, row, crm_status, at_us):
+        """Append a change and wake up waiting consumers. Returns its sequence number"""
+        with self._condition:
+            if self.size == len(self.arrays['row']):
+                self._grow()
+            self.arrays['row'][self.size] = row
+            self.arrays['kind'][self.size] = self.KINDS.index(kind)
+            self.arrays['crm_status'][self.size] = self.statuses.encode(crm_status)
+            self.arrays['at_us'][self.size] = at_us
+            self.size += 1
+            self._condition.notify_all()
+            return self.size
+
+    def view(self):
+        with self._condition:
+            size = self.size
+            return {name: array[:size] for name, array in self.arrays.items()}
+
+    def read(self, since, limit):
+        """Up to limit changes after sequence number since, oldest first, as dicts"""
+        view = self.view()
+        end = min(len(view['row']), since + limit)
+        return [{
+            'seq': index + 1,
+            'type': self.KINDS[view['kind'][index]],
+            'row': int(view['row'][index]),
+            'crm_status': self.statuses.values[view['crm_status'][index]],
+            'at_us': int(view['at_us'][index]),
+        } for index in range(since, end)]
+
+    def wait(self, since, timeout):
+        """Block until there is a change after since or timeout seconds pass. Returns whether there is one"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self.size > since, timeout)
@@ -0,0 +1,244 @@
+from datetime import datetime, timedelta, timezone
+import threading
+
+import numpy as np
+
+from crm.rollups import BookingRollups
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch_us(moment):
+    """Microseconds since the epoch for a UTC datetime or ISO timestamp (naive means UTC)"""
+    if isinstance(moment, str):
+        moment = datetime.fromisoformat(moment.replace('Z', '+00:00'))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    delta = moment - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def from_epoch_us(epoch_us):
+    """Naive UTC ISO timestamp for epoch microseconds, formatted like datetime.isoformat()"""
+    return (EPOCH + timedelta(microseconds=epoch_us)).isoformat()
+
+
+class Codes:
+    """Dense integer codes for the distinct values of a column"""
+
+    def __init__(self, values=()):
+        self.values = list(values)
+        self.code_of = {value: code for code, value in enumerate(self.values)}
+
+    def encode(self, value):
+        code = self.code_of.get(value)
+        if code is None:
+            code = self.code_of[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def get(self, value, default=-1):
+        return self.code_of.get(value, default)
+
+    def __len__(self):
+        return len(self.values)
+
+
+class BookingColumns:
+    """Columnar copy of the CRM booking log for vectorized analytics.
+
+    Row i describes the record bookings_storage[i]. Facilitator, event, user,
+    event type, status and CRM status are stored as dense integer codes and the
+    received time as epoch microseconds, each in its own NumPy array that grows by
+    doubling. Writers hold a lock; readers take a consistent prefix with view().
+    """
+
+    COLUMNS = {
+        'facilitator': np.int32,
+        'event': np.int32,
+        'user': np.int32,
+        'type': np.int8,
+        'status': np.int8,
+        'crm_status': np.int8,
+        'received_us': np.int64,
+    }
+
+    def __init__(self, capacity=1024):
+        self._lock = threading.Lock()
+        self.size = 0
+        self.arrays = {name: np.zeros(capacity, dtype=dtype) for name, dtype in self.COLUMNS.items()}
+        self.codes = {name: Codes() for name in ('facilitator', 'event', 'user', 'type', 'status', 'crm_status')}
+        self.row_of_booking = {}
+        self.snapshot = None
+        self._rollups = None
+
+    @classmethod
+    def from_records(cls, records, events):
+        """Columns for a list of BookingRecords; events maps str(event id) to the event payload"""
+        columns = cls(capacity=max(1024, len(records)))
+        for record in records:
+            columns.append(record, events[str(record.event_id)]['type'])
+        return columns
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """Columns over the arrays of a crm.snapshot.Snapshot, without reading its rows"""
+        columns = cls(capacity=0)
+        columns.arrays = {name: snapshot.section(name) for name in cls.COLUMNS}
+        # Updated in place by set_crm_status; the snapshot's own array must keep what is in the file
+        columns.arrays['crm_status'] = columns.arrays['crm_status'].copy()
+        columns.size = snapshot.rows
+        for name in ('facilitator', 'event', 'user'):
+            columns.codes[name] = Codes(snapshot.section(f'codes.{name}').tolist())
+        for name in ('type', 'status', 'crm_status'):
+            columns.codes[name] = Codes(snapshot.meta['codes'][name])
+        columns.snapshot = snapshot
+        return columns
+
+    def rebase(self, snapshot):
+        """Look up bookings in a snapshot just written of these columns instead of the in-memory index"""
+        with self._lock:
+            self.snapshot = snapshot
+            self.row_of_booking = {booking_id: row for booking_id, row in self.row_of_booking.items()
+                                   if row >= snapshot.rows}
+
+    def row_of(self, booking_id):
+        """Row of a booking id, or None"""
+        row = self.row_of_booking.get(booking_id)
+        if row is None and self.snapshot is not None:
+            position = self.snapshot.lookup('index.booking_id', booking_id)
+            if position >= 0:
+                row = int(self.snapshot.section('index.row')[position])
+        return row
+
+    def unindexed_booking_ids(self):
+        """(snapshot, row count, booking ids not in the snapshot's index): all of them without a snapshot"""
+        with self._lock:
+            return self.snapshot, self.size, list(self.row_of_booking)
+
+    def _grow(self):
+        capacity = max(1024, len(self.arrays['event']) * 2)
+        for name, array in self.arrays.items():
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            self.arrays[name] = grown
+
+    def append(self, record, event_type):
+        """Add one stored BookingRecord as the next row"""
+        with self._lock:
+            values = {
+                'facilitator': self.codes['facilitator'].encode(record.facilitator_id),
+                'event': self.codes['event'].encode(record.event_id),
+                'user': self.codes['user'].encode(record.user_id),
+                # The API sends upper-case type names, the dashboard asks for lower-case ones
+                'type': self.codes['type'].encode(str(event_type).lower()),
+                'status': self.codes['status'].encode(record.status),
+                'crm_status': self.codes['crm_status'].encode(record.crm_status),
+                'received_us': record.received_us,
+            }
+            if self.size == len(self.arrays['event']):
+                self._grow()
+            for name, value in values.items():
+                self.arrays[name][self.size] = value
+            if self._rollups is not None:
+                self._rollups.add(values['facilitator'], values['type'], values['received_us'])
+            self.row_of_booking[record.booking_id] = self.size
+            self.size += 1
+
+    def set_crm_status(self, booking_id, crm_status):
+        with self._lock:
+            row = self.row_of(booking_id)
+            # A None row would broadcast the status over the whole column
+            if row is None:
+                raise KeyError(booking_id)
+            self.arrays['crm_status'][row] = self.codes['crm_status'].encode(crm_status)
+
+    @property
+    def rollups(self):
+        """BookingRollups of these rows, built from the arrays on first use and then kept up to date by append()"""
+        with self._lock:
+            if self._rollups is None:
+                size = self.size
+                self._rollups = BookingRollups.from_arrays(
+                    self.arrays['facilitator'][:size], self.arrays['type'][:size], self.arrays['received_us'][:size])
+            return self._rollups
+
+    def view(self):
+        """The filled part of every column, safe to read while writers append"""
+        with self._lock:
+            size = self.size
+            return {name: array[:size] for name, array in self.arrays.items()}
+
+    def mask(self, columns, **filters):
+        """Boolean row mask for equality filters on raw values (facilitator=3, type='session', ...)"""
+        mask = np.ones(len(columns['event']), dtype=bool)
+        for name, value in filters.items():
+            if value is None:
+                continue
+            code = self.codes[name].get(str(value).lower() if name == 'type' else value)
+            if code < 0:
+                return np.zeros(len(mask), dtype=bool)
+            mask &= columns[name] == code
+        return mask
+
+    def select(self, columns, **filters):
+        """Rows matching equality filters, ascending.
+
+        On a snapshot, a facilitator filter reads that facilitator's rows from
+        the snapshot's facilitator index, so only their pages of the other
+        columns are touched instead of whole columns.
+        """
+        facilitator = filters.pop('facilitator', None)
+        snapshot = self.snapshot
+        if facilitator is None or snapshot is None or 'index.facilitator.row' not in snapshot.directory['sections']:
+            return np.flatnonzero(self.mask(columns, facilitator=facilitator, **filters))
+        code = self.codes['facilitator'].get(facilitator)
+        if code < 0:
+            return np.zeros(0, dtype=np.int64)
+        starts = snapshot.section('index.facilitator.start')
+        indexed = np.zeros(0, dtype=np.int64)
+        if code + 1 < len(starts):
+            indexed = snapshot.section('index.facilitator.row')[starts[code]:starts[code + 1]]
+        # Rows stored since the snapshot are not in its index
+        added = snapshot.rows + np.flatnonzero(columns['facilitator'][snapshot.rows:] == code)
+        rows = np.concatenate([indexed, added])
+        keep = self.mask({'event': rows, **{name: columns[name][rows] for name in filters}}, **filters)
+        return rows[keep]
+
+    def newest_first(self, columns, rows):
+        """Row indices sorted by received time, newest first, ties in insertion order"""
+        order = np.argsort(-columns['received_us'][rows], kind='stable')
+        return rows[order]
+
+    def filter_rows(self, **filters):
+        """Rows matching the filters, newest first"""
+        columns = self.view()
+        return self.newest_first(columns, self.select(columns, **filters))
+
+    def facilitator_summary(self, facilitator_id, since, top_events=5, recent_limit=10):
+        """Dashboard statistics of one facilitator, computed with bincount/unique over masked columns"""
+        columns = self.view()
+        rows = self.select(columns, facilitator=facilitator_id)
+
+        type_counts = np.bincount(columns['type'][rows], minlength=len(self.codes['type']))
+        since_us = to_epoch_us(since)
+        recent_rows = rows[columns['received_us'][rows] >= since_us]
+
+        booked, first_seen, event_counts = np.unique(columns['event'][rows], return_index=True, return_counts=True)
+        # Most booked first; equal counts keep first-booked order like the dict-based ranking
+        ranked = np.lexsort((first_seen, -event_counts))[:top_events]
+
+        def count_of(event_type):
+            code = self.codes['type'].get(event_type)
+            return int(type_counts[code]) if code >= 0 else 0
+
+        return {
+            'total_bookings': int(len(rows)),
+            'session_bookings': count_of('session'),
+            'retreat_bookings': count_of('retreat'),
+            'recent_bookings_count': int(len(recent_rows)),
+            'unique_events': int(len(booked)),
+            'unique_users': int(len(np.unique(columns['user'][rows]))),
+            'popular_events': [(self.codes['event'].values[booked[i]], int(event_counts[i])) for i in ranked],
+            'recent_rows': self.newest_first(columns, recent_rows)[:recent_limit].tolist(),
+        }
@@ -0,0 +1,78 @@
+import threading
+
+import numpy as np
+
+# A range's digest is [count, sum of ids, sum of id * DIGEST_MULTIPLIER % DIGEST_MODULUS] over the booking
+# ids in it. Digests add up, so a range's is the sum of its parts', and the booking service computes the same
+# numbers with SQL aggregates (ids below 2**31 keep the product within 64 bits)
+DIGEST_MULTIPLIER = 2654435761
+DIGEST_MODULUS = 2147483647
+EMPTY_DIGEST = [0, 0, 0]
+_UNSET = object()
+
+
+def id_hashes(ids):
+    return np.asarray(ids, dtype=np.int64) * DIGEST_MULTIPLIER % DIGEST_MODULUS
+
+
+class IdRangeDigests:
+    """Digests of [lo, hi) ranges of a sorted array of booking ids, from prefix sums in O(log n) each"""
+
+    def __init__(self, ids):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.id_sums = np.concatenate([[0], np.cumsum(self.ids)])
+        self.hash_sums = np.concatenate([[0], np.cumsum(id_hashes(self.ids))])
+
+    def bounds(self, lo, hi):
+        return int(np.searchsorted(self.ids, lo)), int(np.searchsorted(self.ids, hi))
+
+    def digest(self, lo, hi):
+        start, stop = self.bounds(lo, hi)
+        return [stop - start, int(self.id_sums[stop] - self.id_sums[start]),
+                int(self.hash_sums[stop] - self.hash_sums[start])]
+
+    def ids_in(self, lo, hi):
+        start, stop = self.bounds(lo, hi)
+        return self.ids[start:stop].tolist()
+
+    @property
+    def max_id(self):
+        return int(self.ids[-1]) if len(self.ids) else 0
+
+
+class BookingIdIndex:
+    """Range digests and ids of the bookings a BookingColumns holds.
+
+    The ids are the snapshot's sorted index.booking_id plus the ids appended
+    since the snapshot. Prefix sums are built once per snapshot for the
+    first part and once per new row count for the second, which stays small
+    because every save writes a new snapshot.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexed = (_UNSET, None)
+        self._unindexed = (_UNSET, None)
+
+    def parts(self, columns):
+        snapshot, size, unindexed = columns.unindexed_booking_ids()
+        with self._lock:
+            if self._indexed[0] is not snapshot:
+                ids = snapshot.section('index.booking_id') if snapshot is not None else ()
+                self._indexed = (snapshot, IdRangeDigests(ids))
+            if self._unindexed[0] != (columns, snapshot, size):
+                self._unindexed = ((columns, snapshot, size), IdRangeDigests(sorted(unindexed)))
+            return self._indexed[1], self._unindexed[1]
+
+    def digests(self, columns, ranges):
+        """Digest of each [lo, hi) range"""
+        parts = self.parts(columns)
+        return [[sum(values) for values in zip(*(part.digest(lo, hi) for part in parts))] for lo, hi in ranges]
+
+    def ids(self, columns, ranges):
+        """Sorted booking ids in the ranges"""
+        parts = self.parts(columns)
+        return sorted(booking_id for lo, hi in ranges for part in parts for booking_id in part.ids_in(lo, hi))
+
+    def max_id(self, columns):
+        return max(part.max_id for part in self.parts(columns))
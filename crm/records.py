@@ -0,0 +1,326 @@
+from collections.abc import Mapping
+from datetime import datetime
+import json
+import sys
+
+from crm.columnar import from_epoch_us, to_epoch_us
+from crm.snapshot import NO_STRING, NULL
+from crm.tiering import payload_size, record_size
+
+
+def compact_timestamp(value):
+    """Epoch microseconds for a naive ISO timestamp that round-trips exactly, otherwise the value itself"""
+    if not isinstance(value, str):
+        return value
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return value
+    if moment.tzinfo is not None or moment.isoformat() != value:
+        return value
+    return to_epoch_us(moment)
+
+
+def expand_timestamp(value):
+    """Inverse of compact_timestamp"""
+    return from_epoch_us(value) if type(value) is int else value
+
+
+class BookingRecord:
+    """One stored CRM booking notification.
+
+    The user and event payloads are not kept per booking: records hold their
+    ids and the payloads are interned once per id in the service's users_cache
+    and events_cache (keyed by str(id), latest payload wins). Timestamps are
+    epoch microseconds. to_dict() rebuilds the notification JSON when a
+    response needs it.
+    """
+
+    __slots__ = (
+        'id', 'booking_id', 'user_id', 'event_id', 'facilitator_id', 'booking_date', 'notes',
+        'received_us', 'status', 'crm_status', 'crm_updated_us', 'crm_notes',
+    )
+
+    def __init__(self, id, booking_id, user_id, event_id, facilitator_id, booking_date=None, notes='',
+                 received_us=0, status='received', crm_status='new', crm_updated_us=None, crm_notes=None):
+        self.id = id
+        self.booking_id = booking_id
+        self.user_id = user_id
+        self.event_id = event_id
+        self.facilitator_id = facilitator_id
+        self.booking_date = compact_timestamp(booking_date)
+        self.notes = notes
+        self.received_us = received_us
+        self.status = sys.intern(status)
+        self.crm_status = sys.intern(crm_status)
+        self.crm_updated_us = crm_updated_us
+        self.crm_notes = crm_notes
+
+    @classmethod
+    def from_notification(cls, id, data, received_us):
+        """Record for a validated notification payload from the main service"""
+        return cls(id, data['booking_id'], data['user']['id'], data['event']['id'], data['facilitator_id'],
+                   booking_date=data.get('booking_date'), notes=data.get('notes', ''), received_us=received_us)
+
+    @classmethod
+    def from_dict(cls, notification):
+        """Record for a notification dict as produced by to_dict()"""
+        crm_updated_at = notification.get('crm_updated_at')
+        return cls(
+            notification['id'], notification['booking_id'], notification['user']['id'],
+            notification['event']['id'], notification['facilitator_id'],
+            booking_date=notification.get('booking_date'),
+            notes=notification.get('notes', ''),
+            received_us=to_epoch_us(notification['received_at']),
+            status=notification.get('status', 'received'),
+            crm_status=notification.get('crm_status', 'new'),
+            crm_updated_us=to_epoch_us(crm_updated_at) if crm_updated_at else None,
+            crm_notes=notification.get('crm_notes'),
+        )
+
+    def set_crm_status(self, crm_status, notes, updated_at):
+        self.crm_status = sys.intern(crm_status)
+        self.crm_notes = notes
+        self.crm_updated_us = to_epoch_us(updated_at)
+
+    @property
+    def crm_updated_at(self):
+        return from_epoch_us(self.crm_updated_us) if self.crm_updated_us is not None else None
+
+    def to_dict(self, users, events):
+        """The notification as JSON-ready dict, with the interned user and event payloads"""
+        notification = {
+            'id': self.id,
+            'booking_id': self.booking_id,
+            'user': users.get(str(self.user_id)),
+            'event': events.get(str(self.event_id)),
+            'facilitator_id': self.facilitator_id,
+            'booking_date': expand_timestamp(self.booking_date),
+            'notes': self.notes,
+            'received_at': from_epoch_us(self.received_us),
+            'status': self.status,
+            'crm_status': self.crm_status,
+        }
+        if self.crm_updated_us is not None:
+            notification['crm_updated_at'] = self.crm_updated_at
+            notification['crm_notes'] = self.crm_notes
+        return notification
+
+    def fields(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+
+class BookingLog:
+    """The service's bookings_storage: BookingRecords by row.
+
+    Rows of the snapshot it was loaded from are turned into records only when
+    they are accessed. Without a cache they are then kept until rebase(); with a
+    crm.tiering.RecordCache they are kept under its memory ceiling and decoded
+    again after an eviction. Records updated with set_crm_status() and
+    bookings stored since the snapshot stay in memory until rebase() onto the
+    snapshot that holds them; the cache counts them against its ceiling.
+    """
+
+    def __init__(self, snapshot=None, cache=None):
+        self.snapshot = snapshot
+        self.cache = cache
+        self.loaded = {}
+        # (rows in the snapshot, records stored after them), replaced together so a read
+        # while rebase() runs never pairs the new row count with the old tail
+        self.rows = (snapshot.rows if snapshot is not None else 0, [])
+        # Estimated size of the records kept until the next rebase()
+        self.held_bytes = 0
+        self._hold()
+
+    def _hold(self):
+        if self.cache is not None:
+            self.cache.hold('bookings', self.held_bytes, to_epoch_us(datetime.utcnow()))
+
+    @property
+    def base_rows(self):
+        return self.rows[0]
+
+    @property
+    def tail(self):
+        return self.rows[1]
+
+    def __len__(self):
+        base_rows, tail = self.rows
+        return base_rows + len(tail)
+
+    def __getitem__(self, row):
+        base_rows, tail = self.rows
+        if row < 0:
+            row += base_rows + len(tail)
+            if row < 0:
+                raise IndexError('booking row out of range')
+        if row >= base_rows:
+            return tail[row - base_rows]
+        record = self.loaded.get(row)
+        if record is None:
+            if self.cache is None:
+                return self.loaded.setdefault(row, self.snapshot_record(row))
+            record = self.cache.get(row)
+            if record is None:
+                record = self.cache.put(row, self.snapshot_record(row), to_epoch_us(datetime.utcnow()))
+        return record
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def append(self, record):
+        self.tail.append(record)
+        self.held_bytes += record_size(record)
+        self._hold()
+
+    def set_crm_status(self, row, crm_status, notes, updated_at):
+        """Update the CRM status of the record of a row and keep it in memory until it is saved"""
+        record = self[row]
+        record.set_crm_status(crm_status, notes, updated_at)
+        if row < self.base_rows and self.cache is not None:
+            if row not in self.loaded:
+                self.loaded[row] = record
+                self.held_bytes += record_size(record)
+            self.cache.discard(row)
+            self._hold()
+        return record
+
+    def rebase(self, snapshot):
+        """Continue from a snapshot just written of this log; its records stay cached.
+
+        Writers must not change the log meanwhile. Readers may: every step
+        leaves each row readable, either from memory or from the new snapshot.
+        """
+        records = list(self.changed_rows())
+        # Cached from now on rather than held
+        self.held_bytes = 0
+        self._hold()
+        if self.cache is not None:
+            now_us = to_epoch_us(datetime.utcnow())
+            for row, record in records:
+                self.cache.put(row, record, now_us)
+        self.snapshot = snapshot
+        self.rows = (snapshot.rows, [])
+        self.loaded = {}
+
+    def snapshot_record(self, row):
+        """Record of a snapshot row as it is in the file"""
+        snapshot = self.snapshot
+        fields = snapshot.section('records')[row]
+        codes = snapshot.meta['codes']
+
+        def id_of(name):
+            return int(snapshot.section(f'codes.{name}')[snapshot.section(name)[row]])
+
+        if fields['booking_date_text'] != NO_STRING:
+            booking_date = snapshot.string(int(fields['booking_date_text']))
+        else:
+            booking_date = None if fields['booking_date'] == NULL else int(fields['booking_date'])
+        return BookingRecord(
+            int(fields['id']), int(fields['booking_id']), id_of('user'), id_of('event'), id_of('facilitator'),
+            booking_date=booking_date,
+            notes=snapshot.string(int(fields['notes'])),
+            received_us=int(snapshot.section('received_us')[row]),
+            status=codes['status'][snapshot.section('status')[row]],
+            crm_status=codes['crm_status'][snapshot.section('crm_status')[row]],
+            crm_updated_us=None if fields['crm_updated_us'] == NULL else int(fields['crm_updated_us']),
+            crm_notes=snapshot.string(int(fields['crm_notes'])),
+        )
+
+    def changed_rows(self):
+        """(row, record) of the records that differ from the snapshot or are not in it"""
+        for row, record in self.loaded.items():
+            if record.fields() != self.snapshot_record(row).fields():
+                yield row, record
+        for position, record in enumerate(self.tail):
+            yield self.base_rows + position, record
+
+
+class PayloadTable(Mapping):
+    """str(id) -> payload dict (users_cache, events_cache), decoded from a snapshot on first use.
+
+    Payloads stay in memory until the table is replaced by one of the next
+    snapshot; with a crm.tiering.RecordCache their size counts against its ceiling.
+    """
+
+    def __init__(self, name, snapshot=None, cache=None):
+        self.name = name
+        self.snapshot = snapshot
+        self.cache = cache
+        self.changed = {}
+        self._decoded = {}
+        self.held_bytes = 0
+        self._hold(0)
+
+    def _hold(self, nbytes):
+        self.held_bytes += nbytes
+        if self.cache is not None:
+            self.cache.hold(self.name, self.held_bytes, to_epoch_us(datetime.utcnow()))
+
+    def _position(self, key):
+        if self.snapshot is None:
+            return -1
+        try:
+            return self.snapshot.lookup(f'{self.name}.id', int(key))
+        except (TypeError, ValueError):
+            return -1
+
+    def base_payload(self, key):
+        """Payload of an id as stored in the snapshot, or None"""
+        payload = self._decoded.get(key)
+        if payload is None:
+            position = self._position(key)
+            if position < 0:
+                return None
+            ref = int(self.snapshot.section(f'{self.name}.ref')[position])
+            payload = self._decoded[key] = json.loads(self.snapshot.string(ref))
+            self._hold(payload_size(payload))
+        return payload
+
+    def __getitem__(self, key):
+        if key in self.changed:
+            return self.changed[key]
+        try:
+            payload = self.base_payload(int(key))
+        except (TypeError, ValueError):
+            payload = None
+        if payload is None:
+            raise KeyError(key)
+        return payload
+
+    def __setitem__(self, key, payload):
+        previous = self.changed.get(key)
+        self.changed[key] = payload
+        self._hold(payload_size(payload) - (0 if previous is None else payload_size(previous)))
+
+    def setdefault(self, key, payload):
+        if key not in self:
+            self[key] = payload
+        return self[key]
+
+    def __iter__(self):
+        yield from self.changed
+        if self.snapshot is not None:
+            for key in self.snapshot.section(f'{self.name}.id').tolist():
+                if str(key) not in self.changed:
+                    yield str(key)
+
+    def __len__(self):
+        base = len(self.snapshot.section(f'{self.name}.id')) if self.snapshot is not None else 0
+        return base + sum(1 for key in self.changed if self._position(key) < 0)
+
+
+def load_json_store(data):
+    """BookingLog, users and events PayloadTables and facilitators for the JSON data file of earlier versions"""
+    notifications = data.get('bookings', [])
+    users = PayloadTable('users')
+    events = PayloadTable('events')
+    for key, event in data.get('events', {}).items():
+        events[key] = event
+    log = BookingLog()
+    for notification in notifications:
+        users[str(notification['user']['id'])] = notification['user']
+        events.setdefault(str(notification['event']['id']), notification['event'])
+        log.append(BookingRecord.from_dict(notification))
+    return log, users, events, data.get('facilitators', {})
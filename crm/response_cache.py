@@ -0,0 +1,107 @@
+from collections import OrderedDict
+import os
+import threading
+import time
+
+
+class CachedResponse:
+    __slots__ = ('epoch', 'version', 'expires_at', 'body', 'etag', 'encoded')
+
+    def __init__(self, epoch, version, expires_at, body, etag):
+        self.epoch = epoch
+        self.version = version
+        self.expires_at = expires_at
+        self.body = body
+        self.etag = etag
+        # Compressed bodies by encoding, see ResponseCompressor.compress_cached()
+        self.encoded = {}
+
+
+class ResponseCache:
+    """Serialized per-facilitator responses, invalidated by version counters.
+
+    Every facilitator has a version that writers bump when its bookings
+    change, and there is an epoch for changes that can touch any
+    facilitator's responses. An entry is served while both still match what
+    they were when it was built and it is younger than ttl seconds (responses
+    also depend on the clock, e.g. the recent bookings window). The ETag of an
+    entry is minted when it is built, so checking If-None-Match costs a
+    string compare, and the entry keeps its compressed bodies next to it.
+    Least recently used entries are evicted beyond max_entries.
+    """
+
+    def __init__(self, max_entries=1024, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._epoch = 0
+        self._built = 0
+        # ETags must not repeat across restarts, when the counters start over
+        self._token = os.urandom(4).hex()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    def versions(self, facilitator_id):
+        """(epoch, version) to pass to put() for a response about to be built"""
+        with self._lock:
+            return self._epoch, self._versions.get(facilitator_id, 0)
+
+    def invalidate(self, facilitator_id=None):
+        """Bump the version of a facilitator, or the epoch (all facilitators) for None"""
+        with self._lock:
+            if facilitator_id is None:
+                self._epoch += 1
+            else:
+                self._versions[facilitator_id] = self._versions.get(facilitator_id, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._epoch += 1
+
+    def get(self, key, facilitator_id):
+        """The valid entry of a key, or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if (entry is None or entry.expires_at <= now or entry.epoch != self._epoch
+                    or entry.version != self._versions.get(facilitator_id, 0)):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, versions, body):
+        """Store a response body built at versions (from versions()) and return its entry"""
+        epoch, version = versions
+        with self._lock:
+            self._built += 1
+            entry = CachedResponse(epoch, version, time.monotonic() + self.ttl, body,
+                                   f'{self._token}-{self._built:x}')
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return entry
+
+    def count_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,184 @@
+import numpy as np
+
+HOUR_US = 3600 * 1000000
+DAY_US = 24 * HOUR_US
+WEEK_US = 7 * DAY_US
+# Weeks start on Monday; the epoch was a Thursday
+WEEK_OFFSET_US = 4 * DAY_US
+# Hour buckets are only kept for the most recent hours; longer ranges are answered from day and week buckets
+HOUR_RETENTION = 31 * 24
+
+
+class BucketCounts:
+    """Booking counts in fixed-width time buckets, counts[facilitator code, type code, bucket - origin].
+
+    Bucket b covers [b * width + offset, (b + 1) * width + offset) in epoch
+    microseconds. The array grows (by doubling) along any axis as new
+    facilitators, event types or buckets show up.
+
+    With a retention, only the last `retention` buckets up to the newest one
+    counted are kept: buckets before `floor` are not counted, and the array
+    is rolled forward once it would span more than a quarter beyond them.
+    """
+
+    def __init__(self, width_us, offset_us=0, retention=None):
+        self.width = width_us
+        self.offset = offset_us
+        self.retention = retention
+        self.floor = None
+        self.origin = 0
+        self.counts = np.zeros((0, 0, 0), dtype=np.int32)
+
+    def bucket(self, epoch_us):
+        return (epoch_us - self.offset) // self.width
+
+    def start_of(self, bucket):
+        return bucket * self.width + self.offset
+
+    def _retained(self, buckets):
+        """Mask of the buckets that are kept, moving floor up to the newest of them"""
+        if self.retention is None:
+            return None
+        floor = int(buckets.max()) - self.retention + 1
+        self.floor = floor if self.floor is None else max(self.floor, floor)
+        return buckets >= self.floor
+
+    def _roll(self, last):
+        """Drop the buckets before floor when bucket last would not fit in retention and a quarter"""
+        size_b = self.counts.shape[2]
+        if not size_b or last - self.origin < self.retention + self.retention // 4:
+            return
+        shift = min(self.floor - self.origin, size_b)
+        rolled = np.zeros_like(self.counts)
+        rolled[:, :, :size_b - shift] = self.counts[:, :, shift:]
+        self.counts = rolled
+        self.origin += shift
+
+    def _fit(self, facilitators, types, first, last):
+        """Make room for facilitator codes < facilitators, type codes < types and buckets first..last"""
+        if self.retention is not None:
+            self._roll(last)
+        size_f, size_t, size_b = self.counts.shape
+        if not size_b:
+            self.origin = first
+        lead = max(0, self.origin - first)
+        need_b = max(size_b + lead, last - self.origin + lead + 1)
+        if facilitators <= size_f and types <= size_t and not lead and need_b <= size_b:
+            return
+        shape = (
+            max(facilitators, size_f * 2 if facilitators > size_f else size_f),
+            max(types, size_t),
+            max(need_b, size_b * 2 if need_b > size_b else size_b),
+        )
+        # Growing towards the past (rare: only out-of-order timestamps) keeps the extra room at the end
+        grown = np.zeros(shape, dtype=np.int32)
+        grown[:size_f, :size_t, lead:lead + size_b] = self.counts
+        self.counts = grown
+        self.origin -= lead
+
+    def add(self, facilitator, event_type, epoch_us):
+        self.add_many(np.array([facilitator]), np.array([event_type]), np.array([epoch_us], dtype=np.int64))
+
+    def add_many(self, facilitators, event_types, epoch_us):
+        """Vectorized add() for arrays of codes and times"""
+        if not len(epoch_us):
+            return
+        buckets = self.bucket(np.asarray(epoch_us, dtype=np.int64))
+        retained = self._retained(buckets)
+        if retained is not None and not retained.all():
+            facilitators, event_types, buckets = facilitators[retained], event_types[retained], buckets[retained]
+            if not len(buckets):
+                return
+        self._fit(int(facilitators.max()) + 1, int(event_types.max()) + 1, int(buckets.min()), int(buckets.max()))
+        size_f, size_t, size_b = self.counts.shape
+        # Only the touched cells are added to
+        flat = (facilitators.astype(np.int64) * size_t + event_types) * size_b + (buckets - self.origin)
+        np.add.at(self.counts.reshape(-1), flat, 1)
+
+    def series(self, facilitator, first, last):
+        """counts[type, bucket] of one facilitator for buckets first..last-1, zero where nothing was counted.
+
+        Raises ValueError for buckets before floor, which are no longer kept.
+        """
+        if self.floor is not None and first < min(last, self.floor):
+            raise ValueError(f'only the last {self.retention} buckets are kept, use a coarser granularity')
+        counts, origin = self.counts, self.origin
+        series = np.zeros((counts.shape[1], max(0, last - first)), dtype=np.int64)
+        if facilitator < 0 or facilitator >= counts.shape[0]:
+            return series
+        low, high = max(first, origin), min(last, origin + counts.shape[2])
+        if low < high:
+            series[:, low - first:high - first] = counts[facilitator, :, low - origin:high - origin]
+        return series
+
+    def total(self, facilitator, first, last):
+        """Counts per type of one facilitator over buckets first..last-1"""
+        return self.series(facilitator, first, last).sum(axis=1)
+
+
+class BookingRollups:
+    """Per-facilitator, per-event-type booking counts in hour, day and week buckets.
+
+    Kept up to date as bookings are stored, so trends over any range are sums
+    of a handful of pre-aggregated buckets instead of a scan of the bookings.
+    Facilitators and event types are the dense codes of the BookingColumns
+    the rollups belong to.
+    """
+
+    GRANULARITIES = ('hour', 'day', 'week')
+
+    def __init__(self):
+        self.buckets = {
+            'hour': BucketCounts(HOUR_US, retention=HOUR_RETENTION),
+            'day': BucketCounts(DAY_US),
+            'week': BucketCounts(WEEK_US, WEEK_OFFSET_US),
+        }
+
+    @classmethod
+    def from_arrays(cls, facilitators, event_types, epoch_us):
+        rollups = cls()
+        for counts in rollups.buckets.values():
+            counts.add_many(facilitators, event_types, epoch_us)
+        return rollups
+
+    def add(self, facilitator, event_type, epoch_us):
+        for counts in self.buckets.values():
+            counts.add(facilitator, event_type, epoch_us)
+
+    def series(self, granularity, facilitator, start_us, end_us, max_buckets=None):
+        """(bucket starts, counts[type, bucket]) for the buckets of a granularity that overlap [start, end)"""
+        counts = self.buckets[granularity]
+        first, last = counts.bucket(start_us), counts.bucket(end_us - 1) + 1
+        if max_buckets is not None and last - first > max_buckets:
+            raise ValueError(f'{last - first} {granularity} buckets requested, at most {max_buckets} allowed')
+        starts = [counts.start_of(bucket) for bucket in range(first, last)]
+        return starts, counts.series(facilitator, first, last)
+
+    def total(self, facilitator, start_us, end_us):
+        """Counts per type over [start, end) widened to whole hours, and to whole days before the hour buckets kept.
+
+        The range is split into whole weeks in the middle, whole days around
+        them and single hours at the ends, so it costs a few bucket sums
+        whatever its length.
+        """
+        hours, days, weeks = self.buckets['hour'], self.buckets['day'], self.buckets['week']
+        first_hour, end_hour = hours.bucket(start_us), -(-end_us // HOUR_US)
+        floor = hours.floor
+        if floor is not None and first_hour < floor:
+            first_hour = first_hour // 24 * 24
+        first_day, end_day = -(-first_hour // 24), end_hour // 24
+        # The hours summed at the end start before floor: count the whole last day instead
+        if floor is not None and (first_hour if first_day >= end_day else end_day * 24) < floor:
+            end_hour = -(-end_hour // 24) * 24
+            end_day = end_hour // 24
+        if first_day >= end_day:
+            return hours.total(facilitator, first_hour, end_hour)
+        total = hours.total(facilitator, first_hour, first_day * 24) + hours.total(facilitator, end_day * 24, end_hour)
+
+        # Day d belongs to week (d - 4) // 7, see WEEK_OFFSET_US
+        first_week, end_week = -(-(first_day - 4) // 7), (end_day - 4) // 7
+        if first_week >= end_week:
+            return total + days.total(facilitator, first_day, end_day)
+        return (total + days.total(facilitator, first_day, first_week * 7 + 4)
+                + days.total(facilitator, end_week * 7 + 4, end_day)
+                + weeks.total(facilitator, first_week, end_week))
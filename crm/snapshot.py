@@ -0,0 +1,264 @@
+"""Binary snapshot of the CRM store, opened with mmap.
+
+Layout: the magic bytes, the length of a JSON directory as a little-endian
+uint64, the directory, then 64-byte aligned sections. The directory holds the
+row count, small metadata (facilitators, the string codes of the categorical
+columns) and the offset, dtype and length of every section:
+
+    facilitator, event, user, type,    columnar store codes, one entry per row
+    status, crm_status, received_us
+    codes.facilitator|event|user       id of each code
+    records                            per-row fields the columns do not hold
+    index.booking_id, index.row        booking ids sorted, with their rows
+    index.facilitator.row|start        rows grouped by facilitator code: the
+                                       rows of code c are row[start[c]:start[c + 1]]
+    users.id, users.ref                user ids sorted, with the string of
+    events.id, events.ref              their JSON payload (same for events)
+    changes.row|kind|crm_status|at_us  the change feed, one entry per change
+    strings.offsets, strings.data      string table: UTF-8 bytes of string i
+                                       are data[offsets[i]:offsets[i + 1]]
+
+Every section is fixed width, so opening a snapshot only maps the file and
+parses the directory; rows and strings are paged in by the OS as they are
+read.
+"""
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+MAGIC = b'CRMSNAP1'
+VERSION = 1
+ALIGNMENT = 64
+
+NULL = np.iinfo(np.int64).min  # None in integer fields
+NO_STRING = -1                 # None in string reference fields
+
+RECORD_DTYPE = np.dtype([
+    ('id', '<i8'),
+    ('booking_id', '<i8'),
+    ('booking_date', '<i8'),       # epoch microseconds, or NULL
+    ('crm_updated_us', '<i8'),     # epoch microseconds, or NULL
+    ('booking_date_text', '<i4'),  # string reference when the booking date is not stored as an integer
+    ('notes', '<i4'),
+    ('crm_notes', '<i4'),
+    ('reserved', '<i4'),
+])
+
+ID_CODES = ('facilitator', 'event', 'user')
+STRING_CODES = ('type', 'status', 'crm_status')
+
+
+class SnapshotError(Exception):
+    """The file is not a CRM snapshot this version can read"""
+
+
+class Snapshot:
+    """Read side of a snapshot file.
+
+    The file is mapped copy-on-write, so arrays handed out by section() are
+    writable in memory without ever changing the file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise SnapshotError(f'{path} is not a CRM snapshot')
+        (length,) = struct.unpack_from('<Q', self._mmap, len(MAGIC))
+        start = len(MAGIC) + 8
+        self.directory = json.loads(self._mmap[start:start + length])
+        if self.directory['version'] != VERSION:
+            raise SnapshotError(f'{path} has snapshot version {self.directory["version"]}, expected {VERSION}')
+        self.rows = self.directory['rows']
+        self.meta = self.directory['meta']
+        self._sections = {}
+
+    def section(self, name):
+        array = self._sections.get(name)
+        if array is None:
+            spec = self.directory['sections'][name]
+            dtype = RECORD_DTYPE if name == 'records' else np.dtype(spec['dtype'])
+            if spec['count']:
+                array = np.frombuffer(self._mmap, dtype=dtype, count=spec['count'], offset=spec['offset'])
+            else:
+                array = np.empty(0, dtype=dtype)
+            self._sections[name] = array
+        return array
+
+    def string(self, ref):
+        if ref == NO_STRING:
+            return None
+        offsets = self.section('strings.offsets')
+        start = self.directory['sections']['strings.data']['offset']
+        return self._mmap[start + int(offsets[ref]):start + int(offsets[ref + 1])].decode('utf-8')
+
+    def lookup(self, table, key):
+        """Row of an integer key in a sorted id section (index.booking_id, users.id, ...), or -1"""
+        ids = self.section(table)
+        position = int(np.searchsorted(ids, key))
+        if position < len(ids) and ids[position] == key:
+            return position
+        return -1
+
+
+class StringTableWriter:
+    """String table of a new snapshot, starting with a copy of the base snapshot's strings"""
+
+    def __init__(self, base=None):
+        self.chunks = []
+        self.base_offsets = np.zeros(1, dtype='<u8')
+        self.offsets = []
+        self.size = 0
+        if base is not None and len(base.section('strings.offsets')) > 1:
+            spec = base.directory['sections']['strings.data']
+            self.chunks.append(base._mmap[spec['offset']:spec['offset'] + spec['count']])
+            self.base_offsets = base.section('strings.offsets')
+            self.size = int(self.base_offsets[-1])
+
+    def add(self, value):
+        if value is None:
+            return NO_STRING
+        encoded = value.encode('utf-8')
+        self.chunks.append(encoded)
+        self.size += len(encoded)
+        self.offsets.append(self.size)
+        return len(self.base_offsets) + len(self.offsets) - 2
+
+    def offsets_section(self):
+        return np.concatenate([self.base_offsets, np.array(self.offsets, dtype='<u8')])
+
+
+def _ids(values, what):
+    try:
+        return np.array(values, dtype='<i8')
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f'CRM snapshots need integer {what} ids')
+
+
+def _pack(record, strings):
+    booking_date = record.booking_date
+    text = isinstance(booking_date, str)
+    return (
+        record.id,
+        record.booking_id,
+        NULL if booking_date is None or text else booking_date,
+        NULL if record.crm_updated_us is None else record.crm_updated_us,
+        strings.add(booking_date) if text else NO_STRING,
+        strings.add(record.notes),
+        strings.add(record.crm_notes),
+        0,
+    )
+
+
+def _payload_sections(table, strings):
+    refs = {}
+    if table.snapshot is not None:
+        refs = dict(zip(table.snapshot.section(f'{table.name}.id').tolist(),
+                        table.snapshot.section(f'{table.name}.ref').tolist()))
+    for key, payload in table.changed.items():
+        key = int(_ids([key], table.name)[0])
+        base = table.base_payload(key)
+        if base is None or base != payload:
+            refs[key] = strings.add(json.dumps(payload))
+    ids = sorted(refs)
+    return _ids(ids, table.name), np.array([refs[key] for key in ids], dtype='<i4')
+
+
+def write_snapshot(path, log, columns, changes, users, events, facilitators, last_updated):
+    """Write the store to path atomically (temporary file, then rename).
+
+    log is a BookingLog, columns its BookingColumns, changes its ChangeFeed and
+    users/events PayloadTables. When they are backed by a snapshot its sections are copied
+    as they are and only records changed or added since are encoded.
+    """
+    base = log.snapshot
+    strings = StringTableWriter(base)
+
+    view = columns.view()
+    rows = len(view['event'])
+    if rows != len(log):
+        raise ValueError(f'columns have {rows} rows, the log has {len(log)}')
+
+    records = np.zeros(rows, dtype=RECORD_DTYPE)
+    if base is not None:
+        records[:base.rows] = base.section('records')
+    for row, record in log.changed_rows():
+        records[row] = _pack(record, strings)
+
+    booking_ids = records['booking_id']
+    index_rows = np.argsort(booking_ids, kind='stable')
+
+    sections = {name: view[name] for name in columns.COLUMNS}
+    for name in ID_CODES:
+        sections[f'codes.{name}'] = _ids(columns.codes[name].values, name)
+    sections['records'] = records
+    sections['index.booking_id'] = booking_ids[index_rows]
+    sections['index.row'] = index_rows.astype('<i8')
+    facilitator_codes = view['facilitator']
+    if len(columns.codes['facilitator']) <= np.iinfo(np.int16).max:
+        # A stable argsort of 16-bit keys is a radix sort, several times faster than of the int32 codes
+        facilitator_codes = facilitator_codes.astype(np.int16)
+    sections['index.facilitator.row'] = np.argsort(facilitator_codes, kind='stable').astype('<i8')
+    counts = np.bincount(facilitator_codes, minlength=len(columns.codes['facilitator']))
+    sections['index.facilitator.start'] = np.concatenate([[0], np.cumsum(counts)]).astype('<i8')
+    sections['users.id'], sections['users.ref'] = _payload_sections(users, strings)
+    sections['events.id'], sections['events.ref'] = _payload_sections(events, strings)
+    for name, array in changes.view().items():
+        sections[f'changes.{name}'] = array
+    sections['strings.offsets'] = strings.offsets_section()
+
+    directory = {
+        'version': VERSION,
+        'rows': rows,
+        'meta': {
+            'facilitators': facilitators,
+            'last_updated': last_updated,
+            'codes': {name: columns.codes[name].values for name in STRING_CODES},
+            'change_statuses': changes.statuses.values,
+        },
+        'sections': {},
+    }
+
+    # Section offsets depend on the directory length and vice versa; offsets are
+    # laid out for a directory padded to a fixed size, which is grown until it fits
+    reserve = 4096
+    while True:
+        offset = len(MAGIC) + 8 + reserve
+        for name, array in sections.items():
+            offset += -offset % ALIGNMENT
+            directory['sections'][name] = {'offset': offset, 'dtype': array.dtype.str, 'count': len(array)}
+            offset += array.nbytes
+        offset += -offset % ALIGNMENT
+        directory['sections']['strings.data'] = {'offset': offset, 'dtype': '|u1', 'count': strings.size}
+        encoded = json.dumps(directory).encode('utf-8')
+        if len(encoded) <= reserve:
+            break
+        reserve *= 2
+
+    # A temporary file of its own in the same directory, so concurrent writers never share one and the rename stays
+    # on one file system
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                             prefix=f'{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<Q', len(encoded)))
+            f.write(encoded)
+            for name, array in sections.items():
+                f.seek(directory['sections'][name]['offset'])
+                f.write(np.ascontiguousarray(array).tobytes())
+            f.seek(directory['sections']['strings.data']['offset'])
+            for chunk in strings.chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
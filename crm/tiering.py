@@ -0,0 +1,130 @@
+from collections import OrderedDict
+import sys
+import threading
+
+# Cost of caching a record besides the record itself: its row key and entries in the tier and size dicts
+ENTRY_OVERHEAD = 160
+
+
+def record_size(record):
+    """Estimated bytes a cached BookingRecord keeps alive: the object, its values and the cache entry.
+
+    The statuses are interned and shared by every record, so they are not counted.
+    """
+    size = sys.getsizeof(record) + ENTRY_OVERHEAD
+    for name, value in zip(record.__slots__, record.fields()):
+        if value is not None and name not in ('status', 'crm_status'):
+            size += sys.getsizeof(value)
+    return size
+
+
+def payload_size(payload):
+    """Estimated bytes of a user or event payload dict: the dict, its keys and top-level values"""
+    size = sys.getsizeof(payload) + ENTRY_OVERHEAD
+    if isinstance(payload, dict):
+        for key, value in payload.items():
+            size += sys.getsizeof(key) + sys.getsizeof(value)
+    return size
+
+
+class RecordCache:
+    """Decoded BookingRecords of snapshot rows, kept under a memory ceiling.
+
+    Records are either hot (received within hot_window_us, or in an open CRM
+    status) or cold, each tier in least recently used order. When the
+    estimated size goes over max_bytes, cold records are evicted first and hot
+    ones only when no cold record is left. Evicted rows stay readable: the
+    BookingLog decodes them from the snapshot again on the next access, and
+    keeps records updated since the snapshot out of the cache until they are
+    saved.
+
+    Memory the store holds outside the cache (bookings not saved yet, decoded
+    user and event payloads) is reported with hold() and counted against the
+    same ceiling, so the cache shrinks as it grows. Held memory itself is
+    never evicted: it is released when the saver writes the snapshot.
+    """
+
+    def __init__(self, max_bytes, hot_window_us, open_statuses=('new', 'reviewed')):
+        self._lock = threading.Lock()
+        self.max_bytes = max_bytes
+        self.hot_window_us = hot_window_us
+        self.open_statuses = frozenset(open_statuses)
+        self.tiers = {'hot': OrderedDict(), 'cold': OrderedDict()}
+        self.sizes = {}
+        self.resident_bytes = 0
+        self.held = {}  # owner -> bytes held outside the cache
+        self.held_bytes = 0
+        self.peak_bytes = 0
+        self.hits = 0
+        self.faults = 0
+        self.evictions = {'hot': 0, 'cold': 0}
+
+    def tier_of(self, record, now_us):
+        if record.crm_status in self.open_statuses or record.received_us >= now_us - self.hot_window_us:
+            return 'hot'
+        return 'cold'
+
+    def get(self, row):
+        """Cached record of a row, or None (counted as a fault; the caller decodes it and put()s it)"""
+        with self._lock:
+            for tier in self.tiers.values():
+                record = tier.get(row)
+                if record is not None:
+                    tier.move_to_end(row)
+                    self.hits += 1
+                    return record
+            self.faults += 1
+            return None
+
+    def put(self, row, record, now_us):
+        """Cache a record, or return the one already cached for the row"""
+        with self._lock:
+            for tier in self.tiers.values():
+                if row in tier:
+                    return tier[row]
+            self.tiers[self.tier_of(record, now_us)][row] = record
+            self.sizes[row] = record_size(record)
+            self.resident_bytes += self.sizes[row]
+            self._evict(now_us)
+            self.peak_bytes = max(self.peak_bytes, self.resident_bytes + self.held_bytes)
+            return record
+
+    def hold(self, owner, nbytes, now_us):
+        """Set the bytes owner holds outside the cache, evicting cached records to stay under max_bytes"""
+        with self._lock:
+            self.held_bytes += nbytes - self.held.get(owner, 0)
+            self.held[owner] = nbytes
+            self._evict(now_us)
+            self.peak_bytes = max(self.peak_bytes, self.resident_bytes + self.held_bytes)
+
+    def discard(self, row):
+        with self._lock:
+            for tier in self.tiers.values():
+                if tier.pop(row, None) is not None:
+                    self.resident_bytes -= self.sizes.pop(row)
+
+    def _evict(self, now_us):
+        while self.resident_bytes + self.held_bytes > self.max_bytes and (self.tiers['cold'] or self.tiers['hot']):
+            name = 'cold' if self.tiers['cold'] else 'hot'
+            row, record = self.tiers[name].popitem(last=False)
+            if name == 'hot' and self.tier_of(record, now_us) == 'cold':
+                # Aged out or closed since it was cached
+                name = 'cold'
+            self.resident_bytes -= self.sizes.pop(row)
+            self.evictions[name] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.faults
+            return {
+                'max_bytes': self.max_bytes,
+                'resident_bytes': self.resident_bytes,
+                'held_bytes': dict(self.held),
+                'peak_bytes': self.peak_bytes,
+                'hot_records': len(self.tiers['hot']),
+                'cold_records': len(self.tiers['cold']),
+                'hits': self.hits,
+                'faults': self.faults,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': dict(self.evictions),
+            }
@@ -1,20 +1,84 @@
-from flask import Flask, request, jsonify
-from datetime import datetime
+from flask import Flask, Response, request, jsonify, make_response
+from datetime import datetime, timedelta
+from functools import wraps
+import atexit
 import os
 import sys
 import json
+import threading
+import time
+from crm.changes import ChangeFeed
+from crm.columnar import BookingColumns, from_epoch_us, to_epoch_us
+from crm.reconcile import BookingIdIndex
+from crm.records import BookingLog, BookingRecord, PayloadTable, load_json_store
+from crm.response_cache import ResponseCache
+from crm.rollups import BookingRollups
+from crm.snapshot import Snapshot, write_snapshot
+from crm.tiering import RecordCache
+from services.compression import ResponseCompressor
+from services.json_provider import FastJSONProvider
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
+# gzip/brotli for responses of 1 KiB and more, with the booking API's defaults
+compression = ResponseCompressor(app)
+
+# Memory ceiling (MiB) of the store's records: bookings decoded from the snapshot are cached under it, next to
+# the unsaved bookings and the decoded user and event payloads it also counts. Recent bookings (received within
+# CRM_HOT_DAYS) and open ones are evicted last; evicted bookings are read from the snapshot again
+RECORD_CACHE_MB = float(os.environ.get('CRM_RECORD_CACHE_MB', 64))
+HOT_WINDOW = timedelta(days=float(os.environ.get('CRM_HOT_DAYS', 30)))
+OPEN_CRM_STATUSES = ('new', 'reviewed')
+record_cache = RecordCache(int(RECORD_CACHE_MB * 2**20), HOT_WINDOW // timedelta(microseconds=1), OPEN_CRM_STATUSES)
 
 # In-memory storage for demo purposes
 # In production, you'd use a proper database or Redis
-bookings_storage = []
+bookings_storage = BookingLog(cache=record_cache)  # BookingRecords by row
 facilitators_cache = {}
-events_cache = {}
+events_cache = PayloadTable('events', cache=record_cache)
+users_cache = PayloadTable('users', cache=record_cache)
+# Columnar copy of bookings_storage (same row order) for filtering and analytics
+booking_columns = BookingColumns()
+# Inserts and CRM status updates in order, for GET /api/changes
+change_feed = ChangeFeed()
+# Facilitator dashboard and bookings responses, rebuilt when the facilitator's bookings change
+# or after CRM_RESPONSE_CACHE_TTL seconds (they also depend on the time)
+response_cache = ResponseCache(max_entries=int(os.environ.get('CRM_RESPONSE_CACHE_SIZE', 1024)),
+                               ttl=float(os.environ.get('CRM_RESPONSE_CACHE_TTL', 30)))
 
 # Static bearer token for authentication
 BEARER_TOKEN = os.environ.get('CRM_BEARER_TOKEN', 'crm-static-bearer-token-123')
 
+# Binary snapshot the data is persisted to, and the JSON file of earlier versions it is converted from
+SNAPSHOT_FILE = os.environ.get('CRM_SNAPSHOT_FILE', '/tmp/crm_data.snap')
+# Changes are saved by a background thread at most CRM_SAVE_INTERVAL seconds after they are made, and at exit,
+# instead of rewriting the snapshot on every request. 0 saves on every change
+SAVE_INTERVAL = float(os.environ.get('CRM_SAVE_INTERVAL', 5))
+
+# Held for every change of the store from lookup to the last write (row numbers, duplicate checks, the change
+# feed) and while it is saved. Reads do not take it
+store_lock = threading.RLock()
+# Set while the store has changes the snapshot does not hold
+unsaved_changes = threading.Event()
+saver = None
+DATA_FILE = os.environ.get('CRM_DATA_FILE', '/tmp/crm_data.json')
+
+# Trends: range served when no start is given, and the most buckets one response may hold
+TREND_DEFAULT_RANGES = {'hour': timedelta(days=2), 'day': timedelta(days=30), 'week': timedelta(weeks=12)}
+MAX_TREND_BUCKETS = 1000
+
+# Change feed: page size limit, how long a long-poll may wait for a change (seconds), and how many may wait at
+# once. A waiting long-poll holds a request thread (WSGI_THREADS, 4 by default), so the cap keeps threads free
+# for notifications; long-polls over it are answered at once, as if they had not asked to wait
+MAX_CHANGES_LIMIT = 1000
+MAX_CHANGES_WAIT = float(os.environ.get('CRM_CHANGES_MAX_WAIT', 25))
+MAX_CHANGES_WAITERS = int(os.environ.get('CRM_CHANGES_MAX_WAITERS', 2))
+changes_waiters = threading.BoundedSemaphore(MAX_CHANGES_WAITERS) if MAX_CHANGES_WAITERS > 0 else None
+
+# Reconciliation: digests and ids of booking id ranges (see reconcile_crm.py), and the most ranges per request
+booking_ids = BookingIdIndex()
+MAX_RECONCILE_RANGES = 4096
+
 def authenticate_request():
     """Validate Bearer token from Authorization header"""
     auth_header = request.headers.get('Authorization')
@@ -31,35 +95,240 @@ def authenticate_request():
     except ValueError:
         return False
 
+def recent_since():
+    """Start of the dashboard's "recent bookings" window (the last 7 days)"""
+    return datetime.utcnow() - timedelta(days=7)
+
+def type_counts(counts):
+    """sessions/retreats/total from booking counts indexed by event type code"""
+    codes = booking_columns.codes['type']
+    
+    def count_of(event_type):
+        code = codes.get(event_type)
+        return int(counts[code]) if 0 <= code < len(counts) else 0
+    
+    return {
+        'sessions': count_of('session'),
+        'retreats': count_of('retreat'),
+        'total': int(counts.sum())
+    }
+
+def trend_buckets(facilitator_id, granularity, start, end):
+    """Booking counts of a facilitator per hour/day/week bucket overlapping [start, end)"""
+    facilitator = booking_columns.codes['facilitator'].get(facilitator_id)
+    starts, series = booking_columns.rollups.series(
+        granularity, facilitator, to_epoch_us(start), to_epoch_us(end), max_buckets=MAX_TREND_BUCKETS)
+    return [dict(start=from_epoch_us(bucket_start), **type_counts(series[:, i]))
+            for i, bucket_start in enumerate(starts)]
+
+def dashboard_trends(facilitator_id):
+    """Daily bookings of the last 14 days and weekly bookings of the last 8 weeks, current ones included"""
+    now = datetime.utcnow()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    this_week = today - timedelta(days=today.weekday())
+    return {
+        'daily': trend_buckets(facilitator_id, 'day', today - timedelta(days=13), now),
+        'weekly': trend_buckets(facilitator_id, 'week', this_week - timedelta(weeks=7), now)
+    }
+
+def cached_per_facilitator(view):
+    """Serve a facilitator view from response_cache, with an ETag and 304s for unchanged polls.
+
+    Only authenticated 200 responses are cached, keyed by the view, the
+    facilitator and the query string.
+    """
+    @wraps(view)
+    def cached_view(facilitator_id):
+        if not authenticate_request():
+            return view(facilitator_id)
+        
+        key = (view.__name__, facilitator_id, tuple(sorted(request.args.items(multi=True))))
+        entry = response_cache.get(key, facilitator_id)
+        if entry is None:
+            # Read the versions first: a change while the response is built leaves the entry stale
+            versions = response_cache.versions(facilitator_id)
+            response = make_response(view(facilitator_id))
+            if response.status_code != 200:
+                return response
+            entry = response_cache.put(key, versions, response.get_data())
+        
+        # Weak comparison: compressed responses carry the ETag as a weak one
+        if request.if_none_match.contains_weak(entry.etag):
+            response_cache.count_not_modified()
+            response = Response(status=304)
+        else:
+            response = Response(entry.body, mimetype='application/json')
+        response.set_etag(entry.etag)
+        # Clients must revalidate every poll; the ETag makes that cheap
+        response.headers['Cache-Control'] = 'no-cache'
+        if response.status_code == 200:
+            # Compressed once per entry and encoding instead of on every hit
+            response = compression.compress_cached(response, entry.encoded)
+        return response
+    
+    return cached_view
+
+def booking_json(booking):
+    """JSON-ready dict of a stored booking"""
+    return booking.to_dict(users_cache, events_cache)
+
+def use_snapshot(snapshot):
+    """Serve users, events and facilitators from a snapshot, reading payloads as they are needed"""
+    global facilitators_cache, events_cache, users_cache
+    users_cache = PayloadTable('users', snapshot, record_cache)
+    events_cache = PayloadTable('events', snapshot, record_cache)
+    facilitators_cache = snapshot.meta['facilitators']
+
 def save_data_to_file():
     """Save data to file for persistence (optional)"""
-    try:
-        data = {
-            'bookings': bookings_storage,
-            'facilitators': facilitators_cache,
-            'events': events_cache,
-            'last_updated': datetime.utcnow().isoformat()
-        }
-        with open('/tmp/crm_data.json', 'w') as f:
-            json.dump(data, f, indent=2)
-    except Exception as e:
-        print(f"Warning: Could not save data to file: {e}")
+    with store_lock:
+        unsaved_changes.clear()
+        try:
+            write_snapshot(SNAPSHOT_FILE, bookings_storage, booking_columns, change_feed, users_cache, events_cache,
+                           facilitators_cache, datetime.utcnow().isoformat())
+            # Continue from the new snapshot so the next save only encodes what changed after it
+            snapshot = Snapshot(SNAPSHOT_FILE)
+            use_snapshot(snapshot)
+            bookings_storage.rebase(snapshot)
+            booking_columns.rebase(snapshot)
+        except Exception as e:
+            # The saver thread tries again
+            unsaved_changes.set()
+            print(f"Warning: Could not save data to file: {e}")
+
+def save_changes():
+    """Saver thread: save the store SAVE_INTERVAL seconds after its first unsaved change"""
+    while True:
+        unsaved_changes.wait()
+        time.sleep(SAVE_INTERVAL)
+        # An explicit save_data_to_file() may have written them meanwhile
+        if unsaved_changes.is_set():
+            save_data_to_file()
+
+def store_changed():
+    """Have a change of the store saved; call it holding store_lock"""
+    global saver
+    if SAVE_INTERVAL <= 0:
+        save_data_to_file()
+        return
+    unsaved_changes.set()
+    # Started on the first change, so it runs in the (forked) process serving requests
+    if saver is None:
+        saver = threading.Thread(target=save_changes, name='crm-saver', daemon=True)
+        saver.start()
+
+@atexit.register
+def save_unsaved_changes():
+    """Save what the saver thread has not yet, when the service stops"""
+    if unsaved_changes.is_set():
+        save_data_to_file()
 
 def load_data_from_file():
     """Load data from file if exists"""
+    global bookings_storage, facilitators_cache, events_cache, users_cache, booking_columns, change_feed
     try:
-        with open('/tmp/crm_data.json', 'r') as f:
+        if os.path.exists(SNAPSHOT_FILE):
+            snapshot = Snapshot(SNAPSHOT_FILE)
+            use_snapshot(snapshot)
+            bookings_storage = BookingLog(snapshot, record_cache)
+            booking_columns = BookingColumns.from_snapshot(snapshot)
+            change_feed = ChangeFeed.from_snapshot(snapshot)
+            response_cache.clear()
+            print(f"✅ Opened snapshot with {len(bookings_storage)} bookings")
+            return
+        
+        with open(DATA_FILE, 'r') as f:
             data = json.load(f)
-            global bookings_storage, facilitators_cache, events_cache
-            bookings_storage = data.get('bookings', [])
-            facilitators_cache = data.get('facilitators', {})
-            events_cache = data.get('events', {})
-            print(f"✅ Loaded {len(bookings_storage)} bookings from file")
+        bookings_storage, users_cache, events_cache, facilitators_cache = load_json_store(data)
+        bookings_storage.cache = record_cache
+        booking_columns = BookingColumns.from_records(bookings_storage, events_cache)
+        change_feed = ChangeFeed.of_inserts(booking_columns.view()['received_us'])
+        response_cache.clear()
+        print(f"✅ Loaded {len(bookings_storage)} bookings from file")
+        # Start from the snapshot next time
+        save_data_to_file()
     except FileNotFoundError:
         print("ℹ️ No existing data file found, starting fresh")
     except Exception as e:
         print(f"Warning: Could not load data from file: {e}")
 
+def find_booking(booking_id):
+    """Stored BookingRecord of a booking, or None"""
+    row = booking_columns.row_of(booking_id)
+    return bookings_storage[row] if row is not None else None
+
+def validate_notification(data):
+    """Return an error body for an invalid booking notification, or None"""
+    # Validate required fields
+    required_fields = ['booking_id', 'user', 'event', 'facilitator_id']
+    missing_fields = [field for field in required_fields if field not in data]
+    
+    if missing_fields:
+        return {
+            'error': 'Missing required fields',
+            'missing_fields': missing_fields
+        }
+    
+    # Validate user object
+    user_required_fields = ['id', 'email', 'name']
+    user_missing_fields = [field for field in user_required_fields if field not in data['user']]
+    
+    if user_missing_fields:
+        return {
+            'error': 'Missing required user fields',
+            'missing_fields': user_missing_fields
+        }
+    
+    # Validate event object
+    event_required_fields = ['id', 'title', 'type']
+    event_missing_fields = [field for field in event_required_fields if field not in data['event']]
+    
+    if event_missing_fields:
+        return {
+            'error': 'Missing required event fields',
+            'missing_fields': event_missing_fields
+        }
+    
+    return None
+
+def store_notification(data):
+    """Store a validated booking notification. Returns (notification, is_duplicate)"""
+    with store_lock:
+        # Check if booking already exists
+        existing_booking = find_booking(data['booking_id'])
+        if existing_booking:
+            return existing_booking, True
+        
+        # Store booking notification (CRM status starts as 'new')
+        notification = BookingRecord.from_notification(len(bookings_storage) + 1, data,
+                                                       to_epoch_us(datetime.utcnow()))
+        
+        # Intern user and event info; the record only keeps their ids
+        user_key, event_key = str(data['user']['id']), str(data['event']['id'])
+        # A changed user or event payload shows in the responses of any facilitator
+        payload_changed = (users_cache.get(user_key, data['user']) != data['user']
+                           or events_cache.get(event_key, data['event']) != data['event'])
+        users_cache[user_key] = data['user']
+        events_cache[event_key] = data['event']
+        
+        bookings_storage.append(notification)
+        booking_columns.append(notification, data['event']['type'])
+        change_feed.record('insert', notification.id - 1, notification.crm_status, notification.received_us)
+        response_cache.invalidate(None if payload_changed else notification.facilitator_id)
+        
+        # Cache facilitator info
+        if 'facilitator' in data:
+            facilitators_cache[str(data['facilitator_id'])] = data['facilitator']
+    
+    # Log the notification
+    print(f"📨 [CRM] New booking notification received:")
+    print(f"   Booking ID: {data['booking_id']}")
+    print(f"   User: {data['user']['name']} ({data['user']['email']})")
+    print(f"   Event: {data['event']['title']} ({data['event']['type']})")
+    print(f"   Facilitator ID: {data['facilitator_id']}")
+    
+    return notification, False
+
 @app.route('/api/notify', methods=['POST'])
 def receive_booking_notification():
     """Endpoint to receive booking notifications from main service"""
@@ -80,84 +349,143 @@ def receive_booking_notification():
                 'message': 'Request body must contain JSON data'
             }), 400
         
-        # Validate required fields
-        required_fields = ['booking_id', 'user', 'event', 'facilitator_id']
-        missing_fields = [field for field in required_fields if field not in data]
+        error = validate_notification(data)
+        if error:
+            return jsonify(error), 400
         
-        if missing_fields:
+        with store_lock:
+            notification, duplicate = store_notification(data)
+            if not duplicate:
+                store_changed()
+        if duplicate:
             return jsonify({
-                'error': 'Missing required fields',
-                'missing_fields': missing_fields
-            }), 400
-        
-        # Validate user object
-        user_required_fields = ['id', 'email', 'name']
-        user_missing_fields = [field for field in user_required_fields if field not in data['user']]
+                'message': 'Booking notification already exists',
+                'notification_id': notification.id,
+                'status': 'duplicate'
+            }), 200
         
-        if user_missing_fields:
-            return jsonify({
-                'error': 'Missing required user fields',
-                'missing_fields': user_missing_fields
-            }), 400
+        return jsonify({
+            'message': 'Booking notification received successfully',
+            'notification_id': notification.id,
+            'status': 'success'
+        }), 200
         
-        # Validate event object
-        event_required_fields = ['id', 'title', 'type']
-        event_missing_fields = [field for field in event_required_fields if field not in data['event']]
+    except Exception as e:
+        print(f"❌ Error in notify endpoint: {e}")
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/notify/batch', methods=['POST'])
+def receive_booking_notifications():
+    """Endpoint to receive the notifications of several bookings made together (cart checkout)"""
+    
+    # Authenticate request
+    if not authenticate_request():
+        return jsonify({
+            'error': 'Unauthorized',
+            'message': 'Valid Bearer token required'
+        }), 401
+    
+    try:
+        data = request.get_json()
         
-        if event_missing_fields:
+        if not data or not data.get('bookings'):
             return jsonify({
-                'error': 'Missing required event fields',
-                'missing_fields': event_missing_fields
+                'error': 'No data provided',
+                'message': 'Request body must contain a non-empty bookings list'
             }), 400
         
-        # Check if booking already exists
-        existing_booking = next((b for b in bookings_storage if b['booking_id'] == data['booking_id']), None)
-        if existing_booking:
-            return jsonify({
-                'message': 'Booking notification already exists',
-                'notification_id': existing_booking['id'],
-                'status': 'duplicate'
-            }), 200
+        # Validate everything first so a bad entry does not leave the batch half stored
+        for index, notification_data in enumerate(data['bookings']):
+            error = validate_notification(notification_data)
+            if error:
+                error['index'] = index
+                return jsonify(error), 400
         
-        # Store booking notification
-        notification = {
-            'id': len(bookings_storage) + 1,
-            'booking_id': data['booking_id'],
-            'user': data['user'],
-            'event': data['event'],
-            'facilitator_id': data['facilitator_id'],
-            'booking_date': data.get('booking_date'),
-            'notes': data.get('notes', ''),
-            'received_at': datetime.utcnow().isoformat(),
-            'status': 'received',
-            'crm_status': 'new'  # CRM-specific status
-        }
+        # Store the batch as one change, which the saver thread writes once
+        results = []
+        with store_lock:
+            for notification_data in data['bookings']:
+                notification, duplicate = store_notification(notification_data)
+                results.append({
+                    'booking_id': notification.booking_id,
+                    'notification_id': notification.id,
+                    'status': 'duplicate' if duplicate else 'success'
+                })
+            if any(result['status'] == 'success' for result in results):
+                store_changed()
         
-        bookings_storage.append(notification)
+        return jsonify({
+            'message': f'{len(results)} booking notifications received successfully',
+            'notifications': results,
+            'status': 'success'
+        }), 200
         
-        # Cache event and facilitator info
-        events_cache[str(data['event']['id'])] = data['event']
-        if 'facilitator' in data:
-            facilitators_cache[str(data['facilitator_id'])] = data['facilitator']
+    except Exception as e:
+        print(f"❌ Error in batch notify endpoint: {e}")
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/notify/cancellations', methods=['POST'])
+def receive_cancellations():
+    """Endpoint to receive the bookings cancelled together with their event, in one request"""
+    
+    # Authenticate request
+    if not authenticate_request():
+        return jsonify({
+            'error': 'Unauthorized',
+            'message': 'Valid Bearer token required'
+        }), 401
+    
+    try:
+        data = request.get_json()
         
-        # Save to file for persistence
-        save_data_to_file()
+        if not data or not isinstance(data.get('booking_ids'), list) or not data['booking_ids']:
+            return jsonify({
+                'error': 'No data provided',
+                'message': 'Request body must contain a non-empty booking_ids list'
+            }), 400
+        
+        now = datetime.utcnow()
+        results, facilitators = [], set()
+        with store_lock:
+            for booking_id in data['booking_ids']:
+                booking = find_booking(booking_id)
+                if not booking:
+                    results.append({'booking_id': booking_id, 'status': 'not_found'})
+                    continue
+                if booking.crm_status == 'cancelled':
+                    results.append({'booking_id': booking_id, 'status': 'duplicate'})
+                    continue
+                
+                row = booking_columns.row_of(booking_id)
+                booking = bookings_storage.set_crm_status(row, 'cancelled', data.get('reason', ''), now)
+                booking_columns.set_crm_status(booking_id, 'cancelled')
+                change_feed.record('status', row, 'cancelled', booking.crm_updated_us)
+                facilitators.add(booking.facilitator_id)
+                results.append({'booking_id': booking_id, 'status': 'success'})
+            
+            for facilitator_id in facilitators:
+                response_cache.invalidate(facilitator_id)
+            
+            if facilitators:
+                store_changed()
         
-        # Log the notification
-        print(f"📨 [CRM] New booking notification received:")
-        print(f"   Booking ID: {data['booking_id']}")
-        print(f"   User: {data['user']['name']} ({data['user']['email']})")
-        print(f"   Event: {data['event']['title']} ({data['event']['type']})")
-        print(f"   Facilitator ID: {data['facilitator_id']}")
+        cancelled = sum(result['status'] == 'success' for result in results)
+        print(f"📨 [CRM] {cancelled} bookings of event {data.get('event_id')} cancelled")
         
         return jsonify({
-            'message': 'Booking notification received successfully',
-            'notification_id': notification['id'],
+            'message': f'{cancelled} bookings cancelled successfully',
+            'notifications': results,
             'status': 'success'
         }), 200
         
     except Exception as e:
-        print(f"❌ Error in notify endpoint: {e}")
+        print(f"❌ Error in cancellations endpoint: {e}")
         return jsonify({
             'error': 'Internal server error',
             'message': str(e)
@@ -179,32 +507,20 @@ def get_all_bookings():
         page = request.args.get('page', 1, type=int)
         per_page = min(request.args.get('per_page', 10, type=int), 100)  # Max 100 per page
         
-        # Filter bookings
-        filtered_bookings = bookings_storage.copy()
-        
-        if facilitator_id:
-            filtered_bookings = [b for b in filtered_bookings if b['facilitator_id'] == facilitator_id]
-        
-        if event_id:
-            filtered_bookings = [b for b in filtered_bookings if b['event']['id'] == event_id]
-        
-        if user_id:
-            filtered_bookings = [b for b in filtered_bookings if b['user']['id'] == user_id]
-        
-        if status:
-            filtered_bookings = [b for b in filtered_bookings if b['status'] == status]
-        
-        if crm_status:
-            filtered_bookings = [b for b in filtered_bookings if b.get('crm_status') == crm_status]
-        
-        # Sort by received date (newest first)
-        filtered_bookings.sort(key=lambda x: x['received_at'], reverse=True)
+        # Filter bookings (newest first)
+        rows = booking_columns.filter_rows(
+            facilitator=facilitator_id or None,
+            event=event_id or None,
+            user=user_id or None,
+            status=status or None,
+            crm_status=crm_status or None
+        )
         
         # Pagination
-        total = len(filtered_bookings)
+        total = len(rows)
         start = (page - 1) * per_page
         end = start + per_page
-        paginated_bookings = filtered_bookings[start:end]
+        paginated_bookings = [booking_json(bookings_storage[row]) for row in rows[start:end]]
         
         return jsonify({
             'bookings': paginated_bookings,
@@ -237,6 +553,7 @@ def get_all_bookings():
         }), 500
 
 @app.route('/api/facilitators/<int:facilitator_id>/bookings', methods=['GET'])
+@cached_per_facilitator
 def get_facilitator_bookings(facilitator_id):
     """Get all bookings for a specific facilitator"""
     if not authenticate_request():
@@ -250,10 +567,10 @@ def get_facilitator_bookings(facilitator_id):
         event_type = request.args.get('event_type')
         crm_status = request.args.get('crm_status')
         
-        # Filter bookings for this facilitator
-        facilitator_bookings = [b for b in bookings_storage if b['facilitator_id'] == facilitator_id]
+        # Statistics over all bookings of this facilitator
+        summary = booking_columns.facilitator_summary(facilitator_id, since=recent_since())
         
-        if not facilitator_bookings:
+        if not summary['total_bookings']:
             return jsonify({
                 'facilitator_id': facilitator_id,
                 'bookings': [],
@@ -275,46 +592,27 @@ def get_facilitator_bookings(facilitator_id):
                 'message': f'No bookings found for facilitator {facilitator_id}'
             }), 200
         
-        # Additional filtering
-        if status:
-            facilitator_bookings = [b for b in facilitator_bookings if b['status'] == status]
-        
-        if event_type:
-            facilitator_bookings = [b for b in facilitator_bookings if b['event']['type'] == event_type]
-        
-        if crm_status:
-            facilitator_bookings = [b for b in facilitator_bookings if b.get('crm_status') == crm_status]
-        
-        # Sort by booking date (newest first)
-        facilitator_bookings.sort(key=lambda x: x['received_at'], reverse=True)
+        # Additional filtering (newest first)
+        rows = booking_columns.filter_rows(
+            facilitator=facilitator_id,
+            status=status or None,
+            type=event_type or None,
+            crm_status=crm_status or None
+        )
         
         # Pagination
-        total = len(facilitator_bookings)
+        total = len(rows)
         start = (page - 1) * per_page
         end = start + per_page
-        paginated_bookings = facilitator_bookings[start:end]
-        
-        # Calculate statistics
-        all_facilitator_bookings = [b for b in bookings_storage if b['facilitator_id'] == facilitator_id]
-        
-        # Recent bookings (last 7 days)
-        seven_days_ago = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        recent_bookings = []
-        for booking in all_facilitator_bookings:
-            try:
-                booking_date = datetime.fromisoformat(booking['received_at'].replace('Z', '+00:00'))
-                if booking_date.replace(tzinfo=None) >= seven_days_ago:
-                    recent_bookings.append(booking)
-            except:
-                continue
+        paginated_bookings = [booking_json(bookings_storage[row]) for row in rows[start:end]]
         
         stats = {
-            'total_bookings': len(all_facilitator_bookings),
-            'session_bookings': len([b for b in all_facilitator_bookings if b['event']['type'] == 'session']),
-            'retreat_bookings': len([b for b in all_facilitator_bookings if b['event']['type'] == 'retreat']),
-            'recent_bookings': len(recent_bookings),
-            'unique_users': len(set(b['user']['id'] for b in all_facilitator_bookings)),
-            'unique_events': len(set(b['event']['id'] for b in all_facilitator_bookings))
+            'total_bookings': summary['total_bookings'],
+            'session_bookings': summary['session_bookings'],
+            'retreat_bookings': summary['retreat_bookings'],
+            'recent_bookings': summary['recent_bookings_count'],
+            'unique_users': summary['unique_users'],
+            'unique_events': summary['unique_events']
         }
         
         return jsonify({
@@ -344,16 +642,17 @@ def get_facilitator_bookings(facilitator_id):
         }), 500
 
 @app.route('/api/facilitators/<int:facilitator_id>/dashboard', methods=['GET'])
+@cached_per_facilitator
 def get_facilitator_dashboard(facilitator_id):
     """Get dashboard data for a specific facilitator"""
     if not authenticate_request():
         return jsonify({'error': 'Unauthorized', 'message': 'Valid Bearer token required'}), 401
     
     try:
-        # Get all bookings for this facilitator
-        facilitator_bookings = [b for b in bookings_storage if b['facilitator_id'] == facilitator_id]
+        # Vectorized statistics over all bookings of this facilitator
+        summary = booking_columns.facilitator_summary(facilitator_id, since=recent_since())
         
-        if not facilitator_bookings:
+        if not summary['total_bookings']:
             return jsonify({
                 'facilitator_id': facilitator_id,
                 'summary': {
@@ -370,70 +669,44 @@ def get_facilitator_dashboard(facilitator_id):
                     'sessions_vs_retreats': {
                         'sessions': 0,
                         'retreats': 0
-                    }
+                    },
+                    **dashboard_trends(facilitator_id)
                 },
                 'message': f'No bookings found for facilitator {facilitator_id}',
                 'generated_at': datetime.utcnow().isoformat()
             }), 200
         
-        # Calculate dashboard statistics
-        total_bookings = len(facilitator_bookings)
-        
-        # Group by event type
-        session_bookings = [b for b in facilitator_bookings if b['event']['type'] == 'session']
-        retreat_bookings = [b for b in facilitator_bookings if b['event']['type'] == 'retreat']
-        
-        # Recent bookings (last 7 days)
-        seven_days_ago = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        recent_bookings = []
-        for booking in facilitator_bookings:
-            try:
-                booking_date = datetime.fromisoformat(booking['received_at'].replace('Z', '+00:00'))
-                if booking_date.replace(tzinfo=None) >= seven_days_ago:
-                    recent_bookings.append(booking)
-            except:
-                continue
-        
-        # Unique events and users
-        unique_events = len(set(b['event']['id'] for b in facilitator_bookings))
-        unique_users = len(set(b['user']['id'] for b in facilitator_bookings))
-        
-        # Popular events (most booked)
-        event_counts = {}
-        for booking in facilitator_bookings:
-            event_id = booking['event']['id']
-            event_title = booking['event']['title']
-            if event_id not in event_counts:
-                event_counts[event_id] = {
-                    'event_id': event_id,
-                    'event_title': event_title,
-                    'event_type': booking['event']['type'],
-                    'booking_count': 0
-                }
-            event_counts[event_id]['booking_count'] += 1
-        
-        popular_events = sorted(event_counts.values(), key=lambda x: x['booking_count'], reverse=True)[:5]
+        popular_events = []
+        for event_id, booking_count in summary['popular_events']:
+            event = events_cache.get(str(event_id), {})
+            popular_events.append({
+                'event_id': event_id,
+                'event_title': event.get('title'),
+                'event_type': event.get('type'),
+                'booking_count': booking_count
+            })
         
         # Recent bookings details (last 10)
-        recent_bookings_details = sorted(recent_bookings, key=lambda x: x['received_at'], reverse=True)[:10]
+        recent_bookings_details = [booking_json(bookings_storage[row]) for row in summary['recent_rows']]
         
         dashboard_data = {
             'facilitator_id': facilitator_id,
             'summary': {
-                'total_bookings': total_bookings,
-                'session_bookings': len(session_bookings),
-                'retreat_bookings': len(retreat_bookings),
-                'recent_bookings_count': len(recent_bookings),
-                'unique_events': unique_events,
-                'unique_users': unique_users
+                'total_bookings': summary['total_bookings'],
+                'session_bookings': summary['session_bookings'],
+                'retreat_bookings': summary['retreat_bookings'],
+                'recent_bookings_count': summary['recent_bookings_count'],
+                'unique_events': summary['unique_events'],
+                'unique_users': summary['unique_users']
             },
             'popular_events': popular_events,
             'recent_bookings': recent_bookings_details,
             'booking_trends': {
                 'sessions_vs_retreats': {
-                    'sessions': len(session_bookings),
-                    'retreats': len(retreat_bookings)
-                }
+                    'sessions': summary['session_bookings'],
+                    'retreats': summary['retreat_bookings']
+                },
+                **dashboard_trends(facilitator_id)
             },
             'generated_at': datetime.utcnow().isoformat()
         }
@@ -447,6 +720,56 @@ def get_facilitator_dashboard(facilitator_id):
             'message': str(e)
         }), 500
 
+@app.route('/api/facilitators/<int:facilitator_id>/trends', methods=['GET'])
+def get_facilitator_trends(facilitator_id):
+    """Get booking counts of a facilitator over time from hour/day/week rollups"""
+    if not authenticate_request():
+        return jsonify({'error': 'Unauthorized', 'message': 'Valid Bearer token required'}), 401
+    
+    try:
+        granularity = request.args.get('granularity', 'day')
+        if granularity not in BookingRollups.GRANULARITIES:
+            return jsonify({
+                'error': 'Invalid granularity',
+                'message': f'granularity must be one of: {list(BookingRollups.GRANULARITIES)}'
+            }), 400
+        
+        try:
+            end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else datetime.utcnow()
+            start = (datetime.fromisoformat(request.args['start']) if request.args.get('start')
+                     else end - TREND_DEFAULT_RANGES[granularity])
+            start_us, end_us = to_epoch_us(start), to_epoch_us(end)
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': 'Invalid date range', 'message': str(e)}), 400
+        
+        if start_us >= end_us:
+            return jsonify({'error': 'Invalid date range', 'message': 'start must be before end'}), 400
+        
+        try:
+            buckets = trend_buckets(facilitator_id, granularity, start, end)
+        except ValueError as e:
+            return jsonify({'error': 'Range too large', 'message': str(e)}), 400
+        
+        facilitator = booking_columns.codes['facilitator'].get(facilitator_id)
+        totals = booking_columns.rollups.total(facilitator, start_us, end_us)
+        
+        return jsonify({
+            'facilitator_id': facilitator_id,
+            'granularity': granularity,
+            'start': from_epoch_us(start_us),
+            'end': from_epoch_us(end_us),
+            'buckets': buckets,
+            'totals': type_counts(totals),
+            'generated_at': datetime.utcnow().isoformat()
+        }), 200
+        
+    except Exception as e:
+        print(f"❌ Error in get_facilitator_trends: {e}")
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
+
 @app.route('/api/bookings/<int:booking_id>', methods=['GET'])
 def get_specific_booking(booking_id):
     """Get specific booking notification by booking ID"""
@@ -454,7 +777,7 @@ def get_specific_booking(booking_id):
         return jsonify({'error': 'Unauthorized', 'message': 'Valid Bearer token required'}), 401
     
     try:
-        booking = next((b for b in bookings_storage if b['booking_id'] == booking_id), None)
+        booking = find_booking(booking_id)
         
         if not booking:
             return jsonify({
@@ -464,7 +787,7 @@ def get_specific_booking(booking_id):
             }), 404
         
         return jsonify({
-            'booking': booking
+            'booking': booking_json(booking)
         }), 200
         
     except Exception as e:
@@ -488,7 +811,7 @@ def update_booking_status(booking_id):
                 'message': 'Request body must contain crm_status field'
             }), 400
         
-        valid_statuses = ['new', 'reviewed', 'contacted', 'confirmed', 'completed']
+        valid_statuses = ['new', 'reviewed', 'contacted', 'confirmed', 'completed', 'cancelled']
         crm_status = data['crm_status']
         
         if crm_status not in valid_statuses:
@@ -497,29 +820,38 @@ def update_booking_status(booking_id):
                 'message': f'crm_status must be one of: {valid_statuses}'
             }), 400
         
-        # Find and update booking
-        booking = next((b for b in bookings_storage if b['booking_id'] == booking_id), None)
-        
-        if not booking:
-            return jsonify({
-                'error': 'Booking not found',
-                'booking_id': booking_id
-            }), 404
-        
-        old_status = booking.get('crm_status', 'new')
-        booking['crm_status'] = crm_status
-        booking['crm_updated_at'] = datetime.utcnow().isoformat()
-        booking['crm_notes'] = data.get('notes', '')
-        
-        # Save to file
-        save_data_to_file()
+        with store_lock:
+            # Find and update booking
+            booking = find_booking(booking_id)
+            
+            if not booking:
+                return jsonify({
+                    'error': 'Booking not found',
+                    'booking_id': booking_id
+                }), 404
+            
+            # The booking service cancelled it (POST /api/notify/cancellations); that is final
+            if booking.crm_status == 'cancelled' and crm_status != 'cancelled':
+                return jsonify({
+                    'error': 'Booking is cancelled',
+                    'booking_id': booking_id,
+                    'message': 'The CRM status of a cancelled booking cannot be changed'
+                }), 409
+            
+            old_status = booking.crm_status
+            row = booking_columns.row_of(booking_id)
+            booking = bookings_storage.set_crm_status(row, crm_status, data.get('notes', ''), datetime.utcnow())
+            booking_columns.set_crm_status(booking_id, crm_status)
+            change_feed.record('status', row, crm_status, booking.crm_updated_us)
+            response_cache.invalidate(booking.facilitator_id)
+            store_changed()
         
         return jsonify({
             'message': 'Booking status updated successfully',
             'booking_id': booking_id,
             'old_status': old_status,
             'new_status': crm_status,
-            'updated_at': booking['crm_updated_at']
+            'updated_at': booking.crm_updated_at
         }), 200
         
     except Exception as e:
@@ -529,6 +861,124 @@ def update_booking_status(booking_id):
             'message': str(e)
         }), 500
 
+@app.route('/api/changes', methods=['GET'])
+def get_changes():
+    """Get booking inserts and CRM status updates after a sequence number, optionally long-polling for them"""
+    if not authenticate_request():
+        return jsonify({'error': 'Unauthorized', 'message': 'Valid Bearer token required'}), 401
+    
+    try:
+        since = request.args.get('since', 0, type=int)
+        limit = min(request.args.get('limit', 100, type=int), MAX_CHANGES_LIMIT)
+        wait = min(request.args.get('wait', 0, type=float), MAX_CHANGES_WAIT)
+        
+        latest = change_feed.latest
+        if since < 0 or since > latest:
+            return jsonify({
+                'error': 'Invalid since',
+                'message': f'since must be between 0 and the latest sequence number ({latest})',
+                'latest_seq': latest
+            }), 400
+        if limit < 1:
+            return jsonify({'error': 'Invalid limit', 'message': 'limit must be at least 1'}), 400
+        
+        # Long-poll: hold the request until something changes or the wait runs out. When
+        # MAX_CHANGES_WAITERS requests already wait, answer now and say when to poll again
+        headers = {}
+        if wait > 0 and latest == since:
+            if changes_waiters and changes_waiters.acquire(blocking=False):
+                try:
+                    change_feed.wait(since, wait)
+                finally:
+                    changes_waiters.release()
+            else:
+                headers['Retry-After'] = '1'
+        
+        changes = []
+        for change in change_feed.read(since, limit):
+            booking = bookings_storage[change['row']]
+            changes.append({
+                'seq': change['seq'],
+                'type': change['type'],
+                'at': from_epoch_us(change['at_us']),
+                'booking_id': booking.booking_id,
+                'crm_status': change['crm_status'],
+                'booking': booking_json(booking)
+            })
+        
+        next_since = changes[-1]['seq'] if changes else since
+        latest = change_feed.latest
+        return jsonify({
+            'changes': changes,
+            'next_since': next_since,
+            'latest_seq': latest,
+            'has_more': next_since < latest
+        }), 200, headers
+        
+    except Exception as e:
+        print(f"❌ Error in get_changes: {e}")
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
+
+def reconcile_ranges(data):
+    """[lo, hi) booking id ranges of a reconciliation request. Raises ValueError when they are invalid"""
+    ranges = (data or {}).get('ranges')
+    if not isinstance(ranges, list) or len(ranges) > MAX_RECONCILE_RANGES:
+        raise ValueError(f'ranges must be a list of at most {MAX_RECONCILE_RANGES} [lo, hi] pairs')
+    for pair in ranges:
+        if (not isinstance(pair, list) or len(pair) != 2 or not all(isinstance(bound, int) for bound in pair)
+                or pair[0] > pair[1]):
+            raise ValueError(f'Invalid range: {pair}')
+    return ranges
+
+@app.route('/api/reconcile/digests', methods=['POST'])
+def get_reconcile_digests():
+    """Digests of booking id ranges, compared with the bookings table's by the reconciliation job"""
+    if not authenticate_request():
+        return jsonify({'error': 'Unauthorized', 'message': 'Valid Bearer token required'}), 401
+    
+    try:
+        try:
+            ranges = reconcile_ranges(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({'error': 'Invalid ranges', 'message': str(e)}), 400
+        
+        return jsonify({
+            'digests': booking_ids.digests(booking_columns, ranges),
+            'max_booking_id': booking_ids.max_id(booking_columns),
+            'count': booking_columns.size
+        }), 200
+        
+    except Exception as e:
+        print(f"❌ Error in get_reconcile_digests: {e}")
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/reconcile/ids', methods=['POST'])
+def get_reconcile_ids():
+    """Booking ids stored in small id ranges whose digests did not match"""
+    if not authenticate_request():
+        return jsonify({'error': 'Unauthorized', 'message': 'Valid Bearer token required'}), 401
+    
+    try:
+        try:
+            ranges = reconcile_ranges(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({'error': 'Invalid ranges', 'message': str(e)}), 400
+        
+        return jsonify({'booking_ids': booking_ids.ids(booking_columns, ranges)}), 200
+        
+    except Exception as e:
+        print(f"❌ Error in get_reconcile_ids: {e}")
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -538,16 +988,25 @@ def health_check():
         'port': 8003,
         'timestamp': datetime.utcnow().isoformat(),
         'notifications_received': len(bookings_storage),
-        'unique_facilitators': len(set(b['facilitator_id'] for b in bookings_storage)),
+        'unique_facilitators': len(booking_columns.codes['facilitator']),
         'unique_events': len(events_cache),
+        'record_cache': record_cache.stats(),
+        'response_cache': response_cache.stats(),
+        'compression': compression.stats(),
         'endpoints': [
             '/health',
             '/api/notify',
+            '/api/notify/batch',
+            '/api/notify/cancellations',
             '/api/bookings',
             '/api/facilitators/{id}/bookings',
             '/api/facilitators/{id}/dashboard',
+            '/api/facilitators/{id}/trends',
             '/api/bookings/{id}',
-            '/api/bookings/{id}/status'
+            '/api/bookings/{id}/status',
+            '/api/changes',
+            '/api/reconcile/digests',
+            '/api/reconcile/ids'
         ]
     }), 200
 
@@ -563,11 +1022,17 @@ if __name__ == '__main__':
     print("📋 Available endpoints:")
     print("   GET  /health")
     print("   POST /api/notify")
+    print("   POST /api/notify/batch")
+    print("   POST /api/notify/cancellations")
     print("   GET  /api/bookings")
     print("   GET  /api/facilitators/{id}/bookings")
     print("   GET  /api/facilitators/{id}/dashboard")
+    print("   GET  /api/facilitators/{id}/trends")
     print("   GET  /api/bookings/{id}")
     print("   PUT  /api/bookings/{id}/status")
+    print("   GET  /api/changes")
+    print("   POST /api/reconcile/digests")
+    print("   POST /api/reconcile/ids")
     
     try:
         app.run(host="0.0.0.0", debug=True, port=8003, use_reloader=False)
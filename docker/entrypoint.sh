@@ -0,0 +1,7 @@
+#!/bin/sh
+# The source is mounted at /ahoum when the container starts, so the OpenAPI spec is built here rather than in the
+# image. Without it FAST_STARTUP workers fall back to importing flasgger.
+if [ ! -f static/openapi.json ]; then
+    python build_openapi.py || echo "⚠️ Could not build static/openapi.json; FAST_STARTUP will import flasgger"
+fi
+exec "$@"
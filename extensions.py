@@ -1,6 +1,20 @@
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
-db = SQLAlchemy()
-migrate = Migrate()
-jwt = JWTManager()
\ No newline at end of file
+from services.idempotency import IdempotencyStore
+from services.rate_limit import RateLimiter
+from services.db_routing import RoutingSession, ReplicaRouter
+from services.async_io import AsyncIO
+from services.google_tokens import GoogleTokenVerifier
+from services.compression import ResponseCompressor
+from services.lifecycle import LifecycleScheduler
+from services.seat_push import SeatHub
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+jwt = JWTManager()
+idempotency = IdempotencyStore()
+limiter = RateLimiter()
+replicas = ReplicaRouter()
+async_io = AsyncIO()
+google_verifier = GoogleTokenVerifier()
+compression = ResponseCompressor()
+lifecycle = LifecycleScheduler()
+seat_hub = SeatHub()
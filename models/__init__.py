@@ -2,5 +2,8 @@ from .user import User
 from .facilitator import Facilitator
 from .event import Event, EventType, EventStatus
 from .booking import Booking, BookingStatus
+from .fieldsets import Fieldset
+from .archive import events_archive, bookings_archive
 
-__all__ = ['User', 'Facilitator', 'Event', 'EventType', 'EventStatus', 'Booking', 'BookingStatus']
+__all__ = ['User', 'Facilitator', 'Event', 'EventType', 'EventStatus', 'Booking', 'BookingStatus', 'Fieldset',
+           'events_archive', 'bookings_archive']
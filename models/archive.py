@@ -0,0 +1,24 @@
+from extensions import db
+from .event import Event
+from .booking import Booking
+
+
+def archive_table(table):
+    """Copy of a table for archived rows: same columns without defaults or foreign keys, plus archived_at.
+
+    Generated columns become plain ones holding the value they had.
+    """
+    columns = [db.Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable,
+                         autoincrement=False)
+               for column in table.columns]
+    return db.Table(f'{table.name}_archive', db.metadata, *columns,
+                    db.Column('archived_at', db.DateTime, nullable=False))
+
+
+# Ended events past the retention window and their bookings, moved out of the
+# hot tables by services.lifecycle
+events_archive = archive_table(Event.__table__)
+bookings_archive = archive_table(Booking.__table__)
+db.Index('idx_events_archive_facilitator_start', events_archive.c.facilitator_id, events_archive.c.start_datetime)
+db.Index('idx_bookings_archive_user_created', bookings_archive.c.user_id, bookings_archive.c.created_at)
+db.Index('idx_bookings_archive_event', bookings_archive.c.event_id)
@@ -1,6 +1,7 @@
 from extensions import db
 from datetime import datetime
 import enum
+from .fieldsets import Fieldset, attribute, converted
 
 class BookingStatus(enum.IntEnum):
     PENDING = 1
@@ -25,23 +26,26 @@ class Booking(db.Model):
     # Unique constraint and indexes
     __table_args__ = (
         db.UniqueConstraint('user_id', 'event_id', name='unique_user_event_booking'),
-        db.Index('idx_booking_user', 'user_id'),
+        db.Index('idx_booking_user_created', 'user_id', 'created_at'),
         db.Index('idx_booking_event', 'event_id'),
         db.Index('idx_booking_status', 'status'),
         db.Index('idx_booking_date', 'booking_date'),
     )
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'user': self.user.to_dict() if self.user else None,
-            'event': self.event.to_dict() if self.event else None,
-            'booking_date': self.booking_date.isoformat(),
-            'status': BookingStatus(self.status).name,
-            'notes': self.notes,
-            'payment_status': self.payment_status,
-            'created_at': self.created_at.isoformat()
-        }
+    # Serialized fields and relationships, see models.fieldsets
+    FIELDS = {
+        'id': attribute('id'),
+        'booking_date': attribute('booking_date'),
+        'status': converted('status', lambda value: BookingStatus(value).name),
+        'notes': attribute('notes'),
+        'payment_status': attribute('payment_status'),
+        'created_at': attribute('created_at'),
+    }
+    EMBEDS = {'user': 'user_id', 'event': 'event_id'}
+    DEFAULT_EMBED = ('user', 'event', 'event.facilitator')
+    
+    def to_dict(self, fieldset=None):
+        return (fieldset or Fieldset.default(Booking)).serialize(self)
     
     def __repr__(self):
         return f'<Booking {self.id}: User {self.user_id} -> Event {self.event_id}>'
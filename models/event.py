@@ -2,6 +2,7 @@ from extensions import db
 from datetime import datetime
 import enum
 from sqlalchemy import Numeric
+from .fieldsets import Fieldset, attribute, converted
 class EventType(enum.IntEnum):
     SESSION = 1
     RETREAT = 2
@@ -25,6 +26,8 @@ class Event(db.Model):
     virtual_link = db.Column(db.String(400))
     max_participants = db.Column(db.Integer, default=10)
     current_participants = db.Column(db.Integer, default=0)
+    # Stored generated column so seat availability can be filtered and indexed in SQL
+    seats_available = db.Column(db.Integer, db.Computed('max_participants - current_participants', persisted=True))
     price = db.Column(Numeric(10, 2), nullable=False)
     status = db.Column(db.Integer, default=EventStatus.ACTIVE)
     requirements = db.Column(db.Text)
@@ -34,12 +37,15 @@ class Event(db.Model):
     # Relationships
     bookings = db.relationship('Booking', backref='event', lazy=True, cascade='all, delete-orphan')
     
-    # Indexes for better query performance
+    # Indexes for better query performance, leading with the equality filters of
+    # the listing queries and ending with the start_datetime range/sort column
     __table_args__ = (
-        db.Index('idx_event_facilitator', 'facilitator_id'),
         db.Index('idx_event_start_datetime', 'start_datetime'),
-        db.Index('idx_event_type', 'event_type'),
-        db.Index('idx_event_status', 'status'),
+        db.Index('idx_event_status_start', 'status', 'start_datetime', 'seats_available'),
+        db.Index('idx_event_status_type_start', 'status', 'event_type', 'start_datetime', 'seats_available'),
+        db.Index('idx_event_facilitator_status_start', 'facilitator_id', 'status', 'start_datetime'),
+        # Ended / past-retention scans of services.lifecycle
+        db.Index('idx_event_status_end', 'status', 'end_datetime'),
     )
     
     @property
@@ -50,26 +56,32 @@ class Event(db.Model):
     def available_spots(self):
         return self.max_participants - self.current_participants
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'event_type':EventType(self.event_type).name,
-            'facilitator': self.facilitator.to_dict() if self.facilitator else None,
-            'start_datetime': self.start_datetime.isoformat(),
-            'end_datetime': self.end_datetime.isoformat(),
-            'location': self.location,
-            'virtual_link': self.virtual_link,
-            'max_participants': self.max_participants,
-            'current_participants': self.current_participants,
-            'available_spots': self.available_spots,
-            'price': float(self.price),
-            'status': EventStatus(self.status).name,
-            'requirements': self.requirements,
-            'is_full': self.is_full,
-            'created_at': self.created_at.isoformat()
-        }
+    # Serialized fields and relationships, see models.fieldsets
+    FIELDS = {
+        'id': attribute('id'),
+        'title': attribute('title'),
+        'description': attribute('description'),
+        'event_type': converted('event_type', lambda value: EventType(value).name),
+        'start_datetime': attribute('start_datetime'),
+        'end_datetime': attribute('end_datetime'),
+        'location': attribute('location'),
+        'virtual_link': attribute('virtual_link'),
+        'max_participants': attribute('max_participants'),
+        'current_participants': attribute('current_participants'),
+        'available_spots': attribute('available_spots', 'max_participants', 'current_participants',
+                                     sql=lambda event: event.seats_available),
+        'price': attribute('price'),
+        'status': converted('status', lambda value: EventStatus(value).name),
+        'requirements': attribute('requirements'),
+        'is_full': attribute('is_full', 'max_participants', 'current_participants',
+                             sql=lambda event: event.seats_available <= 0),
+        'created_at': attribute('created_at'),
+    }
+    EMBEDS = {'facilitator': 'facilitator_id'}
+    DEFAULT_EMBED = ('facilitator',)
+    
+    def to_dict(self, fieldset=None):
+        return (fieldset or Fieldset.default(Event)).serialize(self)
     
     def __repr__(self):
         return f'<Event {self.title}>'
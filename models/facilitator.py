@@ -1,5 +1,6 @@
 from extensions import db
 from datetime import datetime
+from .fieldsets import Fieldset, attribute, through
 
 class Facilitator(db.Model):
     __tablename__ = 'facilitators'
@@ -17,18 +18,24 @@ class Facilitator(db.Model):
     
 
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'email': self.users.email,
-            'first_name': self.users.first_name,
-            'last_name': self.users.last_name,
-            'phone': self.users.phone,
-            'bio': self.bio,
-            'specialization': self.specialization,
-            'experience_years': self.experience_years,
-            'is_active': self.users.is_active,
-        }
+    # Serialized fields and relationships, see models.fieldsets; the contact
+    # fields are read from the facilitator's user
+    FIELDS = {
+        'id': attribute('id'),
+        'email': through('users', 'email'),
+        'first_name': through('users', 'first_name'),
+        'last_name': through('users', 'last_name'),
+        'phone': through('users', 'phone'),
+        'bio': attribute('bio'),
+        'specialization': attribute('specialization'),
+        'experience_years': attribute('experience_years'),
+        'is_active': through('users', 'is_active'),
+    }
+    EMBEDS = {'events': None}
+    DEFAULT_EMBED = ()
+    
+    def to_dict(self, fieldset=None):
+        return (fieldset or Fieldset.default(Facilitator)).serialize(self)
     
     @property
     def full_name(self):
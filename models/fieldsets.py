@@ -0,0 +1,248 @@
+from sqlalchemy import inspect
+from sqlalchemy.orm import aliased, joinedload, load_only, selectinload
+
+
+class Field:
+    """A serialized field: the columns it is computed from and its value on an instance.
+
+    For row queries, sql(entity) is its SQL expression (default: its one
+    column) and convert the Python conversion of the selected value.
+    """
+
+    __slots__ = ('columns', 'value', 'sql', 'convert')
+
+    def __init__(self, columns, value, sql=None, convert=None):
+        self.columns = columns
+        self.value = value
+        self.sql = sql
+        self.convert = convert
+
+
+def attribute(name, *columns, sql=None):
+    """Field read from the attribute of the same name, computed from columns (default: itself)"""
+    return Field(columns or (name,), lambda obj: getattr(obj, name), sql)
+
+
+def converted(name, convert):
+    """Field of a column passed through convert, e.g. an enum value to its name"""
+    return Field((name,), lambda obj: convert(getattr(obj, name)), convert=convert)
+
+
+def through(relationship, name):
+    """Field read from a column of a many-to-one relationship that is not embedded itself"""
+    return Field((f'{relationship}.{name}',), lambda obj: getattr(getattr(obj, relationship), name))
+
+
+def _paths(value):
+    """Comma-separated ?fields=/?embed= value as a list of dotted paths, None when absent"""
+    if value is None:
+        return None
+    return [part.strip().split('.') for part in value.split(',') if part.strip()]
+
+
+class Fieldset:
+    """Fields of a model to serialize and the fieldsets of the relationships embedded in it.
+
+    A model declares FIELDS (name -> Field), EMBEDS (relationship -> foreign
+    key field written when it is not embedded, or None) and DEFAULT_EMBED.
+    to_dict() writes what the fieldset selects and options() loads exactly
+    that: load_only() on the columns, joined or select-in eager loads of the
+    embedded relationships. rows() selects the same as plain rows for
+    read-only listings. Columns behind a dot ('users.email') are read
+    through a many-to-one relationship that is joined in. 'id' is always
+    written, and is the first field of every model.
+    """
+
+    _defaults = {}
+
+    def __init__(self, model, fields=None, embed=None):
+        self.model = model
+        self.fields = fields  # None: all of FIELDS
+        self.embed = embed or {}
+
+    @classmethod
+    def default(cls, model):
+        """Fieldset of to_dict() without arguments: every field, DEFAULT_EMBED embedded"""
+        if model not in cls._defaults:
+            cls._defaults[model] = cls.parse(model)
+        return cls._defaults[model]
+
+    @classmethod
+    def parse(cls, model, fields=None, embed=None):
+        """Fieldset of the ?fields= and ?embed= query parameters.
+
+        Both are comma-separated and dotted into relationships:
+        fields=status,event.title,event.start_datetime. Naming a relationship
+        in fields embeds it. Without embed, DEFAULT_EMBED is embedded when
+        fields is absent too, otherwise only what fields names; embed= (empty)
+        embeds nothing. Raises ValueError on an unknown field or relationship.
+        """
+        embed_paths = _paths(embed)
+        if embed_paths is None:
+            embed_paths = [] if fields is not None else [name.split('.') for name in model.DEFAULT_EMBED]
+        return cls._build(model, _paths(fields), embed_paths)
+
+    @classmethod
+    def from_args(cls, model, args):
+        """Fieldset of a request's query arguments"""
+        return cls.parse(model, args.get('fields'), args.get('embed'))
+
+    @classmethod
+    def _build(cls, model, field_paths, embed_paths):
+        nested_embed, nested_fields, whole = {}, {}, set()
+        for path in embed_paths:
+            if path[0] not in model.EMBEDS:
+                raise ValueError(f'Unknown relationship to embed: {path[0]}')
+            nested_embed.setdefault(path[0], [])
+            if len(path) > 1:
+                nested_embed[path[0]].append(path[1:])
+
+        fields = None
+        if field_paths is not None:
+            fields = set()
+            foreign_keys = {key for key in model.EMBEDS.values() if key}
+            for path in field_paths:
+                name = path[0]
+                if name in model.EMBEDS:
+                    nested_embed.setdefault(name, [])
+                    if len(path) == 1:
+                        whole.add(name)
+                    else:
+                        nested_fields.setdefault(name, []).append(path[1:])
+                elif len(path) == 1 and (name in model.FIELDS or name in foreign_keys):
+                    fields.add(name)
+                else:
+                    raise ValueError(f'Unknown field: {".".join(path)}')
+
+        mapper = inspect(model)
+        embedded = {}
+        for name, paths in nested_embed.items():
+            child_fields = None if name in whole else nested_fields.get(name)
+            embedded[name] = cls._build(mapper.relationships[name].mapper.class_, child_fields, paths)
+        return cls(model, fields, embedded)
+
+    def _selected(self, name):
+        return self.fields is None or name == 'id' or name in self.fields
+
+    def serialize(self, obj):
+        data = {name: field.value(obj) for name, field in self.model.FIELDS.items() if self._selected(name)}
+        for name, foreign_key in self.model.EMBEDS.items():
+            if name in self.embed:
+                related = getattr(obj, name)
+                if isinstance(related, list):
+                    data[name] = [self.embed[name].serialize(item) for item in related]
+                else:
+                    data[name] = self.embed[name].serialize(related) if related is not None else None
+            elif foreign_key and self._selected(foreign_key):
+                data[foreign_key] = getattr(obj, foreign_key)
+        return data
+
+    def options(self):
+        """Loader options that load what serialize() reads, and nothing else"""
+        mapper = inspect(self.model)
+        columns, joined = {'id'}, {}
+        for name, field in self.model.FIELDS.items():
+            if self._selected(name):
+                for column in field.columns:
+                    relationship, _, column = column.rpartition('.')
+                    if relationship:
+                        joined.setdefault(relationship, {'id'}).add(column)
+                    else:
+                        columns.add(column)
+        for name, foreign_key in self.model.EMBEDS.items():
+            if name not in self.embed and foreign_key and self._selected(foreign_key):
+                columns.add(foreign_key)
+        for name in list(joined) + list(self.embed):
+            # Many-to-one joins need the local foreign key columns
+            relationship = mapper.relationships[name]
+            if not relationship.uselist:
+                columns.update(mapper.get_property_by_column(column).key for column in relationship.local_columns)
+
+        options = [load_only(*(getattr(self.model, column) for column in sorted(columns)))]
+        for name, related in joined.items():
+            target = mapper.relationships[name].mapper.class_
+            options.append(joinedload(getattr(self.model, name)).load_only(
+                *(getattr(target, column) for column in sorted(related))))
+        for name, fieldset in self.embed.items():
+            loader = selectinload if mapper.relationships[name].uselist else joinedload
+            options.append(loader(getattr(self.model, name)).options(*fieldset.options()))
+        return options
+
+    @property
+    def row_query_supported(self):
+        """Whether rows() can serve the fieldset: only many-to-one relationships are embedded"""
+        mapper = inspect(self.model)
+        return all(not mapper.relationships[name].uselist and fieldset.row_query_supported
+                   for name, fieldset in self.embed.items())
+
+    def rows(self, query):
+        """query of the model narrowed to plain rows of the fieldset's columns.
+
+        No instances are built and nothing enters the identity map: the
+        selected columns come back as tuples, embedded relationships outer
+        joined in, and serialize_row() writes them. For read-only listings;
+        use options() when row_query_supported is False.
+        """
+        if not hasattr(self, '_row_query'):
+            columns, joins = [], []
+            plan = self._row_plan(self.model, columns, joins)
+            self._row_query = (columns, joins, plan)
+        columns, joins, _ = self._row_query
+        query = query.with_entities(*columns)
+        for join in joins:
+            query = query.outerjoin(join)
+        return query
+
+    def _row_plan(self, entity, columns, joins):
+        """Select columns and joins for entity, returns [(key, index, convert, nested plan)]"""
+        mapper = inspect(self.model)
+        related = {}
+
+        def joined(name):
+            if name not in related:
+                related[name] = aliased(mapper.relationships[name].mapper.class_)
+                joins.append(getattr(entity, name).of_type(related[name]))
+            return related[name]
+
+        plan = []
+        for name, field in self.model.FIELDS.items():
+            if not self._selected(name):
+                continue
+            if field.sql is not None:
+                expression = field.sql(entity)
+            else:
+                relationship, _, column = field.columns[0].rpartition('.')
+                expression = getattr(joined(relationship) if relationship else entity, column)
+            plan.append((name, len(columns), field.convert, None))
+            columns.append(expression)
+        for name, foreign_key in self.model.EMBEDS.items():
+            if name in self.embed:
+                nested = self.embed[name]._row_plan(joined(name), columns, joins)
+                plan.append((name, nested[0][1], None, nested))  # None when its id is NULL
+            elif foreign_key and self._selected(foreign_key):
+                plan.append((foreign_key, len(columns), None, None))
+                columns.append(getattr(entity, foreign_key))
+        return plan
+
+    def serialize_row(self, row):
+        """to_dict() of a row of rows()"""
+        return _row_dict(self._row_query[2], row)
+
+    def listing(self, query):
+        """query for a read-only listing: rows() when supported, instances with options() otherwise"""
+        return self.rows(query) if self.row_query_supported else query.options(*self.options())
+
+    def dump(self, item):
+        """to_dict() of an item of listing()"""
+        return self.serialize(item) if isinstance(item, self.model) else self.serialize_row(item)
+
+
+def _row_dict(plan, row):
+    data = {}
+    for key, index, convert, nested in plan:
+        value = row[index]
+        if nested is not None:
+            data[key] = _row_dict(nested, row) if value is not None else None
+        else:
+            data[key] = convert(value) if convert is not None and value is not None else value
+    return data
@@ -2,6 +2,7 @@ from extensions import db
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import enum
+from .fieldsets import Fieldset, attribute
 
 
 
@@ -36,16 +37,21 @@ class User(db.Model):
             return False
         return check_password_hash(self.password_hash, password)
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'email': self.email,
-            'first_name': self.first_name,
-            'last_name': self.last_name,
-            'phone': self.phone,
-            'created_at': self.created_at.isoformat(),
-            'is_active': self.is_active
-        }
+    # Serialized fields, see models.fieldsets
+    FIELDS = {
+        'id': attribute('id'),
+        'email': attribute('email'),
+        'first_name': attribute('first_name'),
+        'last_name': attribute('last_name'),
+        'phone': attribute('phone'),
+        'created_at': attribute('created_at'),
+        'is_active': attribute('is_active'),
+    }
+    EMBEDS = {}
+    DEFAULT_EMBED = ()
+    
+    def to_dict(self, fieldset=None):
+        return (fieldset or Fieldset.default(User)).serialize(self)
     
     def __repr__(self):
         return f'<User {self.email}>'
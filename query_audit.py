@@ -0,0 +1,320 @@
+"""Query plan audit for every endpoint query.
+
+Seeds a database, calls each endpoint through the test client while capturing
+the SQL it emits, then runs EXPLAIN on MySQL (EXPLAIN QUERY PLAN on SQLite) for
+every SELECT. Full table scans, filesorts and temporary tables are reported
+together with a proposed composite index, and the exit code is non-zero when
+findings remain, so the script can gate CI.
+
+Usage:
+    FLASK_ENV=testing python query_audit.py [--seed] [--scale 1] [--json report.json]
+                                            [--allow endpoint:issue ...]
+
+Only run it against a disposable database: --seed clears and refills the
+tables, and the write endpoints are exercised too.
+"""
+import argparse
+import json
+import random
+import re
+import sys
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event as sa_event, insert, text
+
+from app import create_app
+from extensions import db
+from models import User, Facilitator, Event, EventType, Booking, BookingStatus
+
+# (name, method, path, json body); paths are formatted with ids from the seed
+ENDPOINTS = [
+    ('auth.login', 'POST', '/api/auth/login', {'email': 'audit0@example.com', 'password': 'audit'}),
+    ('auth.profile', 'GET', '/api/auth/profile', None),
+    ('events.list', 'GET', '/api/events/', None),
+    ('events.list_by_type', 'GET', '/api/events/?type=session', None),
+    ('events.list_available', 'GET', '/api/events/?type=retreat&available=true&min_price=10&max_price=500', None),
+    ('events.list_by_facilitator', 'GET', '/api/events/?facilitator_id={facilitator_id}', None),
+    ('events.list_sparse', 'GET', '/api/events/?fields=title,start_datetime,status', None),
+    ('events.detail', 'GET', '/api/events/{event_id}', None),
+    ('bookings.list', 'GET', '/api/bookings/', None),
+    ('bookings.list_upcoming', 'GET', '/api/bookings/?upcoming=true', None),
+    ('bookings.list_sparse', 'GET', '/api/bookings/?fields=status,event.title,event.start_datetime', None),
+    ('bookings.detail', 'GET', '/api/bookings/{booking_id}', None),
+    ('bookings.create', 'POST', '/api/bookings/', {'event_id': '{free_event_id}'}),
+    ('bookings.cancel', 'PUT', '/api/bookings/{booking_id}/cancel', None),
+    ('facilitators.list', 'GET', '/api/facilitators/', None),
+    ('facilitators.detail', 'GET', '/api/facilitators/{facilitator_id}', None),
+    ('facilitators.events', 'GET', '/api/facilitators/{facilitator_id}/events', None),
+]
+
+# Findings accepted on purpose (endpoint:issue -> why); --allow accepts more for one run
+ALLOWED_FINDINGS = {
+    # Lists every facilitator whose user is active: the page walks facilitators in primary key order and stops
+    # at LIMIT, and only the pagination count reads the whole table, which holds one row per facilitator
+    'facilitators.list:full_scan': 'paginated listing of the whole (small) facilitators table in primary key order',
+}
+
+PLACEHOLDER = r'(?:\?|%s|%\(\w+\)s|:\w+)'
+EQUALITY_RE = re.compile(r'(\w+)\.(\w+) (?:= ' + PLACEHOLDER + r'|IN \()')
+RANGE_RE = re.compile(r'(\w+)\.(\w+) (?:>|<|>=|<=|BETWEEN) ')
+ORDER_BY_RE = re.compile(r'ORDER BY (.+?)(?: LIMIT| OFFSET|\)|$)', re.S)
+COLUMN_RE = re.compile(r'(\w+)\.(\w+)')
+
+
+def seed_audit_data(scale=1):
+    """Fill the tables with enough rows for the planner to prefer indexes"""
+    random.seed(42)
+    db.drop_all()
+    db.create_all()
+
+    now = datetime.utcnow()
+    user_count, facilitator_count, event_count = 500 * scale, 20 * scale, 1000 * scale
+
+    password = User()
+    password.set_password('audit')
+    db.session.execute(insert(User), [{
+        'email': f'audit{i}@example.com', 'password_hash': password.password_hash,
+        'first_name': 'Audit', 'last_name': str(i), 'is_active': True,
+        'created_at': now, 'updated_at': now,
+    } for i in range(user_count)])
+    db.session.execute(insert(Facilitator), [{
+        'user': i + 1, 'bio': 'audit', 'specialization': 'audit', 'experience_years': 1,
+    } for i in range(facilitator_count)])
+    db.session.execute(insert(Event), [{
+        'title': f'Audit event {i}', 'description': 'audit',
+        'event_type': random.choice(list(EventType)).value,
+        'facilitator_id': random.randint(1, facilitator_count),
+        'start_datetime': now + timedelta(days=random.randint(-180, 180)),
+        'end_datetime': now + timedelta(days=random.randint(-180, 180), hours=2),
+        'max_participants': 20, 'current_participants': random.randint(0, 20),
+        'price': Decimal(random.randint(10, 500)), 'status': random.choice([1, 1, 1, 2, 3]),
+        'created_at': now, 'updated_at': now,
+    } for i in range(event_count)])
+
+    bookings = {(random.randint(1, user_count), random.randint(1, event_count)) for _ in range(event_count * 5)}
+    db.session.execute(insert(Booking), [{
+        'user_id': user_id, 'event_id': event_id, 'status': BookingStatus.CONFIRMED.value,
+        'booking_date': now, 'created_at': now - timedelta(minutes=random.randint(0, 100000)), 'updated_at': now,
+    } for user_id, event_id in bookings])
+    db.session.commit()
+
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute(text('ANALYZE'))
+    else:
+        db.session.execute(text('ANALYZE TABLE users, facilitators, events, bookings'))
+    db.session.commit()
+
+
+def audit_fixtures():
+    """Pick ids from the seeded data for the parameterised endpoint paths"""
+    booking = Booking.query.join(Event).filter(Event.start_datetime > datetime.utcnow()).first()
+    booked = {b.event_id for b in Booking.query.filter_by(user_id=booking.user_id)}
+    free_event = Event.query.filter(Event.status == 1, Event.start_datetime > datetime.utcnow(),
+                                    Event.seats_available > 0, Event.id.notin_(booked)).first()
+    return {
+        'user_id': booking.user_id,
+        'booking_id': booking.id,
+        'event_id': booking.event_id,
+        'free_event_id': free_event.id,
+        'facilitator_id': booking.event.facilitator_id,
+    }
+
+
+def capture_endpoint_sql(app, fixtures):
+    """Call every endpoint and return {endpoint: [(statement, parameters, status_code, count)]}"""
+    captured = {}
+    current = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            current.append((statement, parameters))
+
+    with app.app_context():
+        token = create_access_token(identity=str(fixtures['user_id']))
+        engine = db.engine
+    sa_event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    try:
+        for name, method, path, body in ENDPOINTS:
+            current.clear()
+            if body:
+                body = {key: value.format(**fixtures) if isinstance(value, str) else value
+                        for key, value in body.items()}
+                if 'event_id' in body:
+                    body['event_id'] = int(body['event_id'])
+            response = client.open(path.format(**fixtures), method=method, json=body, headers=headers)
+            # Identical statements (lazy loads repeated per row) are explained once and counted
+            queries = {}
+            for statement, parameters in current:
+                if statement in queries:
+                    queries[statement][2] += 1
+                else:
+                    queries[statement] = [parameters, response.status_code, 1]
+            captured[name] = [(statement, *values) for statement, values in queries.items()]
+    finally:
+        sa_event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return captured
+
+
+def explain(statement, parameters):
+    """Return (plan rows, issues as [(issue, table)])"""
+    dialect = db.engine.dialect.name
+    with db.engine.connect() as conn:
+        if dialect == 'sqlite':
+            rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+            plan = [row[3] for row in rows]
+            issues = []
+            for detail in plan:
+                scan = re.match(r'SCAN (\w+)(.*)', detail)
+                # SCAN CONSTANT ROW (a FROM-less SELECT) and scans of subqueries and co-routines read no table
+                if scan and (scan.group(1) in ('CONSTANT', 'SUBQUERY') or 'CO-ROUTINE' in scan.group(2)):
+                    scan = None
+                if scan and 'USING' not in scan.group(2) and not scan.group(1).startswith('anon'):
+                    issues.append(('full_scan', scan.group(1)))
+                if 'TEMP B-TREE FOR ORDER BY' in detail or 'TEMP B-TREE FOR LAST' in detail:
+                    issues.append(('filesort', None))
+                elif 'TEMP B-TREE' in detail:
+                    issues.append(('temporary', None))
+            return plan, issues
+
+        result = conn.exec_driver_sql('EXPLAIN ' + statement, parameters)
+        keys = list(result.keys())
+        plan = [dict(zip(keys, row)) for row in result]
+        issues = []
+        for row in plan:
+            table = row.get('table') or ''
+            extra = row.get('Extra') or ''
+            if row.get('type') == 'ALL' and not table.startswith('<'):
+                issues.append(('full_scan', table))
+            if 'Using filesort' in extra:
+                issues.append(('filesort', table))
+            if 'Using temporary' in extra:
+                issues.append(('temporary', table))
+        return plan, issues
+
+
+def propose_index(statement, table):
+    """Suggest a composite index: equality columns, then the range or ORDER BY column"""
+    statement = ' '.join(statement.split())
+    where = statement.split(' WHERE ', 1)[1] if ' WHERE ' in statement else ''
+    order = ORDER_BY_RE.search(statement)
+    order_columns = [(t, c) for t, c in COLUMN_RE.findall(order.group(1))] if order else []
+
+    if table is None:
+        tables = [t for t, _ in order_columns] or [t for t, _ in EQUALITY_RE.findall(where)]
+        if not tables:
+            return None
+        table = tables[0]
+
+    columns = []
+    for t, column in EQUALITY_RE.findall(where):
+        if t == table and column not in columns:
+            columns.append(column)
+    ranges = [column for t, column in RANGE_RE.findall(where) if t == table]
+    sort = [column for t, column in order_columns if t == table]
+    for column in (ranges[:1] or sort):
+        if column not in columns:
+            columns.append(column)
+
+    if not columns or table not in db.metadata.tables:
+        return None
+    # The primary key is indexed already
+    if columns == [c.name for c in db.metadata.tables[table].primary_key.columns]:
+        return None
+
+    existing = [[c.name for c in index.columns] for index in db.metadata.tables[table].indexes]
+    if any(cols[:len(columns)] == columns for cols in existing):
+        return {'table': table, 'columns': columns, 'exists': True}
+    return {'table': table, 'columns': columns, 'exists': False,
+            'ddl': f"CREATE INDEX idx_{table}_{'_'.join(columns)} ON {table} ({', '.join(columns)})"}
+
+
+def run_audit(app, seed=False, scale=1):
+    with app.app_context():
+        if seed or not db.inspect(db.engine).has_table('events') or not Event.query.first():
+            print(f"🌱 Seeding audit data (scale {scale})...")
+            seed_audit_data(scale)
+        fixtures = audit_fixtures()
+
+    captured = capture_endpoint_sql(app, fixtures)
+
+    report = []
+    with app.app_context():
+        for endpoint, queries in captured.items():
+            for statement, parameters, status_code, count in queries:
+                plan, issues = explain(statement, parameters)
+                proposals = []
+                for issue, table in issues:
+                    proposal = propose_index(statement, table)
+                    if proposal and proposal not in proposals:
+                        proposals.append(proposal)
+                report.append({
+                    'endpoint': endpoint,
+                    'status_code': status_code,
+                    'executions': count,
+                    'statement': ' '.join(statement.split()),
+                    'plan': plan,
+                    'issues': sorted({issue for issue, _ in issues}),
+                    'proposed_indexes': proposals,
+                })
+    return report
+
+
+def print_report(report, verbose=False):
+    for entry in report:
+        if not entry['issues'] and not verbose:
+            continue
+        marker = '❌' if entry['issues'] else '✅'
+        print(f"\n{marker} {entry['endpoint']} (HTTP {entry['status_code']}, executed {entry['executions']}x)")
+        print(f"   {entry['statement'][:200]}")
+        for line in entry['plan']:
+            print(f"     plan: {line}")
+        for issue in entry['issues']:
+            print(f"     issue: {issue}")
+        for proposal in entry['proposed_indexes']:
+            if proposal['exists']:
+                print(f"     index on {proposal['table']}({', '.join(proposal['columns'])}) exists but was not used")
+            else:
+                print(f"     proposal: {proposal['ddl']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='EXPLAIN every endpoint query and flag bad plans')
+    parser.add_argument('--seed', action='store_true', help='drop, recreate and seed the tables first')
+    parser.add_argument('--scale', type=int, default=1)
+    parser.add_argument('--json', help='write the full report to this file')
+    parser.add_argument('--verbose', action='store_true', help='print plans for clean queries too')
+    parser.add_argument('--allow', action='append', default=[],
+                        help='endpoint:issue pair that does not fail the audit (repeatable)')
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    report = run_audit(app, seed=args.seed, scale=args.scale)
+    print_report(report, args.verbose)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+
+    allowed = set(ALLOWED_FINDINGS) | set(args.allow)
+    findings = {f"{entry['endpoint']}:{issue}" for entry in report for issue in entry['issues']}
+    failures = [(entry['endpoint'], issue) for entry in report for issue in entry['issues']
+                if f"{entry['endpoint']}:{issue}" not in allowed]
+
+    print(f"\n📊 {len(report)} queries audited, {len(failures)} finding(s)")
+    for finding in sorted(findings & set(ALLOWED_FINDINGS)):
+        print(f"   ⚠️  {finding} allowed: {ALLOWED_FINDINGS[finding]}")
+    if failures:
+        for endpoint, issue in sorted(set(failures)):
+            print(f"   ❌ {endpoint}: {issue}")
+        return 1
+    print("✅ All endpoint queries use indexes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
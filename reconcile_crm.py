@@ -0,0 +1,53 @@
+"""Reconcile the CRM service's bookings with the bookings table.
+
+Compares the booking ids of both sides by range digests, drilling down only
+into the ranges that differ (see services.reconciliation.CrmReconciler), and
+sends the CRM the notifications of the bookings it is missing in batches.
+Bookings missing from the CRM that are already archived, and ids only the
+CRM has, are reported. The exit code is non-zero when differences remain,
+so the script can run from cron and alert.
+
+Usage:
+    python reconcile_crm.py [--dry-run] [--fanout 16] [--leaf-size 64] [--batch-size 100] [--json report.json]
+"""
+import argparse
+import json
+import sys
+
+from app import create_app
+from services.reconciliation import CrmReconciler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare the CRM with the bookings table and resend what it is missing')
+    parser.add_argument('--dry-run', action='store_true', help='compare and report without resending')
+    parser.add_argument('--fanout', type=int, default=16, help='children per mismatching range')
+    parser.add_argument('--leaf-size', type=int, default=64, help='ids per range whose ids are compared')
+    parser.add_argument('--batch-size', type=int, default=100, help='notifications per batch request')
+    parser.add_argument('--json', help='write the full report to this file')
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        report = CrmReconciler(args.fanout, args.leaf_size, args.batch_size).run(dry_run=args.dry_run)
+
+    print(f"Compared {report['ranges_compared']} ranges and {report['ids_compared']} ids "
+          f"in {report['crm_requests']} CRM requests and {report['db_queries']} queries")
+    print(f"Missing from the CRM: {len(report['missing'])}, resent: {report['resent']}, "
+          f"failed: {report['resend_failures']}")
+    if report['missing_archived']:
+        print(f"Missing from the CRM, archived: {report['missing_archived']}")
+    if report['crm_only']:
+        print(f"Only in the CRM: {report['crm_only']}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    unresolved = report['resend_failures'] + len(report['missing_archived']) + len(report['crm_only'])
+    if args.dry_run:
+        unresolved += len(report['missing'])
+    return 1 if unresolved else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,15 +1,13 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
-from google.oauth2 import id_token
-from google.auth.transport import requests
-import requests as http_requests
-from extensions import db
+from extensions import db, limiter, async_io, google_verifier
 from models.user import User
-from config import Config
+from services.google_tokens import CertificateFetchError
 
 auth_bp = Blueprint('auth', __name__)
 
 @auth_bp.route('/register', methods=['POST'])
+@limiter.limit('register')
 def register():
     try:
         data = request.get_json()
@@ -44,6 +42,7 @@ def register():
         return jsonify({'error': str(e)}), 400
 
 @auth_bp.route('/login', methods=['POST'])
+@limiter.limit('login')
 def login():
     try:
         data = request.get_json()
@@ -73,66 +72,88 @@ def login():
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+def google_user_login(idinfo):
+    """Find or create the user for verified Google token claims and issue tokens"""
+    google_id = idinfo['sub']
+    email = idinfo['email']
+    first_name = idinfo.get('given_name', '')
+    last_name = idinfo.get('family_name', '')
+    
+    # Check if user exists
+    user = User.query.filter_by(google_id=google_id).first()
+    
+    if not user:
+        # Check if email exists with different auth provider
+        existing_user = User.query.filter_by(email=email).first()
+        if existing_user:
+            return jsonify({'error': 'Email already registered with different provider'}), 409
+        
+        # Create new user
+        user = User(
+            email=email,
+            first_name=first_name,
+            last_name=last_name,
+            google_id=google_id,
+        )
+        db.session.add(user)
+        db.session.commit()
+    
+    if not user.is_active:
+        return jsonify({'error': 'Account is deactivated'}), 401
+    
+    # Create tokens
+    access_token = create_access_token(identity=user.id)
+    refresh_token = create_refresh_token(identity=user.id)
+    
+    return jsonify({
+        'message': 'Google login successful',
+        'user': user.to_dict(),
+        'access_token': access_token,
+        'refresh_token': refresh_token
+    }), 200
+
 @auth_bp.route('/google-login', methods=['POST'])
+@limiter.limit('login')
 def google_login():
     try:
         data = request.get_json()
+        if current_app.config['ASYNC_MODE']:
+            return current_app.ensure_sync(google_login_async)(data)
+        
         token = data.get('token')
         
         if not token:
             return jsonify({'error': 'Google token is required'}), 400
         
-        # Verify Google token
+        # Verify Google token (a local signature check while the cached certificates are fresh)
         try:
-            idinfo = id_token.verify_oauth2_token(
-                token, 
-                requests.Request(), 
-                Config.GOOGLE_CLIENT_ID
-            )
-            
-            if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
-                raise ValueError('Wrong issuer.')
-                
+            idinfo = google_verifier.verify(token)
+        except CertificateFetchError:
+            return jsonify({'error': 'Google sign-in is temporarily unavailable'}), 503, {'Retry-After': '30'}
         except ValueError as e:
             return jsonify({'error': 'Invalid Google token'}), 401
         
-        google_id = idinfo['sub']
-        email = idinfo['email']
-        first_name = idinfo.get('given_name', '')
-        last_name = idinfo.get('family_name', '')
-        
-        # Check if user exists
-        user = User.query.filter_by(google_id=google_id).first()
+        return google_user_login(idinfo)
         
-        if not user:
-            # Check if email exists with different auth provider
-            existing_user = User.query.filter_by(email=email).first()
-            if existing_user:
-                return jsonify({'error': 'Email already registered with different provider'}), 409
-            
-            # Create new user
-            user = User(
-                email=email,
-                first_name=first_name,
-                last_name=last_name,
-                google_id=google_id,
-            )
-            db.session.add(user)
-            db.session.commit()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+async def google_login_async(data):
+    """ASYNC_MODE path of google_login: certificate fetch on the async client, DB work on the bounded pool"""
+    try:
+        token = data.get('token')
         
-        if not user.is_active:
-            return jsonify({'error': 'Account is deactivated'}), 401
+        if not token:
+            return jsonify({'error': 'Google token is required'}), 400
         
-        # Create tokens
-        access_token = create_access_token(identity=user.id)
-        refresh_token = create_refresh_token(identity=user.id)
+        try:
+            idinfo = await google_verifier.verify_async(token)
+        except CertificateFetchError:
+            return jsonify({'error': 'Google sign-in is temporarily unavailable'}), 503, {'Retry-After': '30'}
+        except ValueError as e:
+            return jsonify({'error': 'Invalid Google token'}), 401
         
-        return jsonify({
-            'message': 'Google login successful',
-            'user': user.to_dict(),
-            'access_token': access_token,
-            'refresh_token': refresh_token
-        }), 200
+        return await async_io.run_db(google_user_login, idinfo)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 400
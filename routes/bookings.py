@@ -1,28 +1,32 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
-import requests
-from extensions import db
+from extensions import db, limiter, async_io, seat_hub
 from models.booking import Booking, BookingStatus
 from models.event import Event, EventStatus,EventType
 from models.user import User
+from models.fieldsets import Fieldset
 from config import Config
+from services.idempotency import idempotent
 
 
 bookings_bp = Blueprint('bookings', __name__)
 
-def notify_crm(booking_data):
+def crm_request_headers():
+    return {
+        'Authorization': f'Bearer {Config.CRM_BEARER_TOKEN}',
+        'Content-Type': 'application/json'
+    }
+
+def notify_crm(booking_data, path='/api/notify'):
     """Send booking notification to CRM service"""
+    import requests
+    
     try:
-        headers = {
-            'Authorization': f'Bearer {Config.CRM_BEARER_TOKEN}',
-            'Content-Type': 'application/json'
-        }
-        
         response = requests.post(
-            f'{Config.CRM_SERVICE_URL}/api/notify',
+            f'{Config.CRM_SERVICE_URL}{path}',
             json=booking_data,
-            headers=headers,
+            headers=crm_request_headers(),
             timeout=10,
             verify=False
         
@@ -33,90 +37,261 @@ def notify_crm(booking_data):
         print(f"CRM notification failed: {str(e)}")
         return False
 
-@bookings_bp.route('/', methods=['POST'])
-@jwt_required()
-def create_booking():
-    # try:
-        current_user_id = int(get_jwt_identity())
-        data = request.get_json()
-        
-        event_id = data.get('event_id')
-        notes = data.get('notes', '')
-        
-        if not event_id:
-            return jsonify({'error': 'Event ID is required'}), 400
-        
-        # Get event
-        event = Event.query.get(event_id)
-        if not event:
-            return jsonify({'error': 'Event not found'}), 400
+async def notify_crm_async(booking_data, path='/api/notify'):
+    """Send booking notification to CRM service without holding a worker thread"""
+    try:
+        response = await async_io.request(
+            'POST',
+            f'{Config.CRM_SERVICE_URL}{path}',
+            json=booking_data,
+            headers=crm_request_headers(),
+            timeout=10,
+            verify=False
+        )
         
+        return response.status_code == 200
+    except Exception as e:
+        print(f"CRM notification failed: {str(e)}")
+        return False
+
+def crm_booking_data(booking, user, event):
+    """CRM notification payload for one booking"""
+    return {
+        'booking_id': booking.id,
+        'user': {
+            'id': user.id,
+            'email': user.email,
+            'name': f"{user.first_name} {user.last_name}",
+            'phone': user.phone
+        },
+        'event': {
+            'id': event.id,
+            'title': event.title,
+            'type': EventType(event.event_type).name,
+            'start_datetime': event.start_datetime.isoformat(),
+            'location': event.location
+        },
+        'facilitator_id': event.facilitator_id,
+        'booking_date': booking.booking_date.isoformat(),
+        'notes': booking.notes
+    }
+
+def crm_cancellation_data(event, booking_ids, reason):
+    """CRM notification payload for the bookings cancelled together with their event"""
+    return {
+        'event_id': event.id,
+        'facilitator_id': event.facilitator_id,
+        'booking_ids': booking_ids,
+        'reason': reason
+    }
+
+def book_event(current_user_id, data):
+    """DB part of create_booking. Returns (error response, None) or (None, (booking dict, CRM payload))"""
+    event_id = data.get('event_id')
+    notes = data.get('notes', '')
+    
+    if not event_id:
+        return (jsonify({'error': 'Event ID is required'}), 400), None
+    
+    # Get event, locked so a concurrent booking or cancellation of it (or of the
+    # whole event) cannot overwrite the participant count computed here
+    event = Event.query.filter_by(id=event_id).with_for_update().populate_existing().first()
+    if not event:
+        db.session.rollback()
+        return (jsonify({'error': 'Event not found'}), 400), None
+    
+    if event.status != EventStatus.ACTIVE:
+        db.session.rollback()
+        return (jsonify({'error': 'Event is not available for booking'}), 400), None
+    
+    if event.is_full:
+        db.session.rollback()
+        return (jsonify({'error': 'Event is fully booked'}), 400), None
+    
+    if event.start_datetime <= datetime.utcnow():
+        db.session.rollback()
+        return (jsonify({'error': 'Cannot book past events'}), 400), None
+    
+    # Check if user already booked this event
+    existing_booking = Booking.query.filter_by(
+        user_id=current_user_id,
+        event_id=event_id
+    ).first()
+    
+    if existing_booking:
+        db.session.rollback()
+        return (jsonify({'error': 'You have already booked this event'}), 409), None
+    
+    # Create booking
+    booking = Booking(
+        user_id=current_user_id,
+        event_id=event_id,
+        notes=notes,
+        status=BookingStatus.CONFIRMED.value
+    )
+    
+    # Update event participant count
+    event.current_participants += 1
+    
+    db.session.add(booking)
+    db.session.commit()
+    seat_hub.publish(event.id, event.current_participants, event.max_participants)
+    
+    # Prepare CRM notification data
+    user = User.query.get(current_user_id)
+    crm_data = crm_booking_data(booking, user, event)
+    
+    return None, (booking.to_dict(), crm_data)
+
+def book_events(current_user_id, data):
+    """DB part of checkout_cart. Returns (error response, None) or (None, (booking dicts, CRM payloads))"""
+    items = data.get('items') or []
+    
+    if not items:
+        return (jsonify({'error': 'At least one item is required'}), 400), None
+    
+    if len(items) > Config.CART_MAX_ITEMS:
+        return (jsonify({'error': f'A cart can hold at most {Config.CART_MAX_ITEMS} events'}), 400), None
+    
+    if any(not isinstance(item, dict) or not item.get('event_id') for item in items):
+        return (jsonify({'error': 'Event ID is required for every item'}), 400), None
+    
+    try:
+        notes_by_event = {int(item['event_id']): item.get('notes', '') for item in items}
+    except (TypeError, ValueError):
+        return (jsonify({'error': 'Event IDs must be integers'}), 400), None
+    if len(notes_by_event) != len(items):
+        return (jsonify({'error': 'Each event can only be in the cart once'}), 400), None
+    
+    # Lock the events in primary key order, so two carts sharing events cannot deadlock
+    event_ids = sorted(notes_by_event)
+    events = Event.query.filter(Event.id.in_(event_ids)).order_by(Event.id).with_for_update().all()
+    
+    missing = sorted(set(event_ids) - {event.id for event in events})
+    if missing:
+        db.session.rollback()
+        return (jsonify({'error': 'Event not found', 'event_ids': missing}), 400), None
+    
+    now = datetime.utcnow()
+    unavailable = {}
+    for event in events:
         if event.status != EventStatus.ACTIVE:
-            return jsonify({'error': 'Event is not available for booking'}), 400
-        
-        if event.is_full:
-            return jsonify({'error': 'Event is fully booked'}), 400
-        
-        if event.start_datetime <= datetime.utcnow():
-            return jsonify({'error': 'Cannot book past events'}), 400
-        
-        # Check if user already booked this event
-        existing_booking = Booking.query.filter_by(
-            user_id=current_user_id,
-            event_id=event_id
-        ).first()
-        
-        if existing_booking:
-            return jsonify({'error': 'You have already booked this event'}), 409
-        
-        # Create booking
-        booking = Booking(
+            unavailable[event.id] = 'Event is not available for booking'
+        elif event.is_full:
+            unavailable[event.id] = 'Event is fully booked'
+        elif event.start_datetime <= now:
+            unavailable[event.id] = 'Cannot book past events'
+    if unavailable:
+        db.session.rollback()
+        return (jsonify({'error': 'Some events cannot be booked', 'events': unavailable}), 400), None
+    
+    # Check for existing bookings of any cart event in one query
+    already_booked = db.session.execute(
+        db.select(Booking.event_id).where(Booking.user_id == current_user_id, Booking.event_id.in_(event_ids))
+    ).scalars().all()
+    if already_booked:
+        db.session.rollback()
+        return (jsonify({'error': 'You have already booked some of these events',
+                         'event_ids': sorted(already_booked)}), 409), None
+    
+    bookings = []
+    for event in events:
+        bookings.append(Booking(
             user_id=current_user_id,
-            event_id=event_id,
-            notes=notes,
+            event_id=event.id,
+            notes=notes_by_event[event.id],
             status=BookingStatus.CONFIRMED.value
-        )
-        
-        # Update event participant count
+        ))
         event.current_participants += 1
-        
-        db.session.add(booking)
-        db.session.commit()
-        
-        # Prepare CRM notification data
-        user = User.query.get(current_user_id)
-        crm_data = {
-            'booking_id': booking.id,
-            'user': {
-                'id': user.id,
-                'email': user.email,
-                'name': f"{user.first_name} {user.last_name}",
-                'phone': user.phone
-            },
-            'event': {
-                'id': event.id,
-                'title': event.title,
-                'type': EventType(event.event_type).name,
-                'start_datetime': event.start_datetime.isoformat(),
-                'location': event.location
-            },
-            'facilitator_id': event.facilitator_id,
-            'booking_date': booking.booking_date.isoformat(),
-            'notes': notes
-        }
-        
-        # Send CRM notification (non-blocking)
-        crm_notified = notify_crm(crm_data)
-        
-        return jsonify({
-            'message': 'Booking created successfully',
-            'booking': booking.to_dict(),
-            'crm_notified': crm_notified
-        }), 201
-        
-    # except Exception as e:
-    #     db.session.rollback()
-    #     return jsonify({'error': str(e)}), 400
+    
+    db.session.add_all(bookings)
+    db.session.commit()
+    for event in events:
+        seat_hub.publish(event.id, event.current_participants, event.max_participants)
+    
+    user = User.query.get(current_user_id)
+    events_by_id = {event.id: event for event in events}
+    crm_data = [crm_booking_data(booking, user, events_by_id[booking.event_id]) for booking in bookings]
+    
+    return None, ([booking.to_dict() for booking in bookings], crm_data)
+
+@bookings_bp.route('/', methods=['POST'])
+@jwt_required()
+@limiter.limit('booking', by='user')
+@idempotent
+def create_booking():
+    current_user_id = int(get_jwt_identity())
+    data = request.get_json()
+    if current_app.config['ASYNC_MODE']:
+        return current_app.ensure_sync(create_booking_async)(current_user_id, data)
+    
+    error, result = book_event(current_user_id, data)
+    if error:
+        return error
+    booking, crm_data = result
+    
+    # Send CRM notification
+    crm_notified = notify_crm(crm_data)
+    
+    return jsonify({
+        'message': 'Booking created successfully',
+        'booking': booking,
+        'crm_notified': crm_notified
+    }), 201
+
+async def create_booking_async(current_user_id, data):
+    """ASYNC_MODE path of create_booking: DB work on the bounded pool, CRM call on the async client"""
+    error, result = await async_io.run_db(book_event, current_user_id, data)
+    if error:
+        return error
+    booking, crm_data = result
+    
+    crm_notified = await notify_crm_async(crm_data)
+    
+    return jsonify({
+        'message': 'Booking created successfully',
+        'booking': booking,
+        'crm_notified': crm_notified
+    }), 201
+
+@bookings_bp.route('/cart', methods=['POST'])
+@jwt_required()
+@limiter.limit('booking', by='user')
+@idempotent
+def checkout_cart():
+    current_user_id = int(get_jwt_identity())
+    data = request.get_json()
+    if current_app.config['ASYNC_MODE']:
+        return current_app.ensure_sync(checkout_cart_async)(current_user_id, data)
+    
+    error, result = book_events(current_user_id, data)
+    if error:
+        return error
+    bookings, crm_data = result
+    
+    # One CRM notification for the whole cart
+    crm_notified = notify_crm({'bookings': crm_data}, path='/api/notify/batch')
+    
+    return jsonify({
+        'message': f'{len(bookings)} bookings created successfully',
+        'bookings': bookings,
+        'crm_notified': crm_notified
+    }), 201
+
+async def checkout_cart_async(current_user_id, data):
+    """ASYNC_MODE path of checkout_cart"""
+    error, result = await async_io.run_db(book_events, current_user_id, data)
+    if error:
+        return error
+    bookings, crm_data = result
+    
+    crm_notified = await notify_crm_async({'bookings': crm_data}, path='/api/notify/batch')
+    
+    return jsonify({
+        'message': f'{len(bookings)} bookings created successfully',
+        'bookings': bookings,
+        'crm_notified': crm_notified
+    }), 201
 
 @bookings_bp.route('/', methods=['GET'])
 @jwt_required()
@@ -129,6 +304,10 @@ def get_user_bookings():
         per_page = request.args.get('per_page', 10, type=int)
         status = request.args.get('status')
         upcoming_only = request.args.get('upcoming', 'false').lower() == 'true'
+        try:
+            fieldset = Fieldset.from_args(Booking, request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Build query
         query = Booking.query.filter(Booking.user_id == current_user_id)
@@ -143,8 +322,8 @@ def get_user_bookings():
         if upcoming_only:
             query = query.join(Event).filter(Event.start_datetime > datetime.utcnow())
         
-        # Order by booking date (newest first)
-        query = query.order_by(Booking.created_at.desc())
+        # Order by booking date (newest first), loading only the requested fields and relationships
+        query = query.order_by(Booking.created_at.desc()).options(*fieldset.options())
         
         # Paginate
         bookings = query.paginate(
@@ -154,7 +333,7 @@ def get_user_bookings():
         )
         
         return jsonify({
-            'bookings': [booking.to_dict() for booking in bookings.items],
+            'bookings': [booking.to_dict(fieldset) for booking in bookings.items],
             'pagination': {
                 'page': bookings.page,
                 'pages': bookings.pages,
@@ -173,17 +352,18 @@ def get_user_bookings():
 def get_booking(booking_id):
     try:
         current_user_id = int(get_jwt_identity())
+        fieldset = Fieldset.from_args(Booking, request.args)
         
         booking = Booking.query.filter_by(
             id=booking_id,
             user_id=current_user_id
-        ).first()
+        ).options(*fieldset.options()).first()
         
         if not booking:
             return jsonify({'error': 'Booking not found'}), 400
         
         return jsonify({
-            'booking': booking.to_dict()
+            'booking': booking.to_dict(fieldset)
         }), 200
         
     except Exception as e:
@@ -203,19 +383,27 @@ def cancel_booking(booking_id):
         if not booking:
             return jsonify({'error': 'Booking not found'}), 400
         
+        # Lock the event as book_event and event cancellation do, then read the booking
+        # again: the event may have been cancelled with all its bookings meanwhile
+        event = Event.query.filter_by(id=booking.event_id).with_for_update().populate_existing().first()
+        db.session.refresh(booking)
+        
         if booking.status == BookingStatus.CANCELLED:
+            db.session.rollback()
             return jsonify({'error': 'Booking is already cancelled'}), 400
         
-        if booking.event.start_datetime <= datetime.utcnow():
+        if event.start_datetime <= datetime.utcnow():
+            db.session.rollback()
             return jsonify({'error': 'Cannot cancel past events'}), 400
         
         # Update booking status
         booking.status = BookingStatus.CANCELLED
         
         # Update event participant count
-        booking.event.current_participants -= 1
+        event.current_participants -= 1
         
         db.session.commit()
+        seat_hub.publish(event.id, event.current_participants, event.max_participants)
         
         return jsonify({
             'message': 'Booking cancelled successfully',
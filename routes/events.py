@@ -1,13 +1,44 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from sqlalchemy import and_, or_
-from datetime import datetime
-from extensions import db
+from sqlalchemy import and_, or_, update
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+from extensions import db, async_io, seat_hub
+from models.booking import Booking, BookingStatus
 from models.event import Event, EventType, EventStatus
 from models.facilitator import Facilitator
+from models.fieldsets import Fieldset
+from routes.bookings import crm_cancellation_data, notify_crm, notify_crm_async
 
 events_bp = Blueprint('events', __name__)
 
+def parse_datetime_arg(name):
+    """Parse an ISO date/datetime query parameter, raising ValueError with the parameter name"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Invalid {name}')
+    # Event times are stored as naive UTC
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def parse_price_arg(name):
+    """Parse a decimal price query parameter, raising ValueError with the parameter name"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f'Invalid {name}')
+    if not price.is_finite():
+        raise ValueError(f'Invalid {name}')
+    return price
+
 @events_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_events():
@@ -19,20 +50,48 @@ def get_events():
         facilitator_id = request.args.get('facilitator_id', type=int)
         status = request.args.get('status', 'active')
         search = request.args.get('search')
+        min_spots = request.args.get('min_spots', type=int)
+        available_only = request.args.get('available', 'false').lower() == 'true'
+        
+        try:
+            start_date = parse_datetime_arg('start_date')
+            end_date = parse_datetime_arg('end_date')
+            min_price = parse_price_arg('min_price')
+            max_price = parse_price_arg('max_price')
+            fieldset = Fieldset.from_args(Event, request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Build query
+        # Build query. Equality filters plus the start_datetime range map onto
+        # idx_event_status_type_start / idx_event_facilitator_status_start.
         query = Event.query.filter(Event.status == EventStatus.ACTIVE)
         
         if event_type:
             try:
-                event_type_enum = EventType(event_type)
+                event_type_enum = EventType[event_type.upper()]
                 query = query.filter(Event.event_type == event_type_enum)
-            except ValueError:
+            except KeyError:
                 return jsonify({'error': 'Invalid event type'}), 400
         
         if facilitator_id:
             query = query.filter(Event.facilitator_id == facilitator_id)
         
+        # Filter future events only, narrowed to the requested date window
+        now = datetime.utcnow()
+        query = query.filter(Event.start_datetime > max(start_date or now, now))
+        if end_date:
+            query = query.filter(Event.start_datetime <= end_date)
+        
+        if available_only:
+            min_spots = max(min_spots or 0, 1)
+        if min_spots:
+            query = query.filter(Event.seats_available >= min_spots)
+        
+        if min_price is not None:
+            query = query.filter(Event.price >= min_price)
+        if max_price is not None:
+            query = query.filter(Event.price <= max_price)
+        
         if search:
             query = query.filter(
                 or_(
@@ -41,11 +100,8 @@ def get_events():
                 )
             )
         
-        # Filter future events only
-        query = query.filter(Event.start_datetime > datetime.utcnow())
-        
-        # Order by start date
-        query = query.order_by(Event.start_datetime.asc())
+        # Order by start date, reading the requested columns as plain rows
+        query = fieldset.listing(query.order_by(Event.start_datetime.asc()))
         
         # Paginate
         events = query.paginate(
@@ -55,7 +111,7 @@ def get_events():
         )
         
         return jsonify({
-            'events': [event.to_dict() for event in events.items],
+            'events': [fieldset.dump(event) for event in events.items],
             'pagination': {
                 'page': events.page,
                 'pages': events.pages,
@@ -73,18 +129,126 @@ def get_events():
 @jwt_required()
 def get_event(event_id):
     try:
-        event = Event.query.get(event_id)
+        fieldset = Fieldset.from_args(Event, request.args)
+        event = Event.query.options(*fieldset.options()).get(event_id)
         
         if not event:
             return jsonify({'error': 'Event not found'}), 400
         
         return jsonify({
-            'event': event.to_dict()
+            'event': event.to_dict(fieldset)
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+@events_bp.route('/<int:event_id>/seats/stream', methods=['GET'])
+@jwt_required()
+def stream_event_seats(event_id):
+    """Server-Sent Events of the event's seat availability, instead of polling GET /api/events/<id>"""
+    try:
+        seats = db.session.execute(
+            db.select(Event.current_participants, Event.max_participants).where(Event.id == event_id)
+        ).first()
+        
+        if not seats:
+            return jsonify({'error': 'Event not found'}), 400
+        
+        channel = seat_hub.join(event_id, *seats)
+        if channel is None:
+            return jsonify({'error': 'Too many open seat streams, poll instead'}), 503, {'Retry-After': '30'}
+        
+        return Response(seat_hub.stream(event_id, channel), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+def close_event(current_user_id, event_id, reason):
+    """DB part of cancel_event. Returns (error response, None) or (None, (event dict, cancelled count, CRM payload))"""
+    # Lock the event; book_event and cancel_booking lock it too, so they wait for this one and see it cancelled
+    event = Event.query.filter_by(id=event_id).with_for_update().first()
+    if not event:
+        db.session.rollback()
+        return (jsonify({'error': 'Event not found'}), 400), None
+    
+    is_facilitator = db.session.query(
+        Facilitator.query.filter_by(id=event.facilitator_id, user=current_user_id).exists()
+    ).scalar()
+    if not is_facilitator:
+        db.session.rollback()
+        return (jsonify({'error': 'Only the facilitator of the event can cancel it'}), 403), None
+    
+    if event.status != EventStatus.ACTIVE:
+        db.session.rollback()
+        return (jsonify({'error': 'Only active events can be cancelled'}), 400), None
+    
+    now = datetime.utcnow()
+    if event.start_datetime <= now:
+        db.session.rollback()
+        return (jsonify({'error': 'Cannot cancel past events'}), 400), None
+    
+    # All open bookings in one statement instead of one cancel_booking per attendee. Their ids are
+    # read first (and locked) for the CRM, since MySQL's UPDATE cannot return them
+    open_bookings = and_(Booking.event_id == event.id,
+                         Booking.status.in_((BookingStatus.PENDING, BookingStatus.CONFIRMED)))
+    booking_ids = db.session.execute(
+        db.select(Booking.id).where(open_bookings).order_by(Booking.id).with_for_update()
+    ).scalars().all()
+    if booking_ids:
+        db.session.execute(
+            update(Booking).where(open_bookings).values(status=BookingStatus.CANCELLED, updated_at=now),
+            execution_options={'synchronize_session': False}
+        )
+    
+    event.status = EventStatus.CANCELLED
+    event.current_participants = 0
+    db.session.commit()
+    seat_hub.publish(event.id, event.current_participants, event.max_participants)
+    
+    crm_data = crm_cancellation_data(event, booking_ids, reason) if booking_ids else None
+    return None, (event.to_dict(), len(booking_ids), crm_data)
+
+@events_bp.route('/<int:event_id>/cancel', methods=['PUT'])
+@jwt_required()
+def cancel_event(event_id):
+    """Cancel an event and all its bookings, for the event's facilitator"""
+    current_user_id = int(get_jwt_identity())
+    reason = (request.get_json(silent=True) or {}).get('reason', '')
+    if current_app.config['ASYNC_MODE']:
+        return current_app.ensure_sync(cancel_event_async)(current_user_id, event_id, reason)
+    
+    error, result = close_event(current_user_id, event_id, reason)
+    if error:
+        return error
+    event, cancelled, crm_data = result
+    
+    # One CRM notification for all the cancelled bookings
+    crm_notified = notify_crm(crm_data, path='/api/notify/cancellations') if crm_data else None
+    
+    return jsonify({
+        'message': 'Event cancelled successfully',
+        'event': event,
+        'cancelled_bookings': cancelled,
+        'crm_notified': crm_notified
+    }), 200
+
+async def cancel_event_async(current_user_id, event_id, reason):
+    """ASYNC_MODE path of cancel_event"""
+    error, result = await async_io.run_db(close_event, current_user_id, event_id, reason)
+    if error:
+        return error
+    event, cancelled, crm_data = result
+    
+    crm_notified = await notify_crm_async(crm_data, path='/api/notify/cancellations') if crm_data else None
+    
+    return jsonify({
+        'message': 'Event cancelled successfully',
+        'event': event,
+        'cancelled_bookings': cancelled,
+        'crm_notified': crm_notified
+    }), 200
+
 @events_bp.route('/types', methods=['GET'])
 @jwt_required()
 def get_event_types():
@@ -2,15 +2,17 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
 
-from extensions import db
+from extensions import db, limiter
 from models.facilitator import Facilitator
 from models.event import Event
 from models.booking import Booking
 from models.user import User
+from models.fieldsets import Fieldset
 
 facilitators_bp = Blueprint('facilitators', __name__)
 
 @facilitators_bp.route('/login', methods=['POST'])
+@limiter.limit('login')
 def login():
     try:
         data = request.get_json()
@@ -46,17 +48,19 @@ def get_facilitators():
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
+        fieldset = Fieldset.from_args(Facilitator, request.args)
         
-        facilitators = Facilitator.query.filter(
-            Facilitator.is_active == True
-        ).paginate(
+        # Active is a flag of the facilitator's user
+        facilitators = Facilitator.query.join(Facilitator.users).filter(
+            User.is_active == True
+        ).order_by(Facilitator.id).options(*fieldset.options()).paginate(
             page=page,
             per_page=per_page,
             error_out=False
         )
         
         return jsonify({
-            'facilitators': [facilitator.to_dict() for facilitator in facilitators.items],
+            'facilitators': [facilitator.to_dict(fieldset) for facilitator in facilitators.items],
             'pagination': {
                 'page': facilitators.page,
                 'pages': facilitators.pages,
@@ -74,13 +78,14 @@ def get_facilitators():
 @jwt_required()
 def get_facilitator(facilitator_id):
     try:
-        facilitator = Facilitator.query.get(facilitator_id)
+        fieldset = Fieldset.from_args(Facilitator, request.args)
+        facilitator = Facilitator.query.options(*fieldset.options()).get(facilitator_id)
         
         if not facilitator:
             return jsonify({'error': 'Facilitator not found'}), 404
         
         return jsonify({
-            'facilitator': facilitator.to_dict()
+            'facilitator': facilitator.to_dict(fieldset)
         }), 200
         
     except Exception as e:
@@ -90,15 +95,14 @@ def get_facilitator(facilitator_id):
 @jwt_required()
 def get_facilitator_events(facilitator_id):
     try:
-        facilitator = Facilitator.query.get(facilitator_id)
-        
-        if not facilitator:
+        fieldset = Fieldset.from_args(Event, request.args)
+        if not db.session.query(Facilitator.query.filter_by(id=facilitator_id).exists()).scalar():
             return jsonify({'error': 'Facilitator not found'}), 404
         
-        events = Event.query.filter_by(facilitator_id=facilitator_id).all()
+        events = fieldset.listing(Event.query.filter_by(facilitator_id=facilitator_id)).all()
         
         return jsonify({
-            'events': [event.to_dict() for event in events]
+            'events': [fieldset.dump(event) for event in events]
         }), 200
         
     except Exception as e:
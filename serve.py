@@ -0,0 +1,248 @@
+"""Production WSGI entry point for the booking API and the CRM service.
+
+Usage:
+    python serve.py api [--worker-class threaded] [--workers 4] [--threads 8]
+    python serve.py crm [--threads 8]
+
+Send SIGHUP to the master process for a graceful reload (new workers are
+started before old ones finish their in-flight requests). With preloading
+enabled the application code itself is loaded once in the master, so a code
+deploy needs a full restart (SIGTERM + start) instead. The CRM service is
+never preloaded nor recycled, since its worker holds the store; restart it
+rather than reloading it.
+"""
+import argparse
+import copy
+import math
+import multiprocessing
+import os
+import sys
+
+from gunicorn.app.base import BaseApplication
+
+from config import config
+
+# Friendly names -> gunicorn worker classes
+WORKER_CLASSES = {
+    'sync': 'sync',
+    'threaded': 'gthread',
+    'gevent': 'gevent',
+}
+
+
+def default_workers(worker_class):
+    """Default worker process count for a worker model"""
+    cpus = multiprocessing.cpu_count()
+    if worker_class == 'sync':
+        return cpus * 2 + 1
+    return cpus
+
+
+def worker_concurrency(worker_class, threads, worker_connections):
+    """Maximum number of requests a single worker handles at once"""
+    if worker_class == 'threaded':
+        return threads
+    if worker_class == 'gevent':
+        return worker_connections
+    return 1
+
+
+def worker_engine_options(engine_options, workers, concurrency):
+    """Split a host-wide connection pool budget across worker processes.
+
+    ``pool_size + max_overflow`` from the config is treated as the total number
+    of connections this host may open. Every worker gets an equal share,
+    capped at the number of requests it can actually run concurrently, so a
+    sync worker never holds more than one connection.
+    """
+    options = copy.deepcopy(engine_options)
+    if 'pool_size' not in options:
+        return options
+
+    pool_size = options['pool_size']
+    budget = pool_size + options.get('max_overflow', 0)
+    per_worker = max(1, min(budget // workers, concurrency))
+    worker_pool_size = max(1, min(per_worker, math.ceil(pool_size / workers)))
+
+    options['pool_size'] = worker_pool_size
+    options['max_overflow'] = per_worker - worker_pool_size
+    return options
+
+
+class WSGIServer(BaseApplication):
+    """Embedded gunicorn application around a Flask app factory"""
+
+    def __init__(self, app_factory, options, on_fork=None, on_exit=None):
+        self.app_factory = app_factory
+        self.options = options
+        self.on_fork = on_fork
+        self.on_exit = on_exit
+        self.application = None
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+        if self.on_fork:
+            self.cfg.set('post_fork', self._post_fork)
+        if self.on_exit:
+            self.cfg.set('worker_exit', self._worker_exit)
+
+    def load(self):
+        if self.application is None:
+            self.application = self.app_factory()
+        return self.application
+
+    def _post_fork(self, server, worker):
+        # Only meaningful when the app was preloaded in the master
+        if self.application is not None:
+            self.on_fork(self.application)
+
+    def _worker_exit(self, server, worker):
+        if self.application is not None:
+            self.on_exit(self.application)
+
+
+def seat_stream_limit(settings, worker_class, concurrency):
+    """Open seat streams per worker. A stream holds a thread until its client goes away, so outside gevent
+    only half of the worker's threads may stream and the rest keep serving requests"""
+    if worker_class == 'gevent':
+        return settings.SEAT_PUSH_MAX_WATCHERS
+    return min(settings.SEAT_PUSH_MAX_WATCHERS, concurrency // 2)
+
+
+def dispose_engines(app):
+    """Drop pooled connections inherited from the master after fork"""
+    from extensions import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def after_fork(app):
+    """Set up a worker forked from a preloading master"""
+    from extensions import lifecycle
+
+    dispose_engines(app)
+    # Not started in the master: its thread would not survive the fork
+    if lifecycle.enabled:
+        lifecycle.start()
+
+
+def build_options(settings, bind, worker_class, workers, threads, preload):
+    """Translate config values and CLI flags into gunicorn settings"""
+    return {
+        'bind': bind,
+        'worker_class': WORKER_CLASSES[worker_class],
+        'workers': workers,
+        'threads': threads if worker_class == 'threaded' else 1,
+        'worker_connections': settings.WSGI_WORKER_CONNECTIONS,
+        'preload_app': preload,
+        'timeout': settings.WSGI_TIMEOUT,
+        'graceful_timeout': settings.WSGI_GRACEFUL_TIMEOUT,
+        'keepalive': settings.WSGI_KEEPALIVE,
+        'max_requests': settings.WSGI_MAX_REQUESTS,
+        'max_requests_jitter': settings.WSGI_MAX_REQUESTS_JITTER,
+        'accesslog': '-',
+        'errorlog': '-',
+    }
+
+
+def serve_api(settings, config_name, args):
+    worker_class = args.worker_class or settings.WSGI_WORKER_CLASS
+    workers = args.workers or settings.WSGI_WORKERS or default_workers(worker_class)
+    threads = args.threads or settings.WSGI_THREADS
+    preload = settings.WSGI_PRELOAD if args.preload is None else args.preload
+
+    concurrency = worker_concurrency(worker_class, threads, settings.WSGI_WORKER_CONNECTIONS)
+    engine_options = worker_engine_options(settings.SQLALCHEMY_ENGINE_OPTIONS, workers, concurrency)
+    seat_streams = seat_stream_limit(settings, worker_class, concurrency)
+
+    def app_factory():
+        from app import create_app
+        return create_app(config_name, {'SQLALCHEMY_ENGINE_OPTIONS': engine_options,
+                                        'SEAT_PUSH_MAX_WATCHERS': seat_streams,
+                                        'LIFECYCLE_AUTOSTART': not preload})
+
+    options = build_options(settings, args.bind or settings.WSGI_BIND, worker_class, workers, threads, preload)
+
+    print(f"🚀 Serving API on {options['bind']}: {workers} x {worker_class} worker(s)"
+          f" (concurrency {concurrency}, preload={preload})")
+    if 'pool_size' in engine_options:
+        print(f"🔌 DB pool per worker: pool_size={engine_options['pool_size']}"
+              f" max_overflow={engine_options['max_overflow']}")
+    if workers > 1 and settings.IDEMPOTENCY_STORAGE_URL.startswith('memory://'):
+        print("⚠️ IDEMPOTENCY_STORAGE_URL is per process: a retry reaching another worker books again")
+    if workers > 1 and settings.SQLALCHEMY_REPLICA_URIS and settings.REPLICA_STICKY_STORAGE_URL.startswith('memory://'):
+        print("⚠️ REPLICA_STICKY_STORAGE_URL is per process: reads on another worker may miss a user's own writes")
+    print(f"📡 Seat streams per worker: {seat_streams}"
+          + ("" if worker_class == 'gevent' else " (each holds a thread; serve with gevent for more)"))
+
+    WSGIServer(app_factory, options, on_fork=after_fork).run()
+
+
+def save_crm_store(app):
+    """Write what the CRM worker has not saved yet before it exits"""
+    import crm_service
+    crm_service.save_unsaved_changes()
+
+
+def serve_crm(settings, args):
+    worker_class = args.worker_class or settings.WSGI_WORKER_CLASS
+    threads = args.threads or settings.WSGI_THREADS
+
+    if args.workers and args.workers != 1:
+        # bookings_storage lives in process memory, so it cannot be split across workers
+        print("⚠️ CRM service keeps its store in memory; forcing a single worker")
+    if args.preload:
+        print("⚠️ CRM service loads its store in the worker; ignoring --preload")
+
+    def app_factory():
+        import crm_service
+        crm_service.load_data_from_file()
+        return crm_service.app
+
+    # The store lives in the worker: loaded in the master, a replacement worker would fork the data as it was at
+    # startup. It is loaded in the worker instead, and the worker is never recycled after max_requests
+    options = build_options(settings, args.bind or settings.CRM_WSGI_BIND, worker_class, 1, threads, False)
+    options.update(max_requests=0, max_requests_jitter=0)
+
+    print(f"🚀 Serving CRM on {options['bind']}: 1 x {worker_class} worker (preload=False, max_requests=0)")
+    print("ℹ️ The worker holds the CRM store: restart the service instead of sending SIGHUP")
+    WSGIServer(app_factory, options, on_exit=save_crm_store).run()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Run the booking API or the CRM service under gunicorn')
+    parser.add_argument('service', choices=['api', 'crm'])
+    parser.add_argument('--bind')
+    parser.add_argument('--worker-class', choices=sorted(WORKER_CLASSES))
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--threads', type=int)
+    parser.add_argument('--preload', dest='preload', action='store_true', default=None)
+    parser.add_argument('--no-preload', dest='preload', action='store_false')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config_name = os.environ.get('FLASK_ENV', 'production')
+    settings = config[config_name]
+
+    if (args.worker_class or settings.WSGI_WORKER_CLASS) == 'gevent':
+        try:
+            import gevent  # noqa: F401
+        except ImportError:
+            print("❌ gevent worker requested but gevent is not installed")
+            sys.exit(1)
+
+    if args.service == 'api':
+        serve_api(settings, config_name, args)
+    else:
+        serve_crm(settings, args)
+
+
+if __name__ == '__main__':
+    main()
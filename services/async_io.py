@@ -0,0 +1,176 @@
+from flask import copy_current_request_context, current_app, g, has_request_context
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+import asyncio
+import contextvars
+import os
+import threading
+
+
+def _gevent_hub():
+    """The calling thread's gevent hub when gevent has patched threading, else None"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return None
+    if not monkey.is_module_patched('threading'):
+        return None
+    import gevent
+    return gevent.get_hub()
+
+
+def _new_event_loop():
+    """An event loop on the real OS selector, not gevent's cooperative replacement"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return asyncio.new_event_loop()
+    return asyncio.SelectorEventLoop(monkey.get_original('selectors', 'DefaultSelector')())
+
+
+def _start_os_thread(target):
+    """Start a real OS thread, even when gevent has monkey-patched threading into greenlets"""
+    try:
+        from gevent import monkey
+        start_new_thread = monkey.get_original('_thread', 'start_new_thread')
+    except ImportError:
+        import _thread
+        start_new_thread = _thread.start_new_thread
+    start_new_thread(target, ())
+
+
+class AsyncIO:
+    """Runs the async views of ASYNC_MODE on one event loop per process.
+
+    Flask normally runs every async view in a fresh event loop on the calling
+    thread. That cannot work under the gevent worker, where all requests share
+    one OS thread and asyncio only allows one running loop per thread, and it
+    would also rule out sharing an HTTP client. Instead the coroutines of all
+    requests run on a single loop in a background OS thread: outbound HTTP is
+    multiplexed on one httpx.AsyncClient and blocking DB work goes to a thread
+    pool sized like the DB connection pool. The request's worker only waits for
+    the result.
+
+    Under gevent the DB "threads" are a pool of greenlets on the worker's hub,
+    and work and results cross between the hub and the loop thread only through
+    thread-safe callbacks, since gevent primitives must not be used from another
+    OS thread. For the same reason async views must not read the request body
+    themselves; the sync view reads it and passes it in.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASYNC_MODE', False)
+        engine_options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+        default_pool = engine_options.get('pool_size', 5) + engine_options.get('max_overflow', 10)
+        self.db_pool_size = app.config.get('DB_THREAD_POOL_SIZE') or default_pool
+        self.max_connections = app.config.get('ASYNC_HTTP_MAX_CONNECTIONS', 100)
+        if app.config['ASYNC_MODE']:
+            # Documented Flask hook for changing how async views are run
+            app.async_to_sync = self.async_to_sync
+        app.extensions['async_io'] = self
+
+    def _start(self):
+        """Start the loop, HTTP client and DB pool on first use, and again after a fork"""
+        if self._pid == os.getpid():
+            return self.loop
+        with self._lock:
+            if self._pid == os.getpid():
+                return self.loop
+            import httpx
+
+            loop = _new_event_loop()
+            limits = httpx.Limits(max_connections=self.max_connections)
+            self.client = httpx.AsyncClient(limits=limits)
+            self.insecure_client = httpx.AsyncClient(limits=limits, verify=False)
+            self.hub = _gevent_hub()
+            if self.hub is not None:
+                from gevent.pool import Pool
+                self.db_pool = Pool(self.db_pool_size)
+            else:
+                self.db_pool = ThreadPoolExecutor(max_workers=self.db_pool_size, thread_name_prefix='db')
+            _start_os_thread(loop.run_forever)
+            self.loop = loop
+            self._pid = os.getpid()
+            return loop
+
+    def run(self, coro):
+        """Run a coroutine on the shared loop and block (or yield, under gevent) until it finishes"""
+        loop = self._start()
+        # Scheduled from inside a copy of our context, so the task sees this request's context
+        future = contextvars.copy_context().run(asyncio.run_coroutine_threadsafe, coro, loop)
+        if self.hub is None:
+            return future.result()
+
+        from gevent.event import AsyncResult
+        result = AsyncResult()
+        future.add_done_callback(
+            lambda done: self.hub.loop.run_callback_threadsafe(self._set_result, result, done))
+        return result.get()
+
+    @staticmethod
+    def _set_result(result, future):
+        if future.exception() is not None:
+            result.set_exception(future.exception())
+        else:
+            result.set(future.result())
+
+    def async_to_sync(self, func):
+        """Replacement for Flask.async_to_sync that uses the shared loop"""
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.run(func(*args, **kwargs))
+        return wrapper
+
+    async def request(self, method, url, verify=True, **kwargs):
+        """Send an HTTP request on the shared async client and return the httpx.Response"""
+        self._start()
+        client = self.client if verify else self.insecure_client
+        return await client.request(method, url, **kwargs)
+
+    async def run_db(self, func, *args, **kwargs):
+        """Run blocking DB work on the bounded pool, inside a copy of the current request context"""
+        self._start()
+        if has_request_context():
+            caller_g = g._get_current_object()
+            inner = func
+
+            def func(*args, **kwargs):
+                try:
+                    return inner(*args, **kwargs)
+                finally:
+                    # The pool thread gets its own app context; report writes back for replica stickiness
+                    if g.get('_db_wrote'):
+                        caller_g._db_wrote = True
+
+            func = copy_current_request_context(func)
+        else:
+            app = current_app._get_current_object()
+            inner = func
+
+            def func(*args, **kwargs):
+                with app.app_context():
+                    return inner(*args, **kwargs)
+
+        loop = asyncio.get_running_loop()
+        call = lambda: func(*args, **kwargs)
+        if self.hub is None:
+            return await loop.run_in_executor(self.db_pool, call)
+
+        import gevent
+        future = loop.create_future()
+
+        def finished(greenlet):
+            if greenlet.successful():
+                loop.call_soon_threadsafe(future.set_result, greenlet.value)
+            else:
+                loop.call_soon_threadsafe(future.set_exception, greenlet.exception)
+
+        self.hub.loop.run_callback_threadsafe(
+            lambda: gevent.spawn(self.db_pool.apply, call).link(finished))
+        return await future
@@ -0,0 +1,181 @@
+from flask import request
+import threading
+import time
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip is offered without it
+    brotli = None
+
+
+class _Compressor:
+    """Incremental gzip or brotli compressor: process() data, flush() a sync point, finish() the stream"""
+
+    def __init__(self, encoding, level):
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=level)
+            self.process, self.flush, self.finish = compressor.process, compressor.flush, compressor.finish
+        else:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 16 + 15: gzip container
+            self.process = compressor.compress
+            self.flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+            self.finish = compressor.flush
+
+
+class ResponseCompressor:
+    """Negotiated gzip/brotli compression of responses, as an after_request hook.
+
+    Compressible responses of at least COMPRESSION_MIN_SIZE bytes are
+    compressed with the encoding the client accepts with the highest quality
+    (brotli first on ties, when installed). Streamed responses are
+    compressed chunk by chunk, each chunk flushed so the client can decode
+    it as soon as it arrives. Compressed responses get a weak ETag: the
+    bytes differ from the uncompressed representation, the content does not.
+    Bytes in and out and the CPU time spent are counted per encoding.
+    Views serving cached bodies use compress_cached() so each body is
+    compressed once per encoding rather than on every hit.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.min_size = 1024
+        self.gzip_level = 5
+        self.brotli_quality = 4
+        self.mimetypes = {'application/json', 'text/html', 'text/plain', 'text/css', 'text/csv',
+                          'text/event-stream', 'application/javascript', 'image/svg+xml'}
+        self.encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+        self._lock = threading.Lock()
+        self._stats = {encoding: {'responses': 0, 'reused': 0, 'bytes_in': 0, 'bytes_out': 0, 'cpu_seconds': 0.0}
+                       for encoding in self.encodings}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('COMPRESSION_ENABLED', self.enabled)
+        self.min_size = app.config.get('COMPRESSION_MIN_SIZE', self.min_size)
+        self.gzip_level = app.config.get('COMPRESSION_GZIP_LEVEL', self.gzip_level)
+        self.brotli_quality = app.config.get('COMPRESSION_BROTLI_QUALITY', self.brotli_quality)
+        app.extensions['compression'] = self
+        app.after_request(self.compress)
+
+    def negotiate(self, accept_encodings):
+        """The encoding to use for an Accept-Encoding header, or None"""
+        best, best_quality = None, 0
+        for encoding in self.encodings:
+            quality = accept_encodings.quality(encoding)
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def _level(self, encoding):
+        return self.brotli_quality if encoding == 'br' else self.gzip_level
+
+    def _record(self, encoding, bytes_in, bytes_out, cpu_seconds, responses=0, reused=0):
+        with self._lock:
+            stats = self._stats[encoding]
+            stats['responses'] += responses
+            stats['reused'] += reused
+            stats['bytes_in'] += bytes_in
+            stats['bytes_out'] += bytes_out
+            stats['cpu_seconds'] += cpu_seconds
+
+    def _stream(self, encoding, chunks):
+        compressor = _Compressor(encoding, self._level(encoding))
+        self._record(encoding, 0, 0, 0.0, responses=1)
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                started = time.thread_time()
+                data = compressor.process(chunk) + compressor.flush()
+                self._record(encoding, len(chunk), len(data), time.thread_time() - started)
+                if data:
+                    yield data
+            started = time.thread_time()
+            data = compressor.finish()
+            self._record(encoding, 0, len(data), time.thread_time() - started)
+            yield data
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    def _encode(self, encoding, data):
+        started = time.thread_time()
+        compressor = _Compressor(encoding, self._level(encoding))
+        body = compressor.process(data) + compressor.finish()
+        self._record(encoding, len(data), len(body), time.thread_time() - started, responses=1)
+        return body
+
+    def _negotiated(self, response):
+        """The encoding to compress a response with, or None. Weakens the ETag of a 304 it would have compressed"""
+        if not self.enabled or request.method == 'HEAD' or response.mimetype not in self.mimetypes:
+            return None
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate(request.accept_encodings)
+        if encoding is None:
+            return None
+        if response.status_code == 304:
+            # Same validator as the compressed 200 this revalidates
+            self._weaken_etag(response)
+            return None
+        if (response.status_code < 200 or response.status_code in (204, 206) or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or 'no-transform' in response.headers.get('Cache-Control', '')):
+            return None
+        return encoding
+
+    def compress(self, response):
+        encoding = self._negotiated(response)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self._stream(encoding, response.response)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            response.set_data(self._encode(encoding, data))
+
+        response.headers['Content-Encoding'] = encoding
+        self._weaken_etag(response)
+        return response
+
+    def compress_cached(self, response, encoded):
+        """compress() for a response with a cached body, reusing its compressed bodies.
+
+        encoded (encoding -> bytes) is kept with the cached body: a body is
+        compressed on the first hit that asks for an encoding and then
+        served as is. The after_request hook leaves the response alone.
+        """
+        encoding = self._negotiated(response)
+        if encoding is None or response.is_streamed:
+            return response
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+        body = encoded.get(encoding)
+        if body is None:
+            body = encoded[encoding] = self._encode(encoding, data)
+        else:
+            self._record(encoding, len(data), len(body), 0.0, responses=1, reused=1)
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        self._weaken_etag(response)
+        return response
+
+    @staticmethod
+    def _weaken_etag(response):
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                encoding: dict(stats, bytes_saved=stats['bytes_in'] - stats['bytes_out'],
+                               cpu_seconds=round(stats['cpu_seconds'], 6))
+                for encoding, stats in self._stats.items()
+            }
@@ -0,0 +1,175 @@
+from flask import current_app, g, has_request_context, request
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+import random
+import threading
+import time
+
+from services.rate_limit import sqlite_connection
+
+READ_ONLY_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingSession(Session):
+    """Session that sends the reads of read-only requests to a replica.
+
+    Everything else goes to the primary: non-GET requests, flushes, DML,
+    SELECT ... FOR UPDATE, and every statement after the session has written.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and self._read_from_replica(clause):
+            return g._db_replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _read_from_replica(self, clause):
+        if not has_request_context():
+            return False
+        if clause is not None and (getattr(clause, 'is_dml', False)
+                                   or getattr(clause, '_for_update_arg', None) is not None):
+            g._db_wrote = True
+            return False
+        if g.get('_db_wrote') or self.new or self.dirty or self.deleted:
+            return False
+
+        if '_db_replica' not in g:
+            router = current_app.extensions.get('replica_router')
+            g._db_replica = router.pick_replica() if router else None
+        return g._db_replica is not None
+
+    def flush(self, objects=None):
+        if has_request_context() and (self.new or self.dirty or self.deleted):
+            g._db_wrote = True
+        super().flush(objects)
+
+
+class MemoryStickiness:
+    """Users' read-from-primary deadlines in a dict of one process"""
+
+    def __init__(self):
+        self._sticky = {}
+        self._lock = threading.Lock()
+
+    def is_sticky(self, identity):
+        with self._lock:
+            expires_at = self._sticky.get(identity)
+            if expires_at is None:
+                return False
+            if expires_at <= time.monotonic():
+                del self._sticky[identity]
+                return False
+            return True
+
+    def mark(self, identity, seconds):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._sticky) > 10000:
+                self._sticky = {key: expires for key, expires in self._sticky.items() if expires > now}
+            self._sticky[identity] = now + seconds
+
+
+class SQLiteStickiness:
+    """Read-from-primary deadlines in a SQLite file, shared by every worker process on the host"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._calls = 0
+        self._connect().execute('CREATE TABLE IF NOT EXISTS replica_sticky '
+                                '(identity TEXT PRIMARY KEY, expires_at REAL NOT NULL)')
+
+    def _connect(self):
+        return sqlite_connection(self._local, self.path)
+
+    def is_sticky(self, identity):
+        row = self._connect().execute('SELECT 1 FROM replica_sticky WHERE identity = ? AND expires_at > ?',
+                                      (str(identity), time.time())).fetchone()
+        return row is not None
+
+    def mark(self, identity, seconds):
+        now = time.time()
+        conn = self._connect()
+        conn.execute('INSERT OR REPLACE INTO replica_sticky (identity, expires_at) VALUES (?, ?)',
+                     (str(identity), now + seconds))
+        self._calls += 1
+        if self._calls % 1000 == 0:
+            conn.execute('DELETE FROM replica_sticky WHERE expires_at < ?', (now,))
+
+
+class RedisStickiness:
+    """Read-from-primary deadlines as expiring Redis keys, shared across hosts. Needs the optional `redis` package."""
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def is_sticky(self, identity):
+        return bool(self.client.exists(f'replica_sticky:{identity}'))
+
+    def mark(self, identity, seconds):
+        self.client.set(f'replica_sticky:{identity}', 1, px=max(1, int(seconds * 1000)))
+
+
+class ReplicaRouter:
+    """Registers replica binds and decides per request whether reads may use them.
+
+    After a user writes, their reads stay on the primary for REPLICA_STICKY_SECONDS
+    so they see their own booking or cancellation despite replication lag. The
+    deadline is kept in REPLICA_STICKY_STORAGE_URL, which must be shared by the
+    workers for it to hold when the next request reaches another one.
+    Must be initialised before db.init_app so the replica engines get created.
+    """
+
+    def __init__(self, app=None):
+        self.stickiness = MemoryStickiness()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        replica_uris = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+        self.bind_keys = [f'replica_{i}' for i in range(len(replica_uris))]
+        self.sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', 5)
+
+        url = app.config.get('REPLICA_STICKY_STORAGE_URL', 'memory://')
+        if url.startswith('sqlite:///'):
+            self.stickiness = SQLiteStickiness(url[len('sqlite:///'):])
+        elif url.startswith(('redis://', 'rediss://')):
+            self.stickiness = RedisStickiness(url)
+        else:
+            self.stickiness = MemoryStickiness()
+
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds.update(zip(self.bind_keys, replica_uris))
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+        app.extensions['replica_router'] = self
+        app.after_request(self._after_request)
+
+    def pick_replica(self):
+        """Replica engine for this request, or None to use the primary"""
+        if not self.bind_keys or request.method not in READ_ONLY_METHODS:
+            return None
+        if self.is_sticky(self._identity()):
+            return None
+        from extensions import db
+        return db.engines[random.choice(self.bind_keys)]
+
+    def is_sticky(self, identity):
+        return identity is not None and self.stickiness.is_sticky(identity)
+
+    def mark_sticky(self, identity):
+        self.stickiness.mark(identity, self.sticky_seconds)
+
+    def _identity(self):
+        try:
+            return get_jwt_identity()
+        except RuntimeError:
+            # View without @jwt_required, or routing decided before the JWT was verified
+            return None
+
+    def _after_request(self, response):
+        if g.get('_db_wrote') and self.bind_keys:
+            identity = self._identity()
+            if identity is not None:
+                self.mark_sticky(identity)
+        return response
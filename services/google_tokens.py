@@ -0,0 +1,194 @@
+from flask import current_app
+import asyncio
+import base64
+import json
+import os
+import re
+import threading
+import time
+
+GOOGLE_ISSUERS = ['accounts.google.com', 'https://accounts.google.com']
+GOOGLE_CERTS_URL = 'https://www.googleapis.com/oauth2/v1/certs'
+
+# A token signed with an unknown key id triggers a refetch (Google rotated its keys), at most this often
+KEY_MISS_REFETCH_INTERVAL = 60
+
+MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+class CertificateFetchError(Exception):
+    """Google's certificates could not be fetched (not a problem with the token itself)"""
+
+
+def token_key_id(token):
+    """The `kid` header of a JWT, without verifying anything"""
+    try:
+        header = token.split('.', 1)[0]
+        header += '=' * (-len(header) % 4)
+        return json.loads(base64.urlsafe_b64decode(header)).get('kid')
+    except (ValueError, AttributeError):
+        return None
+
+
+def cache_lifetime(headers, default):
+    """Seconds a certificate response stays fresh: Cache-Control max-age minus Age"""
+    match = MAX_AGE_RE.search(headers.get('Cache-Control', ''))
+    if not match:
+        return default
+    try:
+        age = int(headers.get('Age', 0))
+    except ValueError:
+        age = 0
+    return max(0, int(match.group(1)) - age)
+
+
+class GoogleTokenVerifier:
+    """Verifies Google ID tokens against a cached copy of Google's signing certificates.
+
+    The certificates are kept for the max-age Google sends with them, and are
+    refetched in the background once they are within GOOGLE_CERTS_REFRESH_MARGIN
+    of expiring, so logins normally only do a local signature check. Fetches
+    reuse one pooled HTTP session per process.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._certs = None
+        self._expires_at = 0
+        self._fetched_at = 0
+        self._refreshing = False
+        self._pending = None
+        self._session = None
+        self._pid = None
+        self.fetches = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.certs_url = app.config.get('GOOGLE_CERTS_URL') or GOOGLE_CERTS_URL
+        self.client_id = app.config.get('GOOGLE_CLIENT_ID')
+        self.refresh_margin = app.config.get('GOOGLE_CERTS_REFRESH_MARGIN', 300)
+        self.default_max_age = app.config.get('GOOGLE_CERTS_DEFAULT_MAX_AGE', 3600)
+        self.timeout = app.config.get('GOOGLE_CERTS_TIMEOUT', 10)
+        app.extensions['google_verifier'] = self
+
+    def _http(self):
+        """Pooled session, recreated after a fork"""
+        if self._pid != os.getpid():
+            import requests
+            self._session = requests.Session()
+            self._pid = os.getpid()
+        return self._session
+
+    def _store(self, status, headers, load_json):
+        if status != 200:
+            raise CertificateFetchError(f'Could not fetch certificates at {self.certs_url}')
+        certs = load_json()
+        now = time.monotonic()
+        with self._lock:
+            self._certs = certs
+            self._fetched_at = now
+            self._expires_at = now + cache_lifetime(headers, self.default_max_age)
+            self.fetches += 1
+        return certs
+
+    def _fetch(self):
+        import requests
+
+        try:
+            response = self._http().get(self.certs_url, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise CertificateFetchError(f'Could not fetch certificates at {self.certs_url}: {str(e)}') from e
+        return self._store(response.status_code, response.headers, response.json)
+
+    async def _fetch_async(self, async_io):
+        import httpx
+
+        try:
+            response = await async_io.request('GET', self.certs_url, timeout=self.timeout)
+        except httpx.HTTPError as e:
+            raise CertificateFetchError(f'Could not fetch certificates at {self.certs_url}: {str(e)}') from e
+        return self._store(response.status_code, response.headers, response.json)
+
+    def _state(self, token):
+        """'fresh', 'refresh' (usable, but refetch in the background) or 'fetch' (must fetch first)"""
+        now = time.monotonic()
+        if self._certs is None or now >= self._expires_at:
+            return 'fetch'
+        kid = token_key_id(token)
+        if kid and kid not in self._certs and now - self._fetched_at >= KEY_MISS_REFETCH_INTERVAL:
+            return 'fetch'
+        if now >= self._expires_at - self.refresh_margin:
+            return 'refresh'
+        return 'fresh'
+
+    def _claim_refresh(self):
+        with self._lock:
+            if self._refreshing:
+                return False
+            self._refreshing = True
+            return True
+
+    def _background_refresh(self):
+        try:
+            self._fetch()
+        except Exception as e:
+            # Keep verifying with the current certificates until they expire
+            print(f"Google certificate refresh failed: {str(e)}")
+        finally:
+            self._refreshing = False
+
+    async def _background_refresh_async(self, async_io):
+        try:
+            await self._fetch_async(async_io)
+        except Exception as e:
+            print(f"Google certificate refresh failed: {str(e)}")
+        finally:
+            self._refreshing = False
+
+    def certs(self, token=None):
+        """Current certificates, fetching them first if there are none usable"""
+        state = self._state(token)
+        if state == 'fetch':
+            with self._lock:
+                stale = self._fetched_at
+            # Concurrent callers wait for one fetch instead of all fetching
+            with self._fetch_lock:
+                if self._fetched_at == stale:
+                    self._fetch()
+        elif state == 'refresh' and self._claim_refresh():
+            threading.Thread(target=self._background_refresh, daemon=True).start()
+        return self._certs
+
+    async def certs_async(self, token=None):
+        """certs() for async views: fetches go through the async HTTP client"""
+        async_io = current_app.extensions['async_io']
+        state = self._state(token)
+        if state == 'fetch':
+            if self._pending is None:
+                self._pending = asyncio.ensure_future(self._fetch_async(async_io))
+                self._pending.add_done_callback(self._clear_pending)
+            await asyncio.shield(self._pending)
+        elif state == 'refresh' and self._claim_refresh():
+            asyncio.ensure_future(self._background_refresh_async(async_io))
+        return self._certs
+
+    def _clear_pending(self, future):
+        self._pending = None
+
+    def decode(self, token, certs):
+        """Check the signature, audience and issuer of a token, raising ValueError if it is invalid"""
+        from google.auth import jwt as google_jwt
+
+        idinfo = google_jwt.decode(token, certs=certs, audience=self.client_id)
+        if idinfo['iss'] not in GOOGLE_ISSUERS:
+            raise ValueError('Wrong issuer.')
+        return idinfo
+
+    def verify(self, token):
+        return self.decode(token, self.certs(token))
+
+    async def verify_async(self, token):
+        return self.decode(token, await self.certs_async(token))
+
@@ -0,0 +1,295 @@
+from flask import current_app, request, jsonify, make_response
+from flask_jwt_extended import get_jwt_identity
+from collections import OrderedDict, namedtuple
+from functools import wraps
+import hashlib
+import threading
+import time
+import uuid
+
+from services.rate_limit import sqlite_connection
+
+# A claimed key: in flight while status is None, then the stored response. token identifies the claim, so only
+# the request that made it can store or release it
+Record = namedtuple('Record', ('fingerprint', 'token', 'status', 'body', 'content_type'))
+
+
+class MemoryBackend:
+    """Keys in an OrderedDict of one process, with TTL eviction.
+
+    Every key lives for the same TTL, so insertion order is expiry order and
+    expired keys are always at the front. A claim cannot outlive the process
+    that made it, so claims and stored responses share the TTL.
+    """
+
+    def __init__(self, ttl, max_keys=100000):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._entries = OrderedDict()  # key -> (expires_at, Record)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def _evict(self, now):
+        while self._entries:
+            key, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_keys:
+                break
+            del self._entries[key]
+
+    def claim(self, key, fingerprint, token):
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry[1]
+            self._entries[key] = (now + self.ttl, Record(fingerprint, token, None, None, None))
+            return None
+
+    def store(self, key, token, status, body, content_type):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1].token == token:
+                self._entries[key] = (time.monotonic() + self.ttl, entry[1]._replace(
+                    status=status, body=body, content_type=content_type))
+                self._entries.move_to_end(key)
+            self._changed.notify_all()
+
+    def release(self, key, token):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1].token == token:
+                del self._entries[key]
+            self._changed.notify_all()
+
+    def wait(self, key, token, timeout):
+        """Wait until the claim `token` of key is done (stored or released). False on timeout"""
+        def done():
+            entry = self._entries.get(key)
+            return entry is None or entry[1].token != token or entry[1].status is not None
+
+        with self._lock:
+            return self._changed.wait_for(done, timeout)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class PollingWait:
+    """wait() for shared backends: other processes cannot wake this one, so the key is polled"""
+
+    POLL_INTERVAL = 0.05
+
+    def wait(self, key, token, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            record = self.get(key)
+            if record is None or record.token != token or record.status is not None:
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(self.POLL_INTERVAL)
+
+
+class SQLiteBackend(PollingWait):
+    """Keys in a SQLite file, shared by every worker process on the host.
+
+    A claim expires after claim_ttl seconds, so the key of a worker that died
+    mid-request is not stuck in flight until the stored responses' TTL.
+    """
+
+    def __init__(self, path, ttl, claim_ttl):
+        self.path = path
+        self.ttl = ttl
+        self.claim_ttl = claim_ttl
+        self._local = threading.local()
+        self._calls = 0
+        self._connect().execute('CREATE TABLE IF NOT EXISTS idempotency_keys '
+                                '(key TEXT PRIMARY KEY, fingerprint BLOB NOT NULL, token TEXT NOT NULL, '
+                                'status INTEGER, body BLOB, content_type TEXT, expires_at REAL NOT NULL)')
+
+    def _connect(self):
+        return sqlite_connection(self._local, self.path)
+
+    def _select(self, conn, key, now):
+        row = conn.execute('SELECT fingerprint, token, status, body, content_type FROM idempotency_keys '
+                           'WHERE key = ? AND expires_at > ?', (key, now)).fetchone()
+        if row is None:
+            return None
+        return Record(bytes(row[0]), row[1], row[2], None if row[3] is None else bytes(row[3]), row[4])
+
+    def get(self, key):
+        return self._select(self._connect(), key, time.time())
+
+    def claim(self, key, fingerprint, token):
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            record = self._select(conn, key, now)
+            if record is None:
+                conn.execute('INSERT OR REPLACE INTO idempotency_keys (key, fingerprint, token, expires_at) '
+                             'VALUES (?, ?, ?, ?)', (key, fingerprint, token, now + self.claim_ttl))
+            self._calls += 1
+            if self._calls % 1000 == 0:
+                conn.execute('DELETE FROM idempotency_keys WHERE expires_at < ?', (now,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return record
+
+    def store(self, key, token, status, body, content_type):
+        self._connect().execute('UPDATE idempotency_keys SET status = ?, body = ?, content_type = ?, expires_at = ? '
+                                'WHERE key = ? AND token = ?',
+                                (status, body, content_type, time.time() + self.ttl, key, token))
+
+    def release(self, key, token):
+        self._connect().execute('DELETE FROM idempotency_keys WHERE key = ? AND token = ?', (key, token))
+
+
+class RedisBackend(PollingWait):
+    """Keys in Redis, shared across hosts. Needs the optional `redis` package."""
+
+    CLAIM = """
+    if redis.call('EXISTS', KEYS[1]) == 1 then
+        return redis.call('HMGET', KEYS[1], 'fingerprint', 'token', 'status', 'body', 'content_type')
+    end
+    redis.call('HSET', KEYS[1], 'fingerprint', ARGV[1], 'token', ARGV[2])
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+    return false
+    """
+    STORE = """
+    if redis.call('HGET', KEYS[1], 'token') == ARGV[1] then
+        redis.call('HSET', KEYS[1], 'status', ARGV[2], 'body', ARGV[3], 'content_type', ARGV[4])
+        redis.call('EXPIRE', KEYS[1], ARGV[5])
+    end
+    """
+    RELEASE = """
+    if redis.call('HGET', KEYS[1], 'token') == ARGV[1] then
+        redis.call('DEL', KEYS[1])
+    end
+    """
+
+    def __init__(self, url, ttl, claim_ttl):
+        import redis
+        self.ttl = ttl
+        self.claim_ttl = claim_ttl
+        self.client = redis.Redis.from_url(url)
+        self._claim = self.client.register_script(self.CLAIM)
+        self._store = self.client.register_script(self.STORE)
+        self._release = self.client.register_script(self.RELEASE)
+
+    @staticmethod
+    def _record(values):
+        if not values or values[0] is None:
+            return None
+        fingerprint, token, status, body, content_type = values
+        return Record(fingerprint, token.decode(), None if status is None else int(status), body,
+                      None if content_type is None else content_type.decode())
+
+    def get(self, key):
+        return self._record(self.client.hmget(f'idempotency:{key}', 'fingerprint', 'token', 'status', 'body',
+                                              'content_type'))
+
+    def claim(self, key, fingerprint, token):
+        return self._record(self._claim(keys=[f'idempotency:{key}'], args=[fingerprint, token, self.claim_ttl]))
+
+    def store(self, key, token, status, body, content_type):
+        self._store(keys=[f'idempotency:{key}'], args=[token, status, body, content_type or '', self.ttl])
+
+    def release(self, key, token):
+        self._release(keys=[f'idempotency:{key}'], args=[token])
+
+
+class IdempotencyStore:
+    """Idempotency-Key store, in process memory or shared by workers (IDEMPOTENCY_STORAGE_URL).
+
+    Claiming a key is atomic in every backend, so of concurrent requests with
+    the same key exactly one runs the view, wherever they land.
+    """
+
+    def __init__(self, app=None):
+        self.ttl = 24 * 3600
+        self.wait_timeout = 15
+        self.backend = MemoryBackend(self.ttl)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('IDEMPOTENCY_TTL', self.ttl)
+        self.wait_timeout = app.config.get('IDEMPOTENCY_WAIT_TIMEOUT', self.wait_timeout)
+        claim_ttl = app.config.get('IDEMPOTENCY_CLAIM_TTL', 120)
+
+        url = app.config.get('IDEMPOTENCY_STORAGE_URL', 'memory://')
+        if url.startswith('sqlite:///'):
+            self.backend = SQLiteBackend(url[len('sqlite:///'):], self.ttl, claim_ttl)
+        elif url.startswith(('redis://', 'rediss://')):
+            self.backend = RedisBackend(url, self.ttl, claim_ttl)
+        else:
+            self.backend = MemoryBackend(self.ttl, app.config.get('IDEMPOTENCY_MAX_KEYS', 100000))
+        app.extensions['idempotency'] = self
+
+    def begin(self, key, fingerprint):
+        """Claim a key. Returns (token, None) for the first caller, (None, Record) for duplicates"""
+        token = uuid.uuid4().hex
+        record = self.backend.claim(key, fingerprint, token)
+        return (token, None) if record is None else (None, record)
+
+    def complete(self, key, token, response):
+        """Store the response of the first request, for its duplicates to replay"""
+        self.backend.store(key, token, response.status_code, response.get_data(), response.content_type)
+
+    def release(self, key, token):
+        """Forget a key whose request failed, so a retry runs it again"""
+        self.backend.release(key, token)
+
+    def wait(self, key, token):
+        """Wait for the request holding a claim to finish. False after wait_timeout"""
+        return self.backend.wait(key, token, self.wait_timeout)
+
+
+def idempotent(view):
+    """Replay the stored response for a repeated Idempotency-Key header.
+
+    Must be applied inside @jwt_required(): keys are scoped per user.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        header = request.headers.get('Idempotency-Key')
+        if not header:
+            return view(*args, **kwargs)
+
+        store = current_app.extensions['idempotency']
+        key = f'{get_jwt_identity()}:{request.method}:{request.path}:{header}'
+        fingerprint = hashlib.sha256(request.get_data()).digest()
+
+        while True:
+            token, record = store.begin(key, fingerprint)
+            if token is not None:
+                break
+            if record.fingerprint != fingerprint:
+                return jsonify({'error': 'Idempotency-Key was already used with a different request'}), 422
+            if record.status is not None:
+                response = current_app.response_class(record.body, status=record.status,
+                                                      content_type=record.content_type)
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+            if not store.wait(key, record.token):
+                return jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409
+            # Stored or released: claim again, which replays the response or runs the view ourselves
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            store.release(key, token)
+            raise
+
+        # Server errors are not final, let the client retry them
+        if response.status_code >= 500:
+            store.release(key, token)
+        else:
+            store.complete(key, token, response)
+        return response
+
+    return wrapper
@@ -0,0 +1,209 @@
+from sqlalchemy import delete, insert, literal, select, text, update
+from datetime import datetime, timedelta
+import click
+import fcntl
+import threading
+import time
+
+
+class LifecycleScheduler:
+    """Background lifecycle transitions and archival of past events.
+
+    Every LIFECYCLE_INTERVAL seconds:
+      - ACTIVE events that have ended become COMPLETED, and so do their
+        CONFIRMED bookings,
+      - COMPLETED and CANCELLED events that ended more than
+        LIFECYCLE_RETENTION_DAYS ago move to events_archive, and their
+        bookings to bookings_archive.
+    Both steps are set-based UPDATE / INSERT ... SELECT / DELETE statements
+    over chunks of LIFECYCLE_CHUNK_SIZE event ids. Each chunk is its own
+    short transaction, so locks are held briefly and an interrupted run
+    resumes where it stopped.
+
+    Only the process holding LIFECYCLE_LOCK_PATH (an flock) runs: the
+    scheduler of every other worker on the host stands by and takes the lock
+    over when that process exits. On MySQL a run also holds a named lock
+    (GET_LOCK), so hosts do not overlap either; with other databases run it
+    on one host only, or with `flask lifecycle` from a single process or cron.
+    serve.py starts it in the workers, never in a preloading master.
+    """
+
+    LOCK_NAME = 'booking_lifecycle'
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.interval = 300
+        self.chunk_size = 1000
+        self.retention = timedelta(days=365)
+        self.lock_path = '/tmp/booking_lifecycle.lock'
+        self._lock_file = None
+        self._holding = False
+        self._app = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {'runs': 0, 'skipped_runs': 0, 'events_completed': 0, 'bookings_completed': 0,
+                       'events_archived': 0, 'bookings_archived': 0,
+                       'last_run': None, 'last_duration': None, 'last_error': None}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('LIFECYCLE_ENABLED', self.enabled)
+        self.interval = app.config.get('LIFECYCLE_INTERVAL', self.interval)
+        self.chunk_size = app.config.get('LIFECYCLE_CHUNK_SIZE', self.chunk_size)
+        self.retention = timedelta(days=app.config.get('LIFECYCLE_RETENTION_DAYS', self.retention.days))
+        self.lock_path = app.config.get('LIFECYCLE_LOCK_PATH', self.lock_path)
+        self._app = app
+        app.extensions['lifecycle'] = self
+        app.cli.add_command(self._command())
+        # A preloading master leaves it to its workers (serve.py), since threads do not survive fork
+        if self.enabled and app.config.get('LIFECYCLE_AUTOSTART', True):
+            self.start()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='lifecycle-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _claim(self):
+        """Take the host-wide lock file that makes this process the one running the scheduler. Kept until exit"""
+        if self._lock_file is None:
+            self._lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        self._holding = True
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self._claim():
+                # Another process of the host runs the scheduler
+                continue
+            try:
+                self.run_once()
+            except Exception as e:
+                with self._lock:
+                    self._stats['last_error'] = str(e)
+                print(f"Lifecycle run failed: {str(e)}")
+
+    def run_once(self, now=None):
+        """Run both steps now. Returns the counts of this run, None when another process holds the lock"""
+        from extensions import db
+
+        now = now or datetime.utcnow()
+        started = time.perf_counter()
+        counts = dict.fromkeys(('events_completed', 'bookings_completed', 'events_archived', 'bookings_archived'), 0)
+        with self._app.app_context():
+            engine = db.engine
+        with engine.connect() as connection:
+            if not self._acquire(connection):
+                with self._lock:
+                    self._stats['skipped_runs'] += 1
+                return None
+            try:
+                self._complete(connection, now, counts)
+                self._archive(connection, now, counts)
+            finally:
+                self._release(connection)
+
+        with self._lock:
+            self._stats['runs'] += 1
+            for key, count in counts.items():
+                self._stats[key] += count
+            self._stats.update(last_run=now.isoformat(), last_duration=round(time.perf_counter() - started, 3),
+                               last_error=None)
+        return counts
+
+    def _chunks(self, connection, ids_query):
+        """Chunks of the ids ids_query matches, each in its own transaction.
+
+        The caller must take each chunk out of the match (change its status,
+        delete it) before asking for the next one.
+        """
+        while True:
+            with connection.begin():
+                ids = connection.execute(ids_query.limit(self.chunk_size)).scalars().all()
+                if not ids:
+                    return
+                yield ids
+            if len(ids) < self.chunk_size:
+                return
+
+    def _complete(self, connection, now, counts):
+        from models import Booking, BookingStatus, Event, EventStatus
+
+        ended = select(Event.id).where(Event.status == EventStatus.ACTIVE, Event.end_datetime <= now).order_by(Event.id)
+        for ids in self._chunks(connection, ended):
+            counts['events_completed'] += connection.execute(
+                update(Event).where(Event.id.in_(ids), Event.status == EventStatus.ACTIVE)
+                .values(status=EventStatus.COMPLETED, updated_at=now)
+            ).rowcount
+            counts['bookings_completed'] += connection.execute(
+                update(Booking).where(Booking.event_id.in_(ids), Booking.status == BookingStatus.CONFIRMED)
+                .values(status=BookingStatus.COMPLETED, updated_at=now)
+            ).rowcount
+
+    def _archive(self, connection, now, counts):
+        from models import Booking, Event, EventStatus, bookings_archive, events_archive
+
+        past = select(Event.id).where(Event.status.in_((EventStatus.COMPLETED, EventStatus.CANCELLED)),
+                                      Event.end_datetime < now - self.retention).order_by(Event.id)
+        events, bookings = Event.__table__, Booking.__table__
+        for ids in self._chunks(connection, past):
+            # Bookings first: they reference the events
+            counts['bookings_archived'] += self._move(connection, bookings, bookings_archive,
+                                                      bookings.c.event_id.in_(ids), now)
+            counts['events_archived'] += self._move(connection, events, events_archive, events.c.id.in_(ids), now)
+
+    @staticmethod
+    def _move(connection, table, archive, where, now):
+        """INSERT ... SELECT the rows matching where into archive, then delete them from table"""
+        names = [column.name for column in table.columns]
+        connection.execute(insert(archive).from_select(
+            names + ['archived_at'], select(*table.columns, literal(now, archive.c.archived_at.type)).where(where)))
+        return connection.execute(delete(table).where(where)).rowcount
+
+    @classmethod
+    def _acquire(cls, connection):
+        if connection.dialect.name != 'mysql':
+            return True
+        acquired = connection.execute(text('SELECT GET_LOCK(:name, 0)'), {'name': cls.LOCK_NAME}).scalar() == 1
+        connection.commit()
+        return acquired
+
+    @classmethod
+    def _release(cls, connection):
+        if connection.dialect.name == 'mysql':
+            connection.execute(text('SELECT RELEASE_LOCK(:name)'), {'name': cls.LOCK_NAME})
+            connection.commit()
+
+    def _command(self):
+        @click.command('lifecycle')
+        @click.option('--once', is_flag=True, help='Run both steps once and exit, e.g. from cron')
+        def lifecycle_command(once):
+            """Run the lifecycle scheduler in the foreground"""
+            self.stop()
+            if not self._claim():
+                raise click.ClickException(f'Another process holds {self.lock_path}')
+            if once:
+                click.echo(self.run_once())
+                return
+            self._stop.clear()
+            self._run()
+
+        return lifecycle_command
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, enabled=self.enabled, holds_lock=self._holding)
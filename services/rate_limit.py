@@ -0,0 +1,201 @@
+from flask import current_app, request, jsonify
+from flask_jwt_extended import get_jwt_identity
+from collections import OrderedDict
+from functools import wraps
+import math
+import os
+import sqlite3
+import threading
+import time
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+def parse_rate(rate):
+    """Parse '10/minute' into (capacity, tokens per second)"""
+    count, period = rate.split('/')
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period.strip()]
+
+
+def refill(tokens, stamp, now, capacity, rate):
+    """Token count of a bucket at `now`, given its count at `stamp`"""
+    return min(capacity, tokens + max(0.0, now - stamp) * rate)
+
+
+def take(tokens, capacity, rate):
+    """Spend one token. Returns (allowed, tokens left, seconds until one is available)"""
+    if tokens >= 1:
+        return True, tokens - 1, 0
+    return False, tokens, (1 - tokens) / rate
+
+
+class MemoryBackend:
+    """Buckets in a dict of [tokens, stamp] pairs, ordered by last use.
+
+    A bucket that has been idle long enough to refill completely behaves like a
+    missing one, so idle keys can be dropped from the front without changing
+    any decision.
+    """
+
+    def __init__(self, idle_ttl, max_keys=100000):
+        self.idle_ttl = idle_ttl
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if now - bucket[1] < self.idle_ttl and len(self._buckets) <= self.max_keys:
+                break
+            del self._buckets[key]
+
+    def consume(self, key, capacity, rate):
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(capacity), now]
+            else:
+                self._buckets.move_to_end(key)
+            tokens = refill(bucket[0], bucket[1], now, capacity, rate)
+            allowed, bucket[0], retry_after = take(tokens, capacity, rate)
+            bucket[1] = now
+            return allowed, retry_after
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+def sqlite_connection(local, path):
+    """WAL connection to a SQLite file shared by worker processes, one per thread and process.
+
+    local is a threading.local of the store; connections must not cross a fork.
+    """
+    conn = getattr(local, 'conn', None)
+    if conn is None or local.pid != os.getpid():
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        local.conn = conn
+        local.pid = os.getpid()
+    return conn
+
+
+class SQLiteBackend:
+    """Buckets in a SQLite file, shared by every worker process on the host"""
+
+    def __init__(self, path, idle_ttl):
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self._local = threading.local()
+        self._calls = 0
+        self._connect().execute('CREATE TABLE IF NOT EXISTS rate_limit_buckets '
+                                '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, stamp REAL NOT NULL)')
+
+    def _connect(self):
+        return sqlite_connection(self._local, self.path)
+
+    def consume(self, key, capacity, rate):
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, stamp FROM rate_limit_buckets WHERE key = ?', (key,)).fetchone()
+            tokens = refill(row[0], row[1], now, capacity, rate) if row else float(capacity)
+            allowed, tokens, retry_after = take(tokens, capacity, rate)
+            conn.execute('INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, stamp) VALUES (?, ?, ?)',
+                         (key, tokens, now))
+            self._calls += 1
+            if self._calls % 1000 == 0:
+                conn.execute('DELETE FROM rate_limit_buckets WHERE stamp < ?', (now - self.idle_ttl,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, retry_after
+
+
+class RedisBackend:
+    """Buckets in Redis, shared across hosts. Needs the optional `redis` package."""
+
+    SCRIPT = """
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+    local capacity, rate, now, ttl = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+    local tokens = capacity
+    if bucket[1] then
+        tokens = math.min(capacity, tonumber(bucket[1]) + math.max(0, now - tonumber(bucket[2])) * rate)
+    end
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'stamp', now)
+    redis.call('EXPIRE', KEYS[1], ttl)
+    return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url, idle_ttl):
+        import redis
+        self.idle_ttl = idle_ttl
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def consume(self, key, capacity, rate):
+        allowed, tokens = self.script(keys=[f'ratelimit:{key}'],
+                                      args=[capacity, rate, time.time(), math.ceil(self.idle_ttl)])
+        tokens = float(tokens)
+        return bool(allowed), 0 if allowed else (1 - tokens) / rate
+
+
+class RateLimiter:
+    """Token-bucket rate limiting for individual views, keyed by route plus client IP or user id"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        rules = {name: parse_rate(rate) for name, rate in app.config.get('RATE_LIMITS', {}).items()}
+        # Long enough for any bucket to refill completely
+        idle_ttl = max([capacity / rate for capacity, rate in rules.values()] or [60])
+
+        url = app.config.get('RATE_LIMIT_STORAGE_URL', 'memory://')
+        if url.startswith('sqlite:///'):
+            backend = SQLiteBackend(url[len('sqlite:///'):], idle_ttl)
+        elif url.startswith(('redis://', 'rediss://')):
+            backend = RedisBackend(url, idle_ttl)
+        else:
+            backend = MemoryBackend(idle_ttl, app.config.get('RATE_LIMIT_MAX_KEYS', 100000))
+
+        app.extensions['rate_limiter'] = {
+            'enabled': app.config.get('RATE_LIMIT_ENABLED', True),
+            'rules': rules,
+            'backend': backend,
+        }
+
+    def limit(self, rule, by='ip'):
+        """Reject with 429 once the client runs out of tokens for this rule.
+
+        by='user' needs the view to be wrapped in @jwt_required() first.
+        The check runs before the view, so no DB or hashing work is spent on rejected requests.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                state = current_app.extensions['rate_limiter']
+                if state['enabled'] and rule in state['rules']:
+                    identity = get_jwt_identity() if by == 'user' else request.remote_addr
+                    capacity, rate = state['rules'][rule]
+                    allowed, retry_after = state['backend'].consume(f'{request.endpoint}:{by}:{identity}',
+                                                                    capacity, rate)
+                    if not allowed:
+                        response = jsonify({'error': 'Too many requests', 'retry_after': math.ceil(retry_after)})
+                        response.status_code = 429
+                        response.headers['Retry-After'] = str(math.ceil(retry_after))
+                        return response
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
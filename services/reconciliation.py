@@ -0,0 +1,179 @@
+from sqlalchemy import and_, false, func, or_, select, true, union_all
+
+from crm.reconcile import DIGEST_MODULUS, DIGEST_MULTIPLIER, EMPTY_DIGEST
+
+
+def crm_post(path, body):
+    """POST to the CRM service; the decoded JSON body, or None when the request failed"""
+    import requests
+    from config import Config
+    from routes.bookings import crm_request_headers
+
+    try:
+        response = requests.post(f'{Config.CRM_SERVICE_URL}{path}', json=body, headers=crm_request_headers(),
+                                 timeout=30, verify=False)
+        return response.json() if response.status_code == 200 else None
+    except Exception as e:
+        print(f"CRM request failed: {str(e)}")
+        return None
+
+
+def spans(ranges):
+    """Sorted [lo, hi) ranges with adjacent ones merged"""
+    merged = []
+    for lo, hi in sorted(ranges):
+        if merged and merged[-1][1] == lo:
+            merged[-1][1] = hi
+        else:
+            merged.append([lo, hi])
+    return merged
+
+
+class CrmReconciler:
+    """Finds the bookings the CRM is missing and sends them again.
+
+    The booking ids of both sides are compared range by range, Merkle style:
+    the whole id space is one range, split into `fanout` children per level
+    down to ranges of `leaf_size` ids. Each side answers a range with its
+    digest (crm.reconcile: count, sum and hash sum of the ids in it), and only
+    the children of ranges whose digests differ are compared at the next
+    level. The ids themselves are only fetched for mismatching leaves. In sync,
+    the run is one CRM request and two queries; otherwise the
+    requests and the digests compared grow with the number of differences
+    times fanout * depth, not with the number of bookings. Database digests are
+    GROUP BY aggregates over the primary keys of bookings and bookings_archive,
+    so only the top level reads the whole id index.
+
+    Missing bookings still in the bookings table are sent to
+    POST /api/notify/batch in batches of `batch_size`; the CRM ignores the
+    ones it already has, so a booking notified while the run compares is
+    harmless. Missing bookings already archived, and ids only the CRM has,
+    are reported.
+    """
+
+    MAX_RANGES = 4096  # per CRM request, see MAX_RECONCILE_RANGES in crm_service
+    MAX_SPANS = 500  # per database query
+
+    def __init__(self, fanout=16, leaf_size=64, batch_size=100, post=None):
+        if fanout < 2 or leaf_size < 1:
+            raise ValueError('fanout must be at least 2 and leaf_size at least 1')
+        self.fanout = fanout
+        self.leaf_size = leaf_size
+        self.batch_size = batch_size
+        self.post = post or crm_post
+
+    @staticmethod
+    def _tables():
+        from models import Booking, bookings_archive
+        return Booking.__table__, bookings_archive
+
+    def _crm(self, path, ranges, key):
+        """Concatenated `key` lists of the CRM's answers for ranges, MAX_RANGES per request"""
+        values, reply = [], None
+        for start in range(0, len(ranges), self.MAX_RANGES):
+            reply = self.post(path, {'ranges': ranges[start:start + self.MAX_RANGES]})
+            if reply is None:
+                raise RuntimeError(f'CRM request to {path} failed')
+            self.report['crm_requests'] += 1
+            values.extend(reply[key])
+        return values, reply
+
+    def _ids(self, ranges, columns=()):
+        """UNION ALL of the ids of both tables in the ranges, with extra columns per table"""
+        parts = []
+        for table, extra in zip(self._tables(), columns or ((), ())):
+            for chunk in range(0, len(ranges), self.MAX_SPANS):
+                where = or_(*(and_(table.c.id >= lo, table.c.id < hi)
+                              for lo, hi in ranges[chunk:chunk + self.MAX_SPANS]))
+                parts.append(select(table.c.id.label('id'), *extra).where(where))
+        return union_all(*parts).subquery()
+
+    def _db_digests(self, session, ranges, width):
+        """Digests of the width-aligned buckets of ranges, by bucket number"""
+        ids = self._ids(spans(ranges))
+        bucket = (ids.c.id // width).label('bucket')
+        rows = session.execute(
+            select(bucket, func.count(), func.sum(ids.c.id), func.sum(ids.c.id * DIGEST_MULTIPLIER % DIGEST_MODULUS))
+            .group_by(bucket)
+        ).all()
+        self.report['db_queries'] += 1
+        return {int(row[0]): [int(value) for value in row[1:]] for row in rows}
+
+    def _db_max_id(self, session):
+        self.report['db_queries'] += 1
+        return max(session.execute(select(func.max(table.c.id))).scalar() or 0 for table in self._tables())
+
+    def compare(self, session):
+        """Mismatching leaf ranges, found level by level"""
+        top = self._db_max_id(session) + 1
+        (crm_root,), reply = self._crm('/api/reconcile/digests', [[0, top]], 'digests')
+        db_root = self._db_digests(session, [(0, top)], top).get(0, EMPTY_DIGEST)
+        self.report['ranges_compared'] += 1
+        if reply['max_booking_id'] < top and db_root == crm_root:
+            return []
+
+        # Widths are leaf_size * fanout ** k, so every range is a whole bucket of the next level's width
+        top = max(top, reply['max_booking_id'] + 1)
+        width = self.leaf_size
+        while width < top:
+            width *= self.fanout
+        mismatched = [(0, width)]
+        while width > self.leaf_size and mismatched:
+            width //= self.fanout
+            children = [(bucket * width, (bucket + 1) * width)
+                        for lo, hi in mismatched for bucket in range(lo // width, (min(hi, top) - 1) // width + 1)]
+            db_digests = self._db_digests(session, mismatched, width)
+            crm_digests, _ = self._crm('/api/reconcile/digests', [list(child) for child in children], 'digests')
+            self.report['ranges_compared'] += len(children)
+            mismatched = [child for child, crm_digest in zip(children, crm_digests)
+                          if db_digests.get(child[0] // width, EMPTY_DIGEST) != crm_digest]
+        return mismatched
+
+    def run(self, dry_run=False):
+        """Compare both sides and, unless dry_run, send the CRM the bookings it is missing. Returns a report"""
+        from extensions import db
+
+        self.report = dict.fromkeys(('crm_requests', 'db_queries', 'ranges_compared', 'leaf_ranges',
+                                     'ids_compared', 'resent', 'resend_failures'), 0)
+        session = db.session
+        leaves = self.compare(session)
+        self.report['leaf_ranges'] = len(leaves)
+        missing, archived, crm_only = [], [], []
+        if leaves:
+            leaves = spans(leaves)
+            crm_ids, _ = self._crm('/api/reconcile/ids', leaves, 'booking_ids')
+            ids = self._ids(leaves, columns=((false().label('archived'),), (true().label('archived'),)))
+            db_ids = dict(session.execute(select(ids.c.id, ids.c.archived)).all())
+            self.report['db_queries'] += 1
+            self.report['ids_compared'] = len(crm_ids) + len(db_ids)
+            crm_ids = set(crm_ids)
+            for booking_id, is_archived in sorted(db_ids.items()):
+                if booking_id not in crm_ids:
+                    (archived if is_archived else missing).append(booking_id)
+            crm_only = sorted(crm_ids - set(db_ids))
+        if not dry_run:
+            self.resend(session, missing)
+        self.report.update(missing=missing, missing_archived=archived, crm_only=crm_only)
+        return self.report
+
+    def resend(self, session, booking_ids):
+        """Send the notifications of bookings by id to the CRM, batch_size per request"""
+        from sqlalchemy.orm import joinedload
+        from models import Booking
+        from routes.bookings import crm_booking_data
+
+        for start in range(0, len(booking_ids), self.batch_size):
+            batch = booking_ids[start:start + self.batch_size]
+            bookings = session.execute(
+                select(Booking).options(joinedload(Booking.user), joinedload(Booking.event))
+                .where(Booking.id.in_(batch)).order_by(Booking.id)
+            ).scalars().all()
+            self.report['db_queries'] += 1
+            if not bookings:
+                continue
+            body = {'bookings': [crm_booking_data(booking, booking.user, booking.event) for booking in bookings]}
+            self.report['crm_requests'] += 1
+            if self.post('/api/notify/batch', body) is not None:
+                self.report['resent'] += len(bookings)
+            else:
+                self.report['resend_failures'] += len(bookings)
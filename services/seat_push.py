@@ -0,0 +1,200 @@
+import json
+import threading
+import time
+
+KEEPALIVE = b': keepalive\n\n'
+
+
+class _Channel:
+    """Watchers of one event: the latest seat message, its version, and a condition they wait on"""
+    __slots__ = ('condition', 'version', 'seats', 'message', 'watchers')
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.version = 0
+        self.seats = None
+        self.message = None
+        self.watchers = 0
+
+
+class SeatHub:
+    """In-process pub/sub of events' seat availability, streamed as Server-Sent Events.
+
+    Bookings and cancellations publish an event's participant count; a
+    flusher thread waits SEAT_PUSH_COALESCE_MS after the first publish, then
+    broadcasts the latest count of every event that changed in that window.
+    A broadcast encodes the message once and wakes the event's watchers, who
+    all send the same bytes: a watcher only ever gets the latest state, never
+    a backlog. Publishes for events nobody watches are dropped.
+
+    Each process has its own hub, and bookings made in other workers do not
+    reach it, so the flusher also re-reads the watched events every
+    SEAT_PUSH_RESYNC seconds: one query per process, whatever the number of
+    watchers.
+    """
+
+    def __init__(self, app=None):
+        self.coalesce = 0.25
+        self.keepalive = 15
+        self.resync = 5
+        self.max_watchers = 10000
+        self._app = None
+        self._channels = {}
+        self._watchers = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flusher = None
+        self._stats = {'published': 0, 'broadcasts': 0, 'resyncs': 0, 'rejected': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.coalesce = app.config.get('SEAT_PUSH_COALESCE_MS', self.coalesce * 1000) / 1000
+        self.keepalive = app.config.get('SEAT_PUSH_KEEPALIVE', self.keepalive)
+        self.resync = app.config.get('SEAT_PUSH_RESYNC', self.resync)
+        self.max_watchers = app.config.get('SEAT_PUSH_MAX_WATCHERS', self.max_watchers)
+        self._app = app
+        app.extensions['seat_hub'] = self
+
+    @staticmethod
+    def encode(event_id, current_participants, max_participants):
+        data = json.dumps({
+            'event_id': event_id,
+            'current_participants': current_participants,
+            'max_participants': max_participants,
+            'available_spots': max_participants - current_participants,
+            'is_full': current_participants >= max_participants,
+        }, separators=(',', ':'))
+        return f'event: seats\ndata: {data}\n\n'.encode('utf-8')
+
+    def publish(self, event_id, current_participants, max_participants):
+        """Queue an event's new participant count for the next broadcast"""
+        with self._lock:
+            self._stats['published'] += 1
+            if event_id not in self._channels:
+                return
+            self._pending[event_id] = (current_participants, max_participants)
+            self._wakeup.notify()
+
+    def _set(self, event_id, channel, seats):
+        """Make seats the channel's message and wake its watchers, if they changed"""
+        with channel.condition:
+            if seats == channel.seats:
+                return False
+            channel.seats = seats
+            channel.version += 1
+            channel.message = f'id: {channel.version}\n'.encode('utf-8') + self.encode(event_id, *seats)
+            channel.condition.notify_all()
+            return True
+
+    def _start_flusher(self):
+        # Called with self._lock held
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._flush_loop, name='seat-push', daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        resync_at = time.monotonic() + self.resync
+        while True:
+            with self._lock:
+                if not self._channels:
+                    self._flusher = None
+                    return
+                timeout = max(0.0, resync_at - time.monotonic()) if self.resync else None
+                self._wakeup.wait_for(lambda: self._pending or not self._channels, timeout=timeout)
+                coalesce = bool(self._pending)
+            if coalesce:
+                # Let the other updates of this window pile up behind the first one
+                time.sleep(self.coalesce)
+                with self._lock:
+                    pending, self._pending = self._pending, {}
+                    channels = {event_id: self._channels.get(event_id) for event_id in pending}
+                for event_id, seats in pending.items():
+                    if channels[event_id] is not None and self._set(event_id, channels[event_id], seats):
+                        with self._lock:
+                            self._stats['broadcasts'] += 1
+            if self.resync and time.monotonic() >= resync_at:
+                try:
+                    self._resync()
+                except Exception as e:
+                    print(f"Seat push resync failed: {str(e)}")
+                resync_at = time.monotonic() + self.resync
+
+    def _resync(self):
+        from extensions import db
+        from models import Event
+
+        with self._lock:
+            channels = dict(self._channels)
+            self._stats['resyncs'] += 1
+        if not channels:
+            return
+        with self._app.app_context():
+            rows = db.session.execute(
+                db.select(Event.id, Event.current_participants, Event.max_participants)
+                .where(Event.id.in_(channels))
+            ).all()
+            db.session.remove()
+        for event_id, current_participants, max_participants in rows:
+            if self._set(event_id, channels[event_id], (current_participants, max_participants)):
+                with self._lock:
+                    self._stats['broadcasts'] += 1
+
+    def join(self, event_id, current_participants, max_participants):
+        """Register a watcher of an event, seeded with the seats it just read. None when the hub is full"""
+        with self._lock:
+            if self._watchers >= self.max_watchers:
+                self._stats['rejected'] += 1
+                return None
+            channel = self._channels.setdefault(event_id, _Channel())
+            channel.watchers += 1
+            self._watchers += 1
+            self._start_flusher()
+        self._set(event_id, channel, (current_participants, max_participants))
+        return channel
+
+    def leave(self, event_id, channel):
+        with self._lock:
+            channel.watchers -= 1
+            self._watchers -= 1
+            if channel.watchers == 0 and self._channels.get(event_id) is channel:
+                del self._channels[event_id]
+                self._pending.pop(event_id, None)
+                self._wakeup.notify()
+
+    def stream(self, event_id, channel):
+        """Response body of a joined watcher: SSE chunks of the current seats, then of every change"""
+        return _Stream(self, event_id, channel)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, events_watched=len(self._channels), watchers=self._watchers)
+
+
+class _Stream:
+    """Iterable body of one watcher's response, with keepalive comments between changes.
+
+    The server closes it when the client goes away (a write fails) or the
+    response ends; closing leaves the channel, even if it was never iterated.
+    """
+
+    def __init__(self, hub, event_id, channel):
+        self.hub = hub
+        self.event_id = event_id
+        self.channel = channel
+        self.closed = False
+
+    def __iter__(self):
+        channel, version = self.channel, 0
+        while not self.closed:
+            with channel.condition:
+                changed = channel.condition.wait_for(lambda: channel.version > version, self.hub.keepalive)
+                if changed:
+                    version, message = channel.version, channel.message
+            yield message if changed else KEEPALIVE
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.hub.leave(self.event_id, self.channel)